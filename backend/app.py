@@ -1,18 +1,35 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from typing import List, Optional
-import joblib
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from typing import List, Literal, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import functools
+import json
+import multiprocessing
 import pandas as pd
 import numpy as np
 import os
-import pickle
+import threading
+import uuid
 from datetime import datetime
 
 # Importar modelos locais
-from models import SurveyStateDetector, TurnoverPredictor, generate_synthetic_data
-from generate_dataset import generate_synthetic_dataset
+from models import API_COLUMN_ALIASES, RISK_CATEGORIES
+from registry import ModelRegistry
+from generate_dataset import generate_synthetic_dataset, save_dataset, history_path_for
+from training import run_chunked_training, run_hmm_update, run_rf_update, run_training
+from hmm_updates import read_survey_wave
+from prediction_cache import PredictionCache, payload_key
+from score_store import AGGREGATE_DIMENSIONS, ScoreStore
+from evaluation import render_roc_curve
+from instrumentation import InstrumentationMiddleware, StageTimer, metrics, profiled, profiler, profiling_requested
+from batching import MicroBatcher
+from executors import SaturatedError, process_pool, thread_pool
+from scoring import infer_hmm_state_one, score_frame, score_frame_in_worker
+from uploads import ingest_upload
 
 app = FastAPI(
     title="People Analytics - Turnover Prediction MVP",
@@ -41,13 +58,69 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Modelos globais
-hmm_model: Optional[SurveyStateDetector] = None
-rf_model: Optional[TurnoverPredictor] = None
+# Latência por etapa e por requisição, exposta em /metrics (ver instrumentation.py)
+app.add_middleware(InstrumentationMiddleware)
+
+# Modelos servidos: bundle imutável (HMM + RF + métricas) trocado atomicamente pelo registro
+model_registry = ModelRegistry('models')
 training_status = {"status": "not_trained", "last_trained": None, "metrics": {}}
 
+# Histórico e estado filtrado do HMM, base das atualizações incrementais (/api/train/hmm-update)
+HMM_STATE_DIR = os.getenv('HMM_STATE_DIR', 'data/hmm_state')
+
+# Arquivos temporários (memmap) do treinamento out-of-core (chunk_size em /api/train/models)
+TRAINING_WORKSPACE_DIR = os.getenv('TRAINING_WORKSPACE_DIR', 'data/training_workspace')
+
+# Serializa a renderização (sob demanda) dos gráficos de avaliação
+roc_render_lock = threading.Lock()
+
+# Jobs de treinamento (rodam em um pool de processos, um por vez)
+training_executor: Optional[ProcessPoolExecutor] = None
+training_manager = None
+training_progress = None  # dict do Manager: job_id -> progresso por etapa
+training_jobs = {}
+training_done = {}  # job_id -> threading.Event sinalizado ao fim do job
+training_lock = threading.RLock()  # reentrante: o reset do pool também roda dentro do submit
+TRAINING_JOB_HISTORY = int(os.getenv('TRAINING_JOB_HISTORY', '20'))  # jobs encerrados mantidos para /api/train/status
+
+# Cache de predições por versão do modelo + hash do payload (PREDICTION_CACHE_SIZE=0 desliga)
+prediction_cache = PredictionCache(
+    max_entries=int(os.getenv('PREDICTION_CACHE_SIZE', '100000')),
+    ttl_seconds=float(os.getenv('PREDICTION_CACHE_TTL', '3600')),
+    disk_path=os.getenv('PREDICTION_CACHE_PATH')  # SQLite local opcional
+)
+model_registry.add_listener(prediction_cache.set_version)  # Versão nova invalida o cache
+
+# Micro-batching de /api/predict/single: requisições concorrentes pontuadas em um lote só
+# (PREDICT_BATCH_MAX_SIZE=1 desliga e cada requisição usa o caminho de uma linha). Com espera 0 o lote
+# junta o que chegou na mesma volta do event loop, mais o que acumulou enquanto o lote anterior rodava
+PREDICT_BATCH_MAX_SIZE = int(os.getenv('PREDICT_BATCH_MAX_SIZE', '64'))
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv('PREDICT_BATCH_MAX_WAIT_MS', '0'))
+
+# Pools de execução dos endpoints (async): threads para I/O (arquivos, SQLite, registro de modelos)
+# e processos para o scoring em lote. SCORING_PROCESSES=0 pontua nas threads de I/O (padrão com
+# um núcleo só, onde o processo extra só somaria a cópia dos dados). Acima de *_MAX_PENDING tarefas
+# pendentes as requisições recebem 429
+io_executor = thread_pool('io', int(os.getenv('IO_THREADS', '8')), int(os.getenv('IO_MAX_PENDING', '64')))
+SCORING_PROCESSES = int(os.getenv('SCORING_PROCESSES', str(min(4, (os.cpu_count() or 1) - 1))))
+scoring_executor = process_pool(
+    'scoring', SCORING_PROCESSES, int(os.getenv('SCORING_MAX_PENDING', '8'))
+) if SCORING_PROCESSES > 0 else None
+PREDICT_BATCH_MAX_PENDING = int(os.getenv('PREDICT_BATCH_MAX_PENDING', '1024'))
+
+# Último score de cada colaborador + agregados do dashboard (gravados pelo treino e pela predição em massa)
+score_store = ScoreStore(os.getenv('SCORE_DB_URL', 'sqlite:///data/scores.db'))
+
 # --- Pydantic Models ---
 
+class SurveyMonth(BaseModel):
+    engajamento: float
+    satisfaction: float
+    recognition: float
+    growth: float
+    manager_rel: float
+    work_life: float
+
 class EmployeeData(BaseModel):
     employee_id: int
     idade: int
@@ -67,6 +140,7 @@ class EmployeeData(BaseModel):
     crescimento_medio: float
     avg_manidader_rel: float  # Nome corrigido para corresponder ao schema da especificação
     equilibrio_vida_trabalho_medio: float
+    survey_history: Optional[List[SurveyMonth]] = None  # Histórico mensal (opcional) usado na inferência do HMM
 
 class TurnoverPredictionResponse(BaseModel):
     employee_id: int
@@ -79,6 +153,22 @@ class TrainModelsRequest(BaseModel):
     n_employees: Optional[int] = 500
     n_months: Optional[int] = 12
     use_synthetic: Optional[bool] = True
+    wait: Optional[bool] = False  # Esperar o fim do treinamento em vez de só enfileirar o job
+    n_jobs: Optional[int] = -1  # Núcleos para validação cruzada e árvores do Random Forest (-1 = todos)
+    reuse_cv_models: Optional[bool] = False  # Modelo final = árvores dos folds da validação cruzada (sem refit)
+    chunk_size: Optional[int] = None  # Treino out-of-core: ler o dataset em blocos de N colaboradores (memmap em disco)
+    hmm_sample_size: Optional[int] = 10_000  # Treino out-of-core: colaboradores sorteados para o EM do HMM
+
+class RFUpdateRequest(BaseModel):
+    filepath: Optional[str] = None  # Só os dados novos (colaboradores/período desde o último treino)
+    n_employees: Optional[int] = 500
+    n_months: Optional[int] = 12
+    use_synthetic: Optional[bool] = True
+    wait: Optional[bool] = False
+    n_jobs: Optional[int] = -1
+    n_new_trees: Optional[int] = 20  # Árvores treinadas nos dados novos
+    window_size: Optional[int] = None  # Máximo de árvores mantidas, descartando as mais antigas (padrão: tamanho atual)
+    seed: Optional[int] = None  # Semente dos dados sintéticos (padrão: derivada do job, diferente do treino base)
 
 class DashboardMetrics(BaseModel):
     model_status: str
@@ -90,322 +180,922 @@ class DashboardMetrics(BaseModel):
     last_trained: Optional[str]
     model_performance: Optional[dict]
 
+@app.exception_handler(SaturatedError)
+async def saturated_handler(request, exc):
+    """Pool de execução no limite: 429 com Retry-After, sem enfileirar mais trabalho"""
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # --- Health Check ---
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok", "service": "People Analytics MVP", "environment": os.getenv('ENVIRONMENT', 'development')}
 
+# --- Observability Endpoints ---
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas de latência por etapa, requisições e jobs no formato texto do Prometheus"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/debug/profiling")
+async def set_profiling(enabled: bool):
+    """Liga/desliga o cProfile por requisição (requisições com header X-Profile: 1; .prof em PROFILE_DIR)"""
+    profiler.enabled = enabled
+    return {"enabled": profiler.enabled, "profile_dir": profiler.profile_dir}
+
 # --- Training Endpoints ---
 
 @app.post("/api/train/models")
-def train_models(request: TrainModelsRequest):
-    """Treina HMM e Random Forest com dados de histórico"""
-    global hmm_model, rf_model, training_status
+async def train_models(request: TrainModelsRequest):
+    """
+    Treina HMM e Random Forest com dados de histórico
+
+    O treinamento roda como job em um pool de processos e o job_id volta na hora
+    (progresso em /api/train/status). Com wait=true a resposta espera o fim do job.
+    Só um treinamento roda por vez: pedidos concorrentes recebem 409.
+    Com chunk_size o treino é out-of-core (datasets maiores que a memória).
+    """
+    if not request.use_synthetic and (not request.filepath or not os.path.exists(request.filepath)):
+        raise HTTPException(status_code=400, detail="Arquivo não encontrado")
+
+    if request.chunk_size is not None and request.chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size deve ser positivo")
+
+    params = {
+        **request.dict(), 'models_dir': model_registry.root, 'score_db_url': score_store.url,
+        'hmm_state_dir': HMM_STATE_DIR, 'workspace_dir': TRAINING_WORKSPACE_DIR
+    }
+    job_id = await io_executor.run(submit_training_job, run_chunked_training if request.chunk_size else run_training, params)
+
+    if not request.wait:
+        return {"status": "Training started", "job_id": job_id, "status_url": f"/api/train/status?job_id={job_id}"}
 
+    job = await wait_training_job(job_id)
+    if job["state"] != "done":
+        raise HTTPException(status_code=400, detail=f"Erro durante treinamento: {job['error']}")
+    return {
+        "status": "Models trained successfully",
+        "job_id": job_id,
+        "test_auc": job["metrics"]["test_auc"],
+        "n_employees": job["metrics"]["n_employees"],
+        "turnover_rate": job["metrics"]["turnover_rate"],
+        "training_time": job["finished_at"]
+    }
+
+@app.post("/api/train/hmm-update")
+async def update_hmm(
+    file: UploadFile = File(...),
+    input_format: Optional[Literal['csv', 'ndjson']] = None,
+    n_iter: int = 5,
+    sample_size: Optional[int] = None,
+    seed: Optional[int] = None,
+    wait: bool = False
+):
+    """
+    Atualização incremental do HMM com uma nova onda mensal de surveys
+
+    O arquivo tem uma linha por colaborador (employee_id + scores do mês). O mês é
+    acrescentado ao histórico guardado, o HMM ativo roda n_iter iterações de EM a
+    partir dos parâmetros atuais (em sample_size colaboradores sorteados com
+    `seed`, se informado; padrão: semente derivada do job) e o estado filtrado
+    de cada colaborador avança um mês. O resultado é uma nova versão de modelo
+    (mesmo Random Forest), como um treinamento.
+    """
+    bundle = require_models()
+    if n_iter < 0 or (sample_size is not None and sample_size < 1):
+        raise HTTPException(status_code=400, detail="n_iter e sample_size devem ser positivos")
+
+    input_format = input_format or ('csv' if (file.filename or '').lower().endswith('.csv') else 'ndjson')
     try:
-        print(f"Iniciando treinamento dos modelos...")
-        training_status["status"] = "training"
-        
-        # Carregar ou gerar dados
-        if request.use_synthetic:
-            print(f"Gerando dados sintéticos: {request.n_employees} colaboradores, {request.n_months} meses")
-            df = generate_synthetic_dataset(n_employees=request.n_employees, n_months=request.n_months)
-        else:
-            if not request.filepath or not os.path.exists(request.filepath):
-                raise HTTPException(status_code=400, detail="Arquivo não encontrado")
-            
-            # Tentar carregar pickle primeiro (com histórico), depois CSV
-            if request.filepath.endswith('.pkl'):
-                with open(request.filepath, 'rb') as f:
-                    df = pickle.load(f)
-            else:
-                df = pd.read_csv(request.filepath)
-                # Para CSV, gerar histórico fake baseado nas médias
-                df = add_fake_survey_history(df)
-
-        print(f"Dataset carregado: {len(df)} colaboradores")
-        print(f"Taxa de turnover: {df['desligamento'].mean():.1%}")
-
-        # Treinar HMM
-        print("Treinando modelo HMM...")
-        hmm_model = SurveyStateDetector(n_states=3)
-        hmm_model.fit(df)
-        state_sequences = hmm_model.predict_states(df)
-        df = hmm_model.get_current_state(df, state_sequences)
-        state_probs = hmm_model.get_state_probabilities(df)
-        print(f"HMM treinado com {hmm_model.n_states} estados")
-
-        # Treinar Random Forest
-        print("Treinando modelo Random Forest...")
-        rf_model = TurnoverPredictor()
-        results = rf_model.train(df, state_probs=state_probs)
-        print(f"Random Forest treinado. AUC: {results['auc']:.3f}")
-
-        # Salvar modelos
-        os.makedirs('models', exist_ok=True)
-        joblib.dump(hmm_model, 'models/hmm_model.pkl')
-        joblib.dump(rf_model, 'models/rf_model.pkl')
-        print("Modelos salvos em models/")
-
-        # Atualizar status
-        training_status = {
-            "status": "trained",
-            "last_trained": datetime.now().isoformat(),
-            "metrics": {
-                "test_auc": float(results['auc']),
-                "n_employees": len(df),
-                "turnover_rate": float(df['desligamento'].mean()),
-                "hmm_states": hmm_model.n_states
-            }
-        }
+        employee_ids, values = await io_executor.run(read_survey_wave, file.file, input_format)
+    except SaturatedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao ler arquivo: {str(e)}")
+
+    params = {
+        'survey_employee_ids': employee_ids, 'survey_values': values,
+        'n_iter': n_iter, 'sample_size': sample_size, 'seed': seed, 'base_version': bundle.version,
+        'models_dir': model_registry.root, 'hmm_state_dir': HMM_STATE_DIR
+    }
+    job_id = await io_executor.run(submit_training_job, run_hmm_update, params)
+
+    if not wait:
+        return {"status": "HMM update started", "job_id": job_id, "status_url": f"/api/train/status?job_id={job_id}"}
+
+    job = await wait_training_job(job_id)
+    if job["state"] != "done":
+        raise HTTPException(status_code=400, detail=f"Erro durante atualização do HMM: {job['error']}")
+    return {"status": "HMM updated", "job_id": job_id, "version": job["version"], **job["metrics"]["hmm_update"]}
+
+@app.post("/api/train/rf-update")
+async def update_random_forest(request: RFUpdateRequest):
+    """
+    Retreino incremental do Random Forest com dados novos (floresta de janela deslizante)
+
+    Parte da versão ativa: acrescenta n_new_trees árvores treinadas só nos dados
+    novos (warm_start) e descarta as mais antigas, mantendo até window_size
+    árvores. O custo depende do volume de dados novos, não do histórico inteiro.
+    O resultado é uma nova versão de modelo (mesmo HMM), como um treinamento.
+    """
+    bundle = require_models()
+    if request.n_new_trees < 1 or (request.window_size is not None and request.window_size < 1):
+        raise HTTPException(status_code=400, detail="n_new_trees e window_size devem ser positivos")
+    if not request.use_synthetic and (not request.filepath or not os.path.exists(request.filepath)):
+        raise HTTPException(status_code=400, detail="Arquivo não encontrado")
 
-        return {
-            "status": "Models trained successfully",
-            "test_auc": float(results['auc']),
-            "n_employees": len(df),
-            "turnover_rate": float(df['desligamento'].mean()),
-            "training_time": training_status["last_trained"]
+    params = {
+        **request.dict(), 'base_version': bundle.version,
+        'models_dir': model_registry.root, 'score_db_url': score_store.url
+    }
+    job_id = await io_executor.run(submit_training_job, run_rf_update, params)
+
+    if not request.wait:
+        return {"status": "Random Forest update started", "job_id": job_id, "status_url": f"/api/train/status?job_id={job_id}"}
+
+    job = await wait_training_job(job_id)
+    if job["state"] != "done":
+        raise HTTPException(status_code=400, detail=f"Erro durante retreino do Random Forest: {job['error']}")
+    return {
+        "status": "Random Forest updated",
+        "job_id": job_id,
+        "version": job["version"],
+        "test_auc": job["metrics"]["test_auc"],
+        **job["metrics"]["rf_update"]
+    }
+
+@app.get("/api/train/status")
+async def get_training_status(job_id: Optional[str] = None):
+    """Retorna status do treinamento dos modelos e o progresso por etapa do job (o último, por padrão)"""
+    status = dict(training_status)
+    job_id = job_id or training_status.get("job_id")
+    if job_id is not None:
+        # O progresso vem do Manager (IPC bloqueante): fora do event loop, sem depender de vaga no pool de I/O
+        job = await asyncio.to_thread(training_job_snapshot, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job de treinamento não encontrado")
+        status["job"] = job
+    return status
+
+def submit_training_job(target, params):
+    """Enfileira `target(params, job_id, shared_progress)` no pool de treinamento; 409 se já houver um job ativo"""
+    with training_lock:
+        active = next((job for job in training_jobs.values() if job["state"] in ("queued", "running")), None)
+        if active is not None:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Treinamento já em andamento (job {active['job_id']}). Acompanhe em /api/train/status"
+            )
+
+        evict_finished_jobs()
+        job_id = uuid.uuid4().hex[:12]
+        executor, shared_progress = get_training_executor()
+        try:
+            future = executor.submit(target, params, job_id, shared_progress)
+        except BrokenProcessPool:
+            # Worker morto em um job anterior: tenta uma vez em um pool novo
+            reset_training_executor(executor)
+            executor, shared_progress = get_training_executor()
+            future = executor.submit(target, params, job_id, shared_progress)
+
+        # Registrado só depois do submit: um submit que falha não deixa job "queued" para sempre
+        training_jobs[job_id] = {
+            "job_id": job_id,
+            "job_type": target.__name__.removeprefix('run_'),
+            "state": "queued",
+            "submitted_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "error": None
         }
+        training_done[job_id] = threading.Event()
+        training_status["status"] = "training"
+        training_status["job_id"] = job_id
+        future.add_done_callback(functools.partial(on_training_done, job_id, executor))
+        print(f"Treinamento enfileirado (job {job_id})")
+    return job_id
+
+async def wait_training_job(job_id):
+    """Espera o fim do job em uma thread à parte (sem ocupar o event loop nem o pool de I/O) e retorna o job"""
+    job, done = training_jobs[job_id], training_done[job_id]
+    await asyncio.to_thread(done.wait)
+    return job
+
+def evict_finished_jobs():
+    """Descarta os jobs encerrados mais antigos além de TRAINING_JOB_HISTORY (chamado com training_lock)"""
+    finished = [job_id for job_id, job in training_jobs.items() if job["state"] in ("done", "error")]
+    for job_id in finished[:max(0, len(finished) - TRAINING_JOB_HISTORY)]:
+        del training_jobs[job_id]
+        del training_done[job_id]
+        if training_progress is not None:
+            training_progress.pop(job_id, None)
+
+def get_training_executor():
+    """Pool de processos de treinamento (1 worker) e o dict compartilhado de progresso, criados sob demanda"""
+    global training_executor, training_manager, training_progress
+    if training_executor is None:
+        context = multiprocessing.get_context("spawn")
+        training_manager = context.Manager()
+        training_progress = training_manager.dict()
+        training_executor = ProcessPoolExecutor(max_workers=1, mp_context=context)
+    return training_executor, training_progress
+
+def reset_training_executor(executor):
+    """Descarta o pool de treinamento quebrado (e o Manager do progresso); o próximo job cria outros"""
+    global training_executor, training_manager, training_progress
+    with training_lock:
+        if training_executor is not executor:
+            return
+        manager = training_manager
+        training_executor = training_manager = training_progress = None
+    print("Pool de treinamento quebrado; será recriado no próximo job")
+    executor.shutdown(wait=False, cancel_futures=True)
+    manager.shutdown()
+
+def on_training_done(job_id, executor, future):
+    """Callback de fim de job: publica o bundle novo no registro, atualiza o status e as métricas"""
+    job = training_jobs[job_id]
+    job["finished_at"] = datetime.now().isoformat()
+    try:
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            # Processo de treinamento morto (ex.: OOM): o job falha e o pool é recriado no próximo
+            reset_training_executor(executor)
+            raise
+        # Carrega do artefato salvo pelo job (arrays memory-mapped), sem trafegar os modelos entre processos;
+        # artefato incompleto ou corrompido também encerra o job com erro
+        bundle = model_registry.load_version(result["version"])
+        activated = model_registry.publish(bundle)
     except Exception as e:
+        job["state"] = "error"
+        job["error"] = str(e)
         training_status["status"] = "error"
-        print(f"Erro durante treinamento: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Erro durante treinamento: {str(e)}")
+        print(f"Erro durante treinamento (job {job_id}): {str(e)}")
+    else:
+        job["state"] = "done"
+        job["version"] = bundle.version
+        job["metrics"] = result["metrics"]
+        job["progress"] = result["progress"]
+        training_status["status"] = "trained"
+        sync_training_status()
+        auc = result["metrics"].get("test_auc")  # Atualização só do HMM não mede AUC
+        print(f"Treinamento concluído (job {job_id}, versão {bundle.version}"
+              f"{'' if activated else ', não ativada: versão fixada'})"
+              f"{'' if auc is None else f'. AUC: {auc:.3f}'}")
+        for stage, info in result["progress"]["stages"].items():
+            if info["seconds"] is not None:
+                metrics.observe('stage_seconds', info["seconds"], path=job["job_type"], stage=stage)
+    finally:
+        metrics.inc('training_jobs_total', job=job["job_type"], state=job["state"])
+        training_done[job_id].set()
 
-@app.get("/api/train/status")
-def get_training_status():
-    """Retorna status do treinamento dos modelos"""
-    return training_status
+def sync_training_status():
+    """Reflete no training_status a versão, data e métricas do bundle ativo"""
+    bundle = model_registry.active
+    if bundle is not None:
+        training_status["model_version"] = bundle.version
+        training_status["last_trained"] = bundle.trained_at
+        training_status["metrics"] = bundle.metrics
+
+def training_job_snapshot(job_id):
+    """Estado do job com o progresso por etapa publicado pelo processo de treinamento (None se não existir)"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        return None
+    job = dict(job)
+    if "progress" not in job and training_progress is not None:
+        progress = training_progress.get(job_id)
+        if progress is not None:
+            job["progress"] = progress
+            if job["state"] == "queued":
+                job["state"] = "running"
+    return job
 
 # --- Prediction Endpoints ---
 
 @app.post("/api/predict/desligamento", response_model=List[TurnoverPredictionResponse])
-def predict_desligamento(employees: List[EmployeeData]):
-    """Prediz risco de desligamento para lista de colaboradores"""
-    if rf_model is None or hmm_model is None:
-        raise HTTPException(status_code=400, detail="Models not trained. Call /api/train/models first")
+async def predict_desligamento(
+    employees: List[EmployeeData],
+    response_format: Literal['default', 'rows', 'columnar'] = 'default'
+):
+    """
+    Prediz risco de desligamento para lista de colaboradores
+
+    O cache fica nas threads de I/O e os modelos rodam no pool de processos de
+    scoring; com os pools cheios a resposta é 429. O trabalho por linha (dicts
+    dos colaboradores, linhas da resposta e JSON) roda nas threads de I/O, e a
+    resposta sai já serializada, sem passar pelo response_model no event loop.
+
+    response_format:
+        default: lista de TurnoverPredictionResponse (validada contra o schema na thread)
+        rows: mesma lista, serializada direto dos arrays para JSON (sem validação por linha)
+        columnar: um objeto com um array por campo
+    """
+    bundle = require_models()
+    stages = StageTimer('predict')
 
     try:
-        # Converter para DataFrame
-        df = pd.DataFrame([emp.dict() for emp in employees])
-        print(f"Recebidos {len(df)} colaboradores para predição")
-
-        # Para novas predições, simular um estado HMM baseado nos scores médios
-        # Em produção, isso viria de histórico real
-        df['current_hmm_state'] = simulate_hmm_states(df)
-        
-        # Gerar probabilidades de estado fake
-        state_probs = simulate_state_probabilities(df, n_states=3)
-
-        # Predições
-        df_pred = rf_model.predict_risk(df, state_probs=state_probs)
-
-        # Formatar resposta
-        predictions = []
-        for _, row in df_pred.iterrows():
-            predictions.append(
-                TurnoverPredictionResponse(
-                    employee_id=int(row['employee_id']),
-                    desligamento_risk=float(row['desligamento_risk']),
-                    risk_category=str(row['risk_category']),
-                    confidence=float(max(row['desligamento_risk'], 1 - row['desligamento_risk']))
-                )
-            )
+        records = await io_executor.run(employee_records, employees)
+        print(f"Recebidos {len(records)} colaboradores para predição")
+        if profiling_requested():
+            # Tudo em uma thread, sob o cProfile (o pool de processos ficaria fora do .prof)
+            result = await io_executor.run(profiled(score_records), bundle, records, stages.start)
+        else:
+            result = await score_records_async(bundle, records, stages)
+        print(f"Predições geradas para {len(records)} colaboradores")
+        metrics.inc('rows_scored_total', len(records), path='predict')
 
-        print(f"Predições geradas para {len(predictions)} colaboradores")
-        return predictions
+        # Até a resposta começar a sair
+        stages.start('serialization')
+        content = await io_executor.run(serialize_predictions, result, response_format)
+        return Response(content=content, media_type="application/json")
+    except SaturatedError:
+        raise
     except Exception as e:
         print(f"Erro durante predição: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Erro durante predição: {str(e)}")
 
+@app.post("/api/predict/bulk")
+async def predict_bulk(
+    file: UploadFile = File(...),
+    input_format: Optional[Literal['csv', 'ndjson']] = None,
+    output_format: Literal['ndjson', 'csv'] = 'ndjson',
+    chunk_size: int = 10_000,
+    persist_scores: bool = True
+):
+    """
+    Predição em massa a partir de um arquivo CSV ou NDJSON
+
+    O arquivo é lido e pontuado em blocos de chunk_size linhas e o resultado é
+    devolvido em streaming (NDJSON ou CSV), então a memória fica limitada ao bloco
+    atual e as primeiras linhas saem antes do fim da leitura. Com persist_scores
+    (padrão) cada bloco também atualiza os scores e agregados do dashboard.
+    Leitura, gravação e serialização rodam nas threads de I/O e o scoring no
+    pool de processos; depois do primeiro bloco o stream espera vaga nos pools
+    em vez de responder 429.
+    """
+    bundle = require_models()  # O arquivo inteiro é pontuado com o mesmo bundle
+    stages = StageTimer('predict_bulk')
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size deve ser positivo")
+
+    input_format = input_format or ('csv' if (file.filename or '').lower().endswith('.csv') else 'ndjson')
+    try:
+        # Validar o primeiro bloco antes de começar o streaming (erros ainda viram 400)
+        chunks, first_chunk = await io_executor.run(profiled(read_bulk_chunks), file.file, input_format, chunk_size)
+    except SaturatedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao ler arquivo: {str(e)}")
+
+    async def stream_predictions():
+        # Etapas por bloco: parse (leitura), scoring (hmm_inference, prepare_features, predict_proba),
+        # persist, serialization e send (espera do cliente consumir o bloco)
+        n_rows = 0
+        chunk, i = first_chunk, 0
+        try:
+            while chunk is not None:
+                histories = chunk.pop('survey_history').tolist() if 'survey_history' in chunk.columns else None
+                result = await score_frame_async(bundle, chunk, histories, stages, wait=True)
+                if persist_scores:
+                    stages.start('persist')
+                    await io_executor.run(functools.partial(
+                        score_store.record_scores,
+                        result['employee_id'], result['desligamento_risk'], result['risk_category'],
+                        {col: chunk[col].to_numpy() for col in AGGREGATE_DIMENSIONS},
+                        model_version=bundle.version
+                    ), wait=True)
+                n_rows += len(chunk)
+                metrics.inc('rows_scored_total', len(chunk), path='predict_bulk')
+                stages.start('serialization')
+                payload = await io_executor.run(serialize_bulk_chunk, result, output_format, i == 0, wait=True)
+                stages.start('send')
+                yield payload
+                stages.start('parse')
+                chunk, i = await io_executor.run(next, chunks, None, wait=True), i + 1
+        finally:
+            stages.finish()
+        print(f"Predição em massa concluída: {n_rows} colaboradores")
+
+    media_type = "text/csv" if output_format == 'csv' else "application/x-ndjson"
+    return StreamingResponse(stream_predictions(), media_type=media_type)
+
 @app.post("/api/predict/single")
-def predict_single_employee(employee: EmployeeData):
-    """Prediz risco de desligamento para um único colaborador"""
-    result = predict_desligamento([employee])
-    return result[0] if result else None
+async def predict_single_employee(employee: EmployeeData):
+    """
+    Prediz risco de desligamento para um único colaborador
+
+    Requisições concorrentes são agrupadas pelo micro-batching (até
+    PREDICT_BATCH_MAX_SIZE colaboradores, esperando no máximo
+    PREDICT_BATCH_MAX_WAIT_MS pelo lote) e pontuadas juntas em um lote
+    vetorizado; um lote de um só usa o caminho de baixa latência (vetor de
+    features direto do payload, floresta achatada linha a linha). Mesmo
+    resultado de /api/predict/desligamento com um colaborador. Requisições
+    com profiling rodam sozinhas, fora dos lotes.
+    """
+    bundle = require_models()
+    stages = StageTimer('predict_single')
+
+    try:
+        record = employee.dict()
+        if prediction_batcher.enabled and not profiling_requested():
+            # Espera do lote + pontuação (as etapas do lote ficam no caminho predict_single_batch)
+            stages.start('batch')
+            risk, category = await prediction_batcher.submit((bundle, record))
+        else:
+            risk, category = await io_executor.run(profiled(score_single), bundle, record, stages.start)
+    except SaturatedError:
+        raise
+    except Exception as e:
+        print(f"Erro durante predição: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Erro durante predição: {str(e)}")
+
+    metrics.inc('rows_scored_total', path='predict_single')
+    stages.start('serialization')
+    return TurnoverPredictionResponse(
+        employee_id=employee.employee_id,
+        desligamento_risk=risk,
+        risk_category=RISK_CATEGORIES[category],
+        confidence=max(risk, 1 - risk)
+    )
+
+# --- Model Version Endpoints ---
+
+@app.get("/api/models/versions")
+async def list_model_versions():
+    """Lista as versões de modelo salvas em models/ e a versão ativa"""
+    bundle = model_registry.active
+    return {
+        "active": bundle.version if bundle is not None else None,
+        "pinned": model_registry.pinned,
+        "versions": await io_executor.run(model_registry.list_versions)
+    }
+
+@app.get("/api/models/evaluation")
+async def get_model_evaluation():
+    """Avaliação do modelo ativo no holdout: curvas ROC e precisão-revocação, calibração e matriz de confusão"""
+    bundle = require_models()
+    evaluation = await io_executor.run(model_registry.load_evaluation, bundle.version)
+    if evaluation is None:
+        raise HTTPException(status_code=404, detail="Versão ativa sem avaliação salva")
+    return {"version": bundle.version, **{name: values.tolist() for name, values in evaluation.items()}}
+
+@app.post("/api/models/activate/{version}")
+async def activate_model_version(version: str, pin: bool = True):
+    """Ativa uma versão salva; com pin=true (padrão) treinamentos novos não a substituem"""
+    try:
+        bundle = await io_executor.run(functools.partial(model_registry.activate, version, pin=pin))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    sync_training_status()
+    return {"active": bundle.version, "pinned": model_registry.pinned, "metrics": bundle.metrics}
+
+@app.post("/api/models/rollback")
+async def rollback_model_version():
+    """Volta (e fixa) a versão anterior à ativa"""
+    try:
+        bundle = await io_executor.run(model_registry.rollback)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    sync_training_status()
+    return {"active": bundle.version, "pinned": model_registry.pinned, "metrics": bundle.metrics}
+
+@app.post("/api/models/unpin")
+async def unpin_model_version():
+    """Libera a versão fixada: o próximo treinamento volta a ser ativado automaticamente"""
+    await io_executor.run(model_registry.unpin)
+    return {"active": model_registry.active.version if model_registry.active else None, "pinned": False}
+
+# --- Prediction Cache Endpoints ---
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Contadores do cache de predições (hits, misses, entradas, versão do modelo em cache)"""
+    return prediction_cache.stats()
+
+@app.post("/api/cache/clear")
+async def clear_cache():
+    """Esvazia o cache de predições (memória e disco)"""
+    await io_executor.run(prediction_cache.clear)
+    return prediction_cache.stats()
 
 # --- Analytics Endpoints ---
 
 @app.get("/api/analytics/feature-importance")
-def get_feature_importance(top_n: int = 15):
+async def get_feature_importance(top_n: int = 15):
     """Retorna features mais importantes para desligamento"""
-    if rf_model is None:
+    bundle = model_registry.active
+    if bundle is None:
         raise HTTPException(status_code=400, detail="Model not trained")
     
     try:
-        importance_df = rf_model.get_feature_importance(top_n=top_n)
+        importance_df = await io_executor.run(functools.partial(bundle.rf_model.get_feature_importance, top_n=top_n))
         return importance_df.to_dict('records')
+    except SaturatedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao obter feature importance: {str(e)}")
 
 @app.get("/api/analytics/dashboard", response_model=DashboardMetrics)
-def get_dashboard_metrics():
-    """Retorna métricas resumidas para o dashboard"""
+async def get_dashboard_metrics():
+    """Retorna métricas resumidas para o dashboard (agregados materializados dos scores gravados)"""
     try:
-        # Simular métricas para demo (em produção, viria do banco de dados)
+        summary = await io_executor.run(score_store.summary)
         metrics = DashboardMetrics(
             model_status=training_status["status"],
-            total_employees=training_status.get("metrics", {}).get("n_employees", 0),
-            avg_desligamento_risk=0.35,  # Média simulada
-            high_risk_count=75,
-            medium_risk_count=150,
-            low_risk_count=275,
+            total_employees=summary["total_employees"],
+            avg_desligamento_risk=summary["avg_desligamento_risk"],
+            high_risk_count=summary["risk_counts"]["Alto"],
+            medium_risk_count=summary["risk_counts"]["Médio"],
+            low_risk_count=summary["risk_counts"]["Baixo"],
             last_trained=training_status.get("last_trained"),
             model_performance=training_status.get("metrics")
         )
         return metrics
+    except SaturatedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao obter métricas: {str(e)}")
 
+@app.get("/api/analytics/risk-breakdown")
+async def get_risk_breakdown(dimension: Literal['departamento', 'nivel', 'localizacao'] = 'departamento'):
+    """Colaboradores por categoria de risco e risco médio para cada valor da dimensão"""
+    return {"dimension": dimension, "groups": await io_executor.run(score_store.breakdown, dimension)}
+
 # --- Data Generation Endpoints ---
 
 @app.post("/api/data/generate")
-def generate_sample_dataset(n_employees: int = 500, n_months: int = 12):
+async def generate_sample_dataset(n_employees: int = 500, n_months: int = 12):
     """Gera um dataset sintético de exemplo"""
     try:
-        df = generate_synthetic_dataset(n_employees=n_employees, n_months=n_months)
-        
-        # Salvar
-        os.makedirs('data', exist_ok=True)
-        filepath = f'data/employees_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        df_to_save = df.drop('survey_history', axis=1)
-        df_to_save.to_csv(filepath, index=False)
-        
-        return {
-            "status": "Dataset generated successfully",
-            "filepath": filepath,
-            "n_employees": len(df),
-            "turnover_rate": float(df['desligamento'].mean()),
-            "columns": list(df_to_save.columns)
-        }
+        return await io_executor.run(write_sample_dataset, n_employees, n_months)
+    except SaturatedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao gerar dataset: {str(e)}")
 
 # --- File Endpoints ---
 
 @app.get("/api/files/roc-curve")
-def get_roc_curve():
-    """Retorna o gráfico da curva ROC"""
-    roc_path = "roc_curve.png"
-    if os.path.exists(roc_path):
-        return FileResponse(roc_path, media_type="image/png", filename="roc_curve.png")
-    else:
+async def get_roc_curve():
+    """
+    Retorna o gráfico da curva ROC do modelo ativo
+
+    Renderizado na primeira requisição a partir dos arrays de avaliação salvos
+    com a versão e guardado em models/<versão>/roc_curve.png para as seguintes.
+    """
+    bundle = model_registry.active
+    if bundle is None:
         raise HTTPException(status_code=404, detail="ROC curve not found. Train models first.")
+    roc_path = await io_executor.run(render_roc_for_version, bundle.version)
+    if roc_path is None:
+        raise HTTPException(status_code=404, detail="ROC curve not found. Train models first.")
+    return FileResponse(roc_path, media_type="image/png", filename="roc_curve.png")
 
 @app.post("/api/files/upload")
-def upload_dataset(file: UploadFile = File(...)):
-    """Upload de arquivo CSV com dados de colaboradores"""
+async def upload_dataset(
+    file: UploadFile = File(...),
+    convert: Optional[Literal['parquet', 'feather']] = None,
+    strict: bool = False
+):
+    """
+    Upload de arquivo CSV com dados de colaboradores
+
+    O arquivo é gravado em blocos e, na mesma passada, validado contra o schema
+    de EmployeeData e perfilado (`<nome>_profile.json`). `convert` grava também
+    um Parquet/Feather para treinos mais rápidos (requer pyarrow); `strict=true`
+    rejeita o arquivo se houver linhas inválidas.
+    """
     try:
-        # Salvar arquivo
-        os.makedirs('data', exist_ok=True)
-        filepath = f"data/{file.filename}"
-        
-        with open(filepath, "wb") as buffer:
-            content = file.file.read()
-            buffer.write(content)
-        
-        # Verificar conteúdo
-        df = pd.read_csv(filepath)
-        
-        return {
-            "status": "File uploaded successfully",
-            "filepath": filepath,
-            "filename": file.filename,
-            "n_rows": len(df),
-            "columns": list(df.columns)
-        }
+        return await io_executor.run(save_uploaded_dataset, file, convert, strict)
+    except SaturatedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro no upload: {str(e)}")
 
 # --- Helper Functions ---
 
-def simulate_hmm_states(df):
-    """Simula estados HMM baseado em scores médios (para novas predições)"""
-    states = []
-    for _, row in df.iterrows():
-        # Lógica simples: baseado na média dos scores
-        avg_score = np.mean([
-            row['avg_engidadement'],
-            row['satisfacao_media'],
-            row['reconhecimento_medio'],
-            row['crescimento_medio'],
-            row['avg_manidader_rel'],
-            row['equilibrio_vida_trabalho_medio']
-        ])
-        
-        if avg_score >= 4.0:
-            state = 0  # Estado "Engajado"
-        elif avg_score >= 3.0:
-            state = 1  # Estado "Neutro"
-        else:
-            state = 2  # Estado "Risco de Saída"
-        
-        states.append(state)
-    
-    return states
-
-def simulate_state_probabilities(df, n_states=3):
-    """Simula probabilidades de estado para novas predições"""
-    probs = []
-    for _, row in df.iterrows():
-        # Lógica simples baseada nos scores
-        avg_score = np.mean([
-            row['avg_engidadement'],
-            row['satisfacao_media'],
-            row['reconhecimento_medio'],
-            row['crescimento_medio'],
-            row['avg_manidader_rel'],
-            row['equilibrio_vida_trabalho_medio']
-        ])
-        
-        # Distribuir probabilidade baseada no score médio
-        if avg_score >= 4.0:
-            prob = [0.7, 0.25, 0.05]  # Mais provável estar engajado
-        elif avg_score >= 3.0:
-            prob = [0.2, 0.6, 0.2]    # Mais provável estar neutro
-        else:
-            prob = [0.05, 0.25, 0.7]  # Mais provável estar em risco
-        
-        probs.append(prob)
-    
-    return probs
-
-def add_fake_survey_history(df):
-    """Adiciona histórico fake de survey baseado nas médias (para CSVs sem histórico)"""
-    for idx, row in df.iterrows():
-        # Gerar 12 meses de histórico baseado nas médias
-        survey_history = []
-        for month in range(1, 13):
-            survey_history.append({
-                'month': month,
-                'engajamento': row['avg_engidadement'] + np.random.normal(0, 0.5),
-                'satisfaction': row['satisfacao_media'] + np.random.normal(0, 0.5),
-                'recognition': row['reconhecimento_medio'] + np.random.normal(0, 0.5),
-                'growth': row['crescimento_medio'] + np.random.normal(0, 0.5),
-                'manager_rel': row['avg_manidader_rel'] + np.random.normal(0, 0.5),
-                'work_life': row['equilibrio_vida_trabalho_medio'] + np.random.normal(0, 0.5)
-            })
-        
-        df.at[idx, 'survey_history'] = survey_history
-    
-    return df
+def write_sample_dataset(n_employees, n_months):
+    """Gera e salva um dataset sintético em data/ (roda no pool de I/O)"""
+    df = generate_synthetic_dataset(n_employees=n_employees, n_months=n_months)
+
+    # Salvar
+    os.makedirs('data', exist_ok=True)
+    filepath = f'data/employees_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    save_dataset(df, filepath)
+
+    return {
+        "status": "Dataset generated successfully",
+        "filepath": filepath,
+        "history_filepath": history_path_for(filepath),
+        "n_employees": len(df),
+        "turnover_rate": float(df['desligamento'].mean()),
+        "columns": list(df.columns)
+    }
+
+def render_roc_for_version(version):
+    """Caminho do gráfico ROC da versão, renderizado se ainda não existir (None se a versão não tem avaliação)"""
+    roc_path = os.path.join(model_registry.root, version, "roc_curve.png")
+    with roc_render_lock:
+        if not os.path.exists(roc_path):
+            evaluation = model_registry.load_evaluation(version)
+            if evaluation is None:
+                return None
+            render_roc_curve(evaluation, roc_path)
+    return roc_path
+
+def save_uploaded_dataset(file, convert=None, strict=False):
+    """Grava o arquivo enviado em data/ validando e perfilando em uma passada (roda no pool de I/O)"""
+    os.makedirs('data', exist_ok=True)
+    filepath = os.path.join('data', os.path.basename(file.filename))
+    profile = ingest_upload(file.file, filepath, UPLOAD_SCHEMA, API_COLUMN_ALIASES, convert=convert, strict=strict)
+
+    return {
+        "status": "File uploaded successfully",
+        "filepath": filepath,
+        "filename": file.filename,
+        "n_rows": profile['n_rows'],
+        "columns": list(profile['columns']),
+        "validation": profile['validation'],
+        "profile_path": profile['profile_path'],
+        "converted_path": profile['converted_path']
+    }
+
+# Colunas que um arquivo de predição em massa precisa ter (survey_history é opcional)
+BULK_REQUIRED_COLUMNS = [name for name in EmployeeData.model_fields if name != 'survey_history']
+
+# Tipo de cada coluna validada no upload de datasets
+UPLOAD_SCHEMA = {name: EmployeeData.model_fields[name].annotation for name in BULK_REQUIRED_COLUMNS}
+
+def require_models():
+    """Bundle de modelos ativo (a requisição usa este mesmo bundle do início ao fim)"""
+    bundle = model_registry.active
+    if bundle is None:
+        raise HTTPException(status_code=400, detail="Models not trained. Call /api/train/models first")
+    return bundle
+
+def score_records(bundle, records, on_stage=None):
+    """
+    Pontua colaboradores (dicts de EmployeeData) usando o cache de predições
+
+    Só os colaboradores sem predição em cache para a versão do bundle passam
+    pelos modelos. Retorna o mesmo dict de arrays de score_frame.
+    on_stage: callback opcional chamado com o nome de cada etapa ao iniciá-la (ver StageTimer)
+    """
+    result, missing = lookup_cached_scores(bundle, records, on_stage=on_stage)
+    if missing is not None:
+        store_scored(bundle, result, missing, score_frame(bundle, missing['df'], missing['histories'], on_stage=on_stage))
+    return result
+
+async def score_records_async(bundle, records, stages):
+    """score_records sem bloquear o event loop: cache nas threads de I/O, modelos no pool de scoring"""
+    result, missing = await io_executor.run(lookup_cached_scores, bundle, records, stages.start)
+    if missing is not None:
+        scored = await score_frame_async(bundle, missing['df'], missing['histories'], stages)
+        await io_executor.run(store_scored, bundle, result, missing, scored)
+    return result
+
+def lookup_cached_scores(bundle, records, on_stage=None):
+    """
+    Predições em cache dos colaboradores: (resultado parcial, colaboradores a pontuar ou None)
+
+    Os colaboradores a pontuar vêm como DataFrame + históricos de survey, na
+    forma de entrada de score_frame; o resultado é completado por store_scored.
+    """
+    if on_stage is not None:
+        on_stage('cache_lookup')
+    n = len(records)
+    risk = np.empty(n)
+    category = np.empty(n, dtype=np.int8)
+    keys = [payload_key(record) for record in records] if prediction_cache.enabled else None
+    cached = prediction_cache.get_many(bundle.version, keys) if keys is not None else [None] * n
+
+    indices = [i for i, value in enumerate(cached) if value is None]
+    for i, value in enumerate(cached):
+        if value is not None:
+            risk[i], category[i] = value
+
+    result = {
+        'employee_id': np.fromiter((record['employee_id'] for record in records), dtype=np.int64, count=n),
+        'desligamento_risk': risk,
+        'risk_category': category,
+        'confidence': np.maximum(risk, 1 - risk)
+    }
+    if not indices:
+        return result, None
+
+    # Converter para DataFrame (histórico de survey fica à parte)
+    histories = [records[i].pop('survey_history') for i in indices]
+    return result, {
+        'indices': indices,
+        'keys': [keys[i] for i in indices] if keys is not None else None,
+        'df': pd.DataFrame([records[i] for i in indices]),
+        'histories': histories
+    }
+
+def store_scored(bundle, result, missing, scored):
+    """Completa o resultado de lookup_cached_scores com as predições novas e as guarda no cache"""
+    indices = missing['indices']
+    result['desligamento_risk'][indices] = scored['desligamento_risk']
+    result['risk_category'][indices] = scored['risk_category']
+    result['confidence'][indices] = scored['confidence']
+    if missing['keys'] is not None:
+        prediction_cache.put_many(bundle.version, missing['keys'], scored['desligamento_risk'], scored['risk_category'])
+
+async def score_frame_async(bundle, df, histories, stages, wait=False):
+    """
+    score_frame no pool de processos de scoring (ou nas threads de I/O, com SCORING_PROCESSES=0)
+
+    O processo carrega o bundle pela versão no registro. A etapa scoring_process
+    cobre fila, transferência e scoring; as etapas medidas no processo são
+    registradas à parte no mesmo caminho do StageTimer.
+    """
+    if scoring_executor is None:
+        return await io_executor.run(score_frame, bundle, df, histories, stages.start, wait=wait)
+    stages.start('scoring_process')
+    result = await scoring_executor.run(
+        score_frame_in_worker, model_registry.root, bundle.version, df, histories, wait=wait
+    )
+    for stage, seconds in result.pop('stage_seconds').items():
+        stages.observe(stage, seconds)
+    return result
+
+def read_bulk_chunks(file, input_format, chunk_size):
+    """Iterador de blocos de um arquivo de predição em massa e o primeiro bloco, já validado"""
+    if input_format == 'csv':
+        chunks = map(parse_csv_survey_history, pd.read_csv(file, chunksize=chunk_size))
+    else:
+        chunks = iter(pd.read_json(file, lines=True, chunksize=chunk_size))
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        raise ValueError("Arquivo vazio")
+    missing = [col for col in BULK_REQUIRED_COLUMNS if col not in first_chunk.columns]
+    if missing:
+        raise ValueError(f"Colunas obrigatórias ausentes: {missing}")
+    return chunks, first_chunk
+
+def parse_csv_survey_history(chunk):
+    """
+    Converte a coluna survey_history de um bloco CSV (JSON em texto, lista de meses) para listas
+
+    Células vazias ficam sem histórico; JSON inválido ou que não seja lista é
+    erro, para o histórico enviado não ser descartado em silêncio.
+    """
+    if 'survey_history' not in chunk.columns:
+        return chunk
+    histories = []
+    for row, value in zip(chunk.index, chunk['survey_history']):
+        if not isinstance(value, str) or not value.strip():
+            histories.append(None)
+            continue
+        try:
+            history = json.loads(value)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"survey_history inválido na linha {row + 1}: {e}")
+        if not isinstance(history, list):
+            raise ValueError(f"survey_history na linha {row + 1} deve ser uma lista de meses")
+        histories.append(history)
+    chunk['survey_history'] = histories
+    return chunk
+
+def score_single(bundle, record, on_stage=None):
+    """
+    Pontua um colaborador (dict de EmployeeData) pelo caminho de uma linha, usando o cache de predições
+
+    Retorna (desligamento_risk, código da categoria de risco).
+    """
+    if on_stage is not None:
+        on_stage('cache_lookup')
+    key = payload_key(record) if prediction_cache.enabled else None
+    cached = prediction_cache.get_many(bundle.version, [key])[0] if key is not None else None
+    if cached is not None:
+        return cached
+
+    if on_stage is not None:
+        on_stage('hmm_inference')
+    history = record.pop('survey_history')
+    record['current_hmm_state'], state_probs = infer_hmm_state_one(bundle.hmm_model, record, history)
+    risk, category = bundle.rf_model.predict_risk_one(record, state_probs=state_probs, on_stage=on_stage)
+    if key is not None:
+        prediction_cache.put_many(bundle.version, [key], [risk], [category])
+    return risk, category
+
+def score_single_batch(items):
+    """
+    Pontua um lote do micro-batching de /api/predict/single: itens (bundle, record)
+
+    Cada bundle (versão) é pontuado em um lote vetorizado (score_records); um
+    colaborador sozinho vai pelo caminho de uma linha. Se o lote falhar, os
+    colaboradores são pontuados um a um, para o erro voltar só para quem o causou.
+    Retorna um (risk, categoria) ou a exceção por item, na ordem dos itens.
+    """
+    stages = StageTimer('predict_single_batch')
+    results = [None] * len(items)
+    groups = {}
+    for i, (bundle, _) in enumerate(items):
+        groups.setdefault(bundle.version, (bundle, []))[1].append(i)
+
+    def score_each(bundle, indices):
+        for i in indices:
+            try:
+                results[i] = score_single(bundle, dict(items[i][1]), on_stage=stages.start)
+            except Exception as e:
+                results[i] = e
+
+    try:
+        for bundle, indices in groups.values():
+            if len(indices) == 1:
+                score_each(bundle, indices)
+                continue
+            try:
+                scored = score_records(bundle, [dict(items[i][1]) for i in indices], on_stage=stages.start)
+            except Exception:
+                score_each(bundle, indices)
+                continue
+            for i, risk, category in zip(indices, scored['desligamento_risk'].tolist(), scored['risk_category'].tolist()):
+                results[i] = (risk, category)
+    finally:
+        stages.finish()
+    metrics.inc('prediction_batches_total', path='predict_single')
+    return results
+
+prediction_batcher = MicroBatcher(
+    score_single_batch,
+    max_batch_size=PREDICT_BATCH_MAX_SIZE,
+    max_wait_seconds=PREDICT_BATCH_MAX_WAIT_MS / 1000,
+    executor=io_executor,
+    max_pending=PREDICT_BATCH_MAX_PENDING
+)
+
+def prediction_columns(result):
+    """Colunas da resposta de predição como listas Python (categorias de risco já como texto)"""
+    return {
+        'employee_id': result['employee_id'].tolist(),
+        'desligamento_risk': result['desligamento_risk'].tolist(),
+        'risk_category': np.asarray(RISK_CATEGORIES, dtype=object)[result['risk_category']].tolist(),
+        'confidence': result['confidence'].tolist()
+    }
+
+def prediction_rows(result):
+    """Linhas da resposta de predição (dicts no formato de TurnoverPredictionResponse)"""
+    columns = prediction_columns(result)
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+def serialize_bulk_chunk(result, output_format, header=True):
+    """Serializa um bloco da predição em massa (CSV ou NDJSON)"""
+    if output_format == 'csv':
+        return pd.DataFrame(prediction_columns(result)).to_csv(index=False, header=header)
+    return ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in prediction_rows(result))
+
+# Schema da resposta padrão de /api/predict/desligamento (o mesmo do response_model)
+prediction_list_adapter = TypeAdapter(List[TurnoverPredictionResponse])
+
+def serialize_predictions(result, response_format):
+    """Serializa os arrays de predição em JSON ('default' validado contra o schema, 'rows' ou 'columnar')"""
+    if response_format == 'default':
+        return prediction_list_adapter.dump_json(prediction_list_adapter.validate_python(prediction_rows(result)))
+    if response_format == 'columnar':
+        payload = prediction_columns(result)
+    else:
+        payload = prediction_rows(result)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+def employee_records(employees):
+    """Dicts dos colaboradores de uma requisição de predição (roda no pool de I/O)"""
+    return [emp.dict() for emp in employees]
 
 # Load existing models on startup if they exist
 @app.on_event("startup")
 def load_models():
-    global hmm_model, rf_model, training_status
-    
     try:
-        if os.path.exists('models/hmm_model.pkl') and os.path.exists('models/rf_model.pkl'):
-            hmm_model = joblib.load('models/hmm_model.pkl')
-            rf_model = joblib.load('models/rf_model.pkl')
+        bundle = model_registry.load_active()
+        if bundle is not None:
             training_status["status"] = "trained"
-            print("Modelos carregados do disco")
+            sync_training_status()
+            print(f"Modelos carregados do disco (versão {bundle.version})")
         else:
             print("Nenhum modelo encontrado. Execute /api/train/models para treinar.")
     except Exception as e:
         print(f"Erro ao carregar modelos: {e}")
 
+@app.on_event("shutdown")
+def shutdown_training_pool():
+    global training_executor, training_manager, training_progress
+    with training_lock:
+        executor, manager = training_executor, training_manager
+        training_executor = training_manager = training_progress = None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        manager.shutdown()
+
+@app.on_event("shutdown")
+def shutdown_executors():
+    io_executor.shutdown()
+    if scoring_executor is not None:
+        scoring_executor.shutdown()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
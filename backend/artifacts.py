@@ -0,0 +1,126 @@
+"""
+Formato de artefato dos modelos servidos
+
+Um diretório de versão (models/<versão>/) contém:
+    manifest.json       schema, versão, métricas, features, categorias e lista de arrays
+    hmm_*.npy           parâmetros do GaussianHMM (startprob, transmat, means, covars)
+    forest_*.npy        Random Forest achatada (ver flat_forest.flatten_forest)
+
+Todos os .npy são salvos sem compressão, para np.load(mmap_mode='r'): o
+carregamento não desserializa objetos do sklearn e vários workers do uvicorn
+compartilham as páginas do modelo.
+"""
+import json
+import os
+
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+
+from flat_forest import FOREST_ARRAYS, FlatForest, flatten_forest
+from models import CATEGORICAL_COLS, SurveyStateDetector, TurnoverPredictor
+
+ARTIFACT_SCHEMA = 'people-analytics-model'
+ARTIFACT_SCHEMA_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+
+HMM_ARRAYS = ['startprob', 'transmat', 'means', 'covars']
+
+def export_artifacts(path, hmm_model, rf_model, version, metrics=None, trained_at=None):
+    """Exporta HMM e Random Forest treinados para o formato de artefato em `path`"""
+    os.makedirs(path, exist_ok=True)
+    files = {}
+
+    hmm = hmm_model.model
+    for name in HMM_ARRAYS:
+        files[f'hmm_{name}'] = _save_array(path, f'hmm_{name}', getattr(hmm, f'{name}_'))
+
+    forest = rf_model.model
+    if isinstance(forest, FlatForest):
+        forest_arrays = {name: getattr(forest, name) for name in FOREST_ARRAYS}
+        forest_meta = {
+            'n_trees': forest.n_estimators,
+            'n_nodes': int(len(forest.left)),
+            'max_depth': forest.max_depth,
+            'n_features': forest.n_features_in_,
+            'classes': forest.classes_.tolist()
+        }
+    else:
+        forest_arrays, forest_meta = flatten_forest(forest)
+    forest_arrays['feature_importances'] = forest.feature_importances_
+    for name, array in forest_arrays.items():
+        files[f'forest_{name}'] = _save_array(path, f'forest_{name}', array)
+
+    manifest = {
+        'schema': ARTIFACT_SCHEMA,
+        'schema_version': ARTIFACT_SCHEMA_VERSION,
+        'version': version,
+        'trained_at': trained_at,
+        'metrics': metrics or {},
+        'hmm': {
+            'n_states': hmm_model.n_states,
+            'covariance_type': hmm.covariance_type,
+            'feature_cols': hmm_model.feature_cols
+        },
+        'rf': {
+            'feature_names': rf_model.feature_names,
+            'categories': {col: rf_model.label_encoders[col].classes_.tolist() for col in CATEGORICAL_COLS},
+            **forest_meta
+        },
+        'files': files
+    }
+    tmp_path = os.path.join(path, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(path, MANIFEST_FILE))
+    return manifest
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('schema') != ARTIFACT_SCHEMA:
+        raise ValueError(f"Artefato com schema desconhecido: {manifest.get('schema')}")
+    if manifest.get('schema_version', 0) > ARTIFACT_SCHEMA_VERSION:
+        raise ValueError(f"Versão de schema não suportada: {manifest['schema_version']}")
+    return manifest
+
+def load_artifacts(path, mmap_mode='r'):
+    """
+    Carrega um artefato como (manifest, SurveyStateDetector, TurnoverPredictor)
+
+    O TurnoverPredictor usa uma FlatForest sobre os arrays (memory-mapped por padrão).
+    """
+    manifest = read_manifest(path)
+    files = manifest['files']
+
+    def load(name):
+        return np.load(os.path.join(path, files[name]), mmap_mode=mmap_mode)
+
+    hmm_meta = manifest['hmm']
+    hmm_model = SurveyStateDetector(n_states=hmm_meta['n_states'])
+    hmm = hmm_model.model
+    hmm.covariance_type = hmm_meta['covariance_type']
+    # Parâmetros pequenos: cópia em memória (o hmmlearn valida/normaliza esses arrays)
+    for name in HMM_ARRAYS:
+        setattr(hmm, f'{name}_', np.array(load(f'hmm_{name}')))
+    hmm.n_features = hmm.means_.shape[1]
+
+    rf_meta = manifest['rf']
+    rf_model = TurnoverPredictor()
+    rf_model.model = FlatForest(
+        {name: load(f'forest_{name}') for name in FOREST_ARRAYS},
+        rf_meta,
+        feature_importances=np.array(load('forest_feature_importances'))
+    )
+    rf_model.feature_names = rf_meta['feature_names']
+    for col, classes in rf_meta['categories'].items():
+        le = LabelEncoder()
+        le.classes_ = np.array(classes, dtype=object)
+        rf_model.label_encoders[col] = le
+        rf_model.encode_categories(col, [])  # Monta o lookup categoria -> código
+
+    return manifest, hmm_model, rf_model
+
+def _save_array(path, name, array):
+    filename = f'{name}.npy'
+    np.save(os.path.join(path, filename), np.ascontiguousarray(array))
+    return filename
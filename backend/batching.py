@@ -0,0 +1,94 @@
+"""
+Micro-batching de requisições concorrentes (asyncio)
+
+Requisições que chegam juntas são agrupadas em um lote e processadas de uma
+vez em uma thread, e cada uma recebe o seu resultado de volta. Um lote sai
+quando atinge max_batch_size itens ou quando o primeiro item esperou
+max_wait_seconds. Com max_concurrent_batches lotes já em processamento, os
+itens novos continuam acumulando e saem juntos quando um lote termina: sob
+carga os lotes crescem sozinhos (até max_batch_size). O lote roda em um
+contexto (contextvars) vazio: não pertence a nenhuma das requisições, então a
+instrumentação por requisição não o atribui a quem chegou primeiro.
+"""
+import asyncio
+import contextvars
+
+from executors import SaturatedError
+
+class MicroBatcher:
+    """
+    Agrupa chamadas concorrentes de submit(item) em chamadas de process_batch(items)
+
+    process_batch roda no executor (BoundedExecutor, esperando vaga; None =
+    executor padrão do loop) e devolve
+    um resultado por item, na ordem dos itens; um resultado que é uma exceção
+    vira a exceção só daquela chamada. Se process_batch levantar, todas as
+    chamadas do lote recebem a exceção. Com max_pending itens esperando lote,
+    submit levanta SaturatedError (backpressure).
+    """
+    def __init__(self, process_batch, max_batch_size=64, max_wait_seconds=0.002,
+                 max_concurrent_batches=1, executor=None, max_pending=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size deve ser positivo")
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.max_concurrent_batches = max_concurrent_batches
+        self.executor = executor
+        self.max_pending = max_pending
+        self._pending = []  # (item, future) na ordem de chegada
+        self._timer = None
+        self._running = set()  # tasks dos lotes em processamento
+
+    @property
+    def enabled(self):
+        return self.max_batch_size > 1
+
+    async def submit(self, item):
+        """Enfileira o item no próximo lote e espera o seu resultado"""
+        if self.max_pending is not None and len(self._pending) >= self.max_pending:
+            raise SaturatedError('predict_batch', self.max_pending)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_seconds, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending and len(self._running) < self.max_concurrent_batches:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            # Requisições canceladas (cliente desconectou) enquanto esperavam não entram no lote
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if batch:
+                task = asyncio.get_running_loop().create_task(self._run(batch), context=contextvars.Context())
+                self._running.add(task)
+
+    async def _run(self, batch):
+        try:
+            items = [item for item, _ in batch]
+            try:
+                if self.executor is None:
+                    results = await asyncio.get_running_loop().run_in_executor(None, self.process_batch, items)
+                else:
+                    results = await self.executor.run(self.process_batch, items, wait=True)
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self._running.discard(asyncio.current_task())
+            # Itens que acumularam durante o lote saem juntos agora
+            if self._pending:
+                self._flush()
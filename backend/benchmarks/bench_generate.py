@@ -0,0 +1,44 @@
+"""
+Benchmark do gerador de dados sintéticos
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_generate --sizes 10000 100000 1000000
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from generate_dataset import generate_synthetic_dataset
+
+def bench_generate(n_employees, n_months=12, repeat=3):
+    """Mede o melhor tempo de geração e a vazão em milhões de colaborador-mês por segundo"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = generate_synthetic_dataset(n_employees=n_employees, n_months=n_months)
+        best = min(best, time.perf_counter() - start)
+
+    employee_months = n_employees * n_months
+    return {
+        'n_employees': n_employees,
+        'n_months': n_months,
+        'seconds': best,
+        'seconds_per_million_employee_months': best / (employee_months / 1e6),
+        'million_employee_months_per_second': employee_months / 1e6 / best,
+        'turnover_rate': float(df['desligamento'].mean())
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'colaboradores':>14} {'tempo (s)':>10} {'s / 1M col-mês':>15} {'1M col-mês / s':>15}")
+    for n in args.sizes:
+        r = bench_generate(n, n_months=args.months, repeat=args.repeat)
+        print(f"{r['n_employees']:>14,} {r['seconds']:>10.3f} "
+              f"{r['seconds_per_million_employee_months']:>15.3f} {r['million_employee_months_per_second']:>15.2f}")
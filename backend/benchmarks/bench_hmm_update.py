@@ -0,0 +1,68 @@
+"""
+Benchmark da atualização incremental do HMM com uma nova onda de surveys
+
+Compara o caminho completo (SurveyStateDetector.fit do zero sobre todo o
+histórico + infer_history redecodificando todas as sequências) com o
+incremental (apply_survey_wave: warm start com poucas iterações de EM + um
+passo de filtro por colaborador).
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_hmm_update --employees 1000 --n-iter 5
+"""
+import argparse
+import copy
+import time
+
+import numpy as np
+
+from generate_dataset import generate_synthetic_dataset
+from hmm_updates import apply_survey_wave, filter_state_from_inference
+from models import SurveyStateDetector
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, default=1000)
+    parser.add_argument('--n-iter', type=int, default=5, help="Iterações de EM do warm start")
+    args = parser.parse_args()
+
+    df = generate_synthetic_dataset(n_employees=args.employees)
+    hmm_model = SurveyStateDetector(n_states=3).fit(df)
+    history = hmm_model.prepare_sequences(df)[2]
+    filter_state = filter_state_from_inference(history, hmm_model.infer_history(history))
+
+    # Onda nova: todos respondem, perto do último mês de cada um
+    rng = np.random.default_rng(0)
+    last_month = np.array([history[i][-1] for i in range(len(history))])
+    wave = np.clip(last_month + rng.normal(0, 0.3, last_month.shape), 1, 5).astype(np.float32)
+
+    incremental_model = copy.deepcopy(hmm_model)
+    incremental_seconds, (new_history, new_filter, stats) = timed(lambda: apply_survey_wave(
+        incremental_model, history, filter_state, history.employee_ids, wave, n_iter=args.n_iter
+    ))
+
+    def full_refit():
+        model = SurveyStateDetector(n_states=3)
+        model.model.fit(new_history.values, new_history.lengths)
+        return model, model.infer_history(new_history)
+    full_seconds, (full_model, full_inference) = timed(full_refit)
+
+    # Com os mesmos parâmetros o passo de filtro reproduz a redecodificação completa
+    redecode_seconds, redecoded = timed(lambda: hmm_model.infer_history(new_history))
+    step_seconds, (_, state_probs, current_state) = timed(
+        lambda: hmm_model.filter_step(filter_state['last_log_delta'], filter_state['state_probs'], wave)
+    )
+
+    print(f"{args.employees:,} colaboradores, +1 mês ({new_history.offsets[-1]:,} meses no histórico)")
+    print(f"  completo (fit do zero + infer_history):    {full_seconds:8.2f} s "
+          f"({full_model.model.monitor_.iter} iterações, log-verossimilhança {full_model.model.monitor_.history[-1]:,.1f})")
+    print(f"  incremental (warm start + passo de filtro): {incremental_seconds:8.2f} s "
+          f"({stats['em_iterations']} iterações, log-verossimilhança {stats['log_likelihood']:,.1f})")
+    print(f"  redecodificar todas as sequências:          {redecode_seconds:8.4f} s")
+    print(f"  só o passo de filtro:                       {step_seconds:8.4f} s "
+          f"(igual à redecodificação: {np.array_equal(current_state, redecoded['current_state'])}, "
+          f"{np.allclose(state_probs, redecoded['state_probs'])})")
@@ -0,0 +1,74 @@
+"""
+Benchmark do treinamento out-of-core (pico de memória e tempo)
+
+Compara, cada um em um processo novo (pico de RSS isolado):
+- em memória: dataset inteiro em um DataFrame (como run_training), matriz de
+  features montada de uma vez;
+- em blocos: training.iter_training_chunks + out_of_core (como
+  run_chunked_training), com histórico e features em memmap.
+
+O EM do HMM roda na mesma amostra nos dois modos (o EM no dataset inteiro
+domina o tempo e não é o que se quer medir); inferência do HMM e Random
+Forest usam todos os colaboradores.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_out_of_core --employees 200000 --chunk-size 20000
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from generate_dataset import generate_synthetic_dataset
+from models import SurveyStateDetector, TurnoverPredictor
+from out_of_core import fit_hmm_sample, infer_states, write_training_arrays
+from survey_store import get_survey_history
+from training import iter_training_chunks
+
+def train_in_memory(args, workspace):
+    df = generate_synthetic_dataset(n_employees=args.employees)
+    hmm_model = fit_hmm_sample(SurveyStateDetector(n_states=3), get_survey_history(df), args.hmm_sample_size)
+    inference = hmm_model.infer(df)
+    df['current_hmm_state'] = inference['current_state']
+    return TurnoverPredictor(reuse_cv_models=True).train(df, state_probs=inference['state_probs'])
+
+def train_chunked(args, workspace):
+    params = {'use_synthetic': True, 'n_employees': args.employees, 'n_months': 12, 'chunk_size': args.chunk_size}
+    hmm_model = SurveyStateDetector(n_states=3)
+    rf_model = TurnoverPredictor(reuse_cv_models=True)
+    arrays = write_training_arrays(iter_training_chunks(params), workspace, rf_model, hmm_model.n_states)
+    fit_hmm_sample(hmm_model, arrays['history'], args.hmm_sample_size)
+    infer_states(hmm_model, arrays['history'], arrays['X'], rf_model.feature_names, chunk_size=args.chunk_size)
+    return rf_model.train_matrix(arrays['X'], arrays['y'])
+
+def run(mode, args):
+    workspace = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = (train_chunked if mode == 'chunked' else train_in_memory)(args, workspace)
+        seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workspace)
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return seconds, peak_rss_mb, results['auc']
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, default=200_000)
+    parser.add_argument('--chunk-size', type=int, default=20_000)
+    parser.add_argument('--hmm-sample-size', type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{args.employees:,} colaboradores x 12 meses, blocos de {args.chunk_size:,}, "
+          f"EM do HMM em {args.hmm_sample_size:,} colaboradores")
+    for mode in ('memory', 'chunked'):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            seconds, peak_rss_mb, auc = executor.submit(run, mode, args).result()
+        label = 'em memória' if mode == 'memory' else 'em blocos'
+        print(f"  {label:<10}: {seconds:7.1f}s | pico de RSS {peak_rss_mb:7.0f} MB | test AUC {auc:.3f}")
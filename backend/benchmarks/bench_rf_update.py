@@ -0,0 +1,71 @@
+"""
+Benchmark do retreino incremental do Random Forest (floresta de janela deslizante)
+
+Simula lotes mensais de dados novos. A cada lote compara o retreino completo
+(TurnoverPredictor.train sobre todo o histórico acumulado, como em
+/api/train/models) com o incremental (TurnoverPredictor.update só no lote
+novo, como em /api/train/rf-update), medindo o tempo de parede e o AUC dos
+dois modelos em um mesmo holdout independente. Sem features do HMM, para
+isolar o custo do Random Forest.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_rf_update --batch-size 2000 --updates 4 --n-new-trees 40
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+from generate_dataset import generate_synthetic_dataset
+from models import TurnoverPredictor
+
+def timed(fn):
+    start = time.perf_counter()
+    # train/update imprimem relatórios a cada chamada
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    return time.perf_counter() - start, result
+
+def holdout_auc(rf_model, holdout):
+    return roc_auc_score(holdout['desligamento'], rf_model.predict_risk_arrays(holdout)['desligamento_risk'])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=2000, help="Colaboradores por lote")
+    parser.add_argument('--initial-batches', type=int, default=3, help="Lotes do treino inicial")
+    parser.add_argument('--updates', type=int, default=4, help="Lotes novos (um retreino por lote)")
+    parser.add_argument('--n-new-trees', type=int, default=40)
+    parser.add_argument('--window-size', type=int, default=None, help="Árvores mantidas (padrão: tamanho da floresta)")
+    parser.add_argument('--n-jobs', type=int, default=None)
+    args = parser.parse_args()
+
+    batches = [
+        generate_synthetic_dataset(n_employees=args.batch_size, seed=seed)
+        for seed in range(args.initial_batches + args.updates)
+    ]
+    holdout = generate_synthetic_dataset(n_employees=args.batch_size, seed=10_000)
+
+    seen = pd.concat(batches[:args.initial_batches], ignore_index=True)
+    incremental = TurnoverPredictor(n_jobs=args.n_jobs)
+    seconds, _ = timed(lambda: incremental.train(seen))
+    print(f"Treino inicial: {len(seen):,} colaboradores em {seconds:.2f}s, AUC holdout {holdout_auc(incremental, holdout):.3f}")
+    print(f"{'lote':>4} {'histórico':>10} | {'completo (s)':>12} {'AUC':>6} | {'incremental (s)':>15} {'AUC':>6} {'árvores':>7}")
+
+    totals = {'full': 0.0, 'incremental': 0.0}
+    for i, batch in enumerate(batches[args.initial_batches:], start=1):
+        seen = pd.concat([seen, batch], ignore_index=True)
+        full = TurnoverPredictor(n_jobs=args.n_jobs)
+        full_seconds, _ = timed(lambda: full.train(seen))
+        update_seconds, _ = timed(lambda: incremental.update(
+            batch, n_new_trees=args.n_new_trees, window_size=args.window_size
+        ))
+        totals['full'] += full_seconds
+        totals['incremental'] += update_seconds
+        print(f"{i:>4} {len(seen):>10,} | {full_seconds:>12.2f} {holdout_auc(full, holdout):>6.3f} | "
+              f"{update_seconds:>15.2f} {holdout_auc(incremental, holdout):>6.3f} {incremental.model.n_estimators:>7}")
+
+    print(f"Total: completo {totals['full']:.2f}s, incremental {totals['incremental']:.2f}s "
+          f"({totals['full'] / totals['incremental']:.1f}x)")
@@ -0,0 +1,89 @@
+"""
+Benchmark de latência da predição de um único colaborador
+
+Compara o caminho em lote (DataFrame + score_frame, usado antes por
+/api/predict/single) com o caminho de uma linha (infer_hmm_state_one +
+TurnoverPredictor.predict_risk_one sobre a FlatForest), conferindo que os
+dois dão o mesmo risco. Também mede o endpoint HTTP via TestClient.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_single --requests 2000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import app
+from models import generate_synthetic_data, SurveyStateDetector, TurnoverPredictor
+from registry import ModelRegistry
+
+def percentiles(fn, payloads):
+    latencies = np.empty(len(payloads))
+    for i, payload in enumerate(payloads):
+        start = time.perf_counter()
+        fn(payload)
+        latencies[i] = time.perf_counter() - start
+    return np.percentile(latencies, [50, 99]) * 1000
+
+def score_batch_path(bundle, employee):
+    record = employee.dict()
+    history = record.pop('survey_history')
+    result = app.score_frame(bundle, pd.DataFrame([record]), [history])
+    return float(result['desligamento_risk'][0])
+
+def score_single_path(bundle, employee):
+    record = employee.dict()
+    history = record.pop('survey_history')
+    record['current_hmm_state'], state_probs = app.infer_hmm_state_one(bundle.hmm_model, record, history)
+    return bundle.rf_model.predict_risk_one(record, state_probs=state_probs)[0]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, default=2000, help="Colaboradores no treino do Random Forest")
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    df = generate_synthetic_data(n_employees=args.employees)
+    hmm_model = SurveyStateDetector(n_states=3).fit(df.head(300))
+    state_probs = hmm_model.infer(df)['state_probs']
+    rf_model = TurnoverPredictor()
+    rf_model.train(df, state_probs=state_probs)
+
+    root = tempfile.mkdtemp()
+    try:
+        app.model_registry = ModelRegistry(root)
+        version = app.model_registry.save_version(hmm_model, rf_model)
+        bundle = app.model_registry.activate(version)
+
+        fields = list(app.EmployeeData.model_fields)
+        rows = df.sample(args.requests, replace=True, random_state=0).to_dict('records')
+        employees = []
+        for i, row in enumerate(rows):
+            payload = {field: row[field] for field in fields if field in row}
+            if i % 2 == 0:  # Metade com histórico mensal (inferência HMM real)
+                payload['survey_history'] = [
+                    dict(zip(app.SurveyMonth.model_fields, month))
+                    for month in hmm_model.prepare_sequences(df[df['employee_id'] == row['employee_id']])[2][0].tolist()
+                ]
+            employees.append(app.EmployeeData(**payload))
+
+        for employee in employees[:200]:
+            assert np.isclose(score_batch_path(bundle, employee), score_single_path(bundle, employee))
+
+        batch_p50, batch_p99 = percentiles(lambda e: score_batch_path(bundle, e), employees)
+        single_p50, single_p99 = percentiles(lambda e: score_single_path(bundle, e), employees)
+        print(f"{args.requests:,} predições individuais ({rf_model.model.n_estimators} árvores)")
+        print(f"  lote (DataFrame + score_frame): p50 {batch_p50:6.3f} ms | p99 {batch_p99:6.3f} ms")
+        print(f"  uma linha (FlatForest):         p50 {single_p50:6.3f} ms | p99 {single_p99:6.3f} ms")
+
+        client = TestClient(app.app)
+        bodies = [employee.model_dump(exclude_none=True) for employee in employees]
+        http_p50, http_p99 = percentiles(lambda body: client.post("/api/predict/single", json=body), bodies)
+        print(f"  HTTP /api/predict/single:       p50 {http_p50:6.3f} ms | p99 {http_p99:6.3f} ms")
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,84 @@
+"""
+Benchmark do micro-batching de /api/predict/single sob concorrência
+
+Dispara --requests requisições com até --concurrency em voo ao mesmo tempo
+(httpx.AsyncClient direto no app ASGI, cache de predições desligado) e compara
+vazão e latência sem micro-batching (cada requisição no caminho de uma linha)
+e com lotes de até --max-batch-size, conferindo que as respostas são as mesmas.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_single_batching --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+import app
+from models import INTERNAL_TO_API_COLUMNS, generate_synthetic_data, SurveyStateDetector, TurnoverPredictor
+from prediction_cache import PredictionCache
+from registry import ModelRegistry
+
+async def run_load(bodies, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = np.empty(len(bodies))
+    responses = [None] * len(bodies)
+
+    async with httpx.AsyncClient(app=app.app, base_url="http://bench") as client:
+        async def call(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/predict/single", json=bodies[i])
+                latencies[i] = time.perf_counter() - start
+                response.raise_for_status()
+                responses[i] = response.json()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(call(i) for i in range(len(bodies))))
+        seconds = time.perf_counter() - start
+    return seconds, latencies, responses
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, default=2000, help="Colaboradores no treino do Random Forest")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    df = generate_synthetic_data(n_employees=args.employees)
+    hmm_model = SurveyStateDetector(n_states=3).fit(df.head(300))
+    state_probs = hmm_model.infer(df)['state_probs']
+    rf_model = TurnoverPredictor()
+    rf_model.train(df, state_probs=state_probs)
+
+    root = tempfile.mkdtemp()
+    try:
+        app.model_registry = ModelRegistry(root)
+        app.model_registry.activate(app.model_registry.save_version(hmm_model, rf_model))
+        app.prediction_cache = PredictionCache(max_entries=0)
+
+        fields = [field for field in app.EmployeeData.model_fields if field != 'survey_history']
+        rows = df.rename(columns=INTERNAL_TO_API_COLUMNS).sample(args.requests, replace=True, random_state=0)
+        bodies = rows[fields].to_dict('records')
+
+        print(f"{args.requests:,} requisições, até {args.concurrency} concorrentes "
+              f"({rf_model.model.n_estimators} árvores)")
+        baseline = None
+        for label, max_batch_size in (('sem micro-batching', 1), (f'lotes de até {args.max_batch_size}', args.max_batch_size)):
+            app.prediction_batcher.max_batch_size = max_batch_size
+            app.prediction_batcher.max_wait_seconds = args.max_wait_ms / 1000
+            seconds, latencies, responses = asyncio.run(run_load(bodies, args.concurrency))
+            risks = np.array([response['desligamento_risk'] for response in responses])
+            if baseline is None:
+                baseline = risks
+            assert np.allclose(risks, baseline)
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            print(f"  {label:<22}: {args.requests / seconds:8.1f} req/s | p50 {p50:8.2f} ms | p99 {p99:8.2f} ms")
+    finally:
+        shutil.rmtree(root)
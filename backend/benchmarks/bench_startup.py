@@ -0,0 +1,77 @@
+"""
+Benchmark do carregamento de modelos no startup
+
+Compara carregar uma versão do registro a partir dos .pkl (joblib.load do
+SurveyStateDetector e do TurnoverPredictor) com o artefato compacto
+(manifest.json + .npy memory-mapped, ver artifacts.py), incluindo o tempo da
+primeira predição e o tamanho em disco.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_startup --employees 20000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+import numpy as np
+
+from artifacts import load_artifacts
+from generate_dataset import generate_synthetic_dataset
+from models import SurveyStateDetector, TurnoverPredictor
+from registry import ModelRegistry
+
+def best_of(fn, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def load_pickles(path):
+    return joblib.load(os.path.join(path, ModelRegistry.HMM_FILE)), joblib.load(os.path.join(path, ModelRegistry.RF_FILE))
+
+def load_mmap(path):
+    _, hmm_model, rf_model = load_artifacts(path, mmap_mode='r')
+    return hmm_model, rf_model
+
+def disk_size(path, prefix):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if name.startswith(prefix))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, default=20_000, help="Colaboradores no treino do Random Forest")
+    parser.add_argument('--hmm-employees', type=int, default=300, help="Colaboradores no treino do HMM (EM é lento)")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    df = generate_synthetic_dataset(n_employees=args.employees)
+    hmm_model = SurveyStateDetector(n_states=3).fit(df.head(args.hmm_employees))
+    state_probs = hmm_model.infer(df)['state_probs']
+    rf_model = TurnoverPredictor(n_jobs=-1)
+    rf_model.train(df, state_probs=state_probs)
+
+    root = tempfile.mkdtemp()
+    try:
+        version = ModelRegistry(root).save_version(hmm_model, rf_model)
+        path = os.path.join(root, version)
+        sample = df.head(1)
+        sample_probs = state_probs[:1]
+
+        print(f"Random Forest: {rf_model.model.n_estimators} árvores, "
+              f"{sum(e.tree_.node_count for e in rf_model.model.estimators_):,} nós")
+        print(f"  .pkl:     {disk_size(path, 'rf_model') / 1e6:8.2f} MB")
+        print(f"  artefato: {disk_size(path, 'forest_') / 1e6:8.2f} MB")
+
+        for name, loader in [('pickle (joblib.load)', load_pickles), ('artefato (mmap)', load_mmap)]:
+            load_seconds, (_, loaded_rf) = best_of(lambda: loader(path), args.repeat)
+            start = time.perf_counter()
+            risk = loaded_rf.predict_risk_arrays(sample, sample_probs)['desligamento_risk']
+            first_predict = time.perf_counter() - start
+            assert np.allclose(risk, rf_model.predict_risk_arrays(sample, sample_probs)['desligamento_risk'])
+            print(f"{name:22s} carga {load_seconds * 1000:8.1f} ms | primeira predição {first_predict * 1000:7.1f} ms")
+    finally:
+        shutil.rmtree(root)
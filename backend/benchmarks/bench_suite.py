@@ -0,0 +1,240 @@
+"""
+Suíte de benchmarks reprodutível: treino e scoring em escala
+
+Para cada tamanho de dataset sintético (gerado com semente fixa) mede tempo de
+parede e pico de RSS de cada etapa, em um processo novo por tamanho:
+    generate        generate_synthetic_dataset
+    hmm_fit         SurveyStateDetector.fit (nos primeiros --hmm-fit-employees colaboradores)
+    hmm_inference   SurveyStateDetector.infer em todos
+    rf_train        TurnoverPredictor.train (até --train-employees colaboradores)
+    predict_risk    TurnoverPredictor.predict_risk em todos
+    http_batch      POST /api/predict/desligamento via TestClient, lotes de --http-batch-size
+                    (até --http-rows colaboradores, sem survey_history, cache desligado)
+    http_single     --http-requests chamadas a POST /api/predict/single (p50/p99)
+
+O pico de RSS de cada etapa vem de uma thread que amostra /proc/self/statm
+durante a etapa (nos outros sistemas: ru_maxrss, pico do processo até ali).
+O resultado vai para um JSON com commit, versões das bibliotecas e
+argumentos; --compare aponta regressões contra um arquivo anterior.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_suite --sizes 1000 10000 100000 1000000
+    python -m benchmarks.bench_suite --sizes 1000 10000 --compare benchmarks/results/<anterior>.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import hmmlearn
+import numpy as np
+import pandas as pd
+import sklearn
+from fastapi.testclient import TestClient
+
+import app
+from generate_dataset import generate_synthetic_dataset
+from models import INTERNAL_TO_API_COLUMNS, SurveyStateDetector, TurnoverPredictor
+from prediction_cache import PredictionCache
+from registry import ModelRegistry
+
+RESULTS_SCHEMA = 'people-analytics-bench/1'
+STAGES = ['generate', 'hmm_fit', 'hmm_inference', 'rf_train', 'predict_risk', 'http_batch', 'http_single']
+
+class PeakRSS:
+    """Pico de RSS (MB) durante o bloco, amostrado por uma thread a cada `interval` segundos"""
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.before_mb = self.peak_mb = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(stages, name, fn, **extra):
+    """Roda fn medindo tempo e pico de RSS; guarda em stages[name] e retorna o resultado de fn"""
+    with PeakRSS() as rss, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+    stages[name] = {
+        'seconds': round(seconds, 6),
+        'peak_rss_mb': round(rss.peak_mb, 1),
+        'rss_before_mb': round(rss.before_mb, 1),
+        **extra
+    }
+    print(f"  {name:<14} {seconds:10.3f}s | pico de RSS {rss.peak_mb:8.1f} MB", flush=True)
+    return result
+
+def run_size(n_employees, args):
+    """Todas as etapas para um tamanho de dataset (roda em um processo novo)"""
+    print(f"{n_employees:,} colaboradores", flush=True)
+    stages = {}
+    df = measure(stages, 'generate', lambda: generate_synthetic_dataset(n_employees=n_employees, seed=args.seed))
+
+    n_fit = min(n_employees, args.hmm_fit_employees)
+    hmm_model = measure(stages, 'hmm_fit', lambda: SurveyStateDetector(n_states=3).fit(df.head(n_fit)),
+                        n_employees=n_fit)
+    inference = measure(stages, 'hmm_inference', lambda: hmm_model.infer(df), n_employees=n_employees)
+    df['current_hmm_state'] = inference['current_state']
+    state_probs = inference['state_probs']
+
+    n_train = min(n_employees, args.train_employees or n_employees)
+    rf_model = TurnoverPredictor(n_jobs=args.n_jobs, reuse_cv_models=args.reuse_cv_models)
+    results = measure(stages, 'rf_train', lambda: rf_model.train(df.head(n_train), state_probs=state_probs[:n_train]),
+                      n_employees=n_train)
+    stages['rf_train']['test_auc'] = round(float(results['auc']), 4)
+    measure(stages, 'predict_risk', lambda: rf_model.predict_risk(df, state_probs=state_probs), n_employees=n_employees)
+
+    root = tempfile.mkdtemp()
+    try:
+        # Modelos servidos como na API (artefato + FlatForest), sem cache para medir o scoring de fato
+        app.model_registry = ModelRegistry(root)
+        app.model_registry.activate(app.model_registry.save_version(hmm_model, rf_model))
+        app.prediction_cache = PredictionCache(max_entries=0)
+        client = TestClient(app.app)
+
+        fields = [field for field in app.EmployeeData.model_fields if field != 'survey_history']
+        n_http = min(n_employees, args.http_rows)
+        payload_df = df.head(n_http).rename(columns=INTERNAL_TO_API_COLUMNS)[fields]
+        batches = [
+            payload_df.iloc[lo:lo + args.http_batch_size].to_dict('records')
+            for lo in range(0, n_http, args.http_batch_size)
+        ]
+
+        def post_batches():
+            for batch in batches:
+                response = client.post("/api/predict/desligamento?response_format=columnar", json=batch)
+                response.raise_for_status()
+
+        measure(stages, 'http_batch', post_batches, n_employees=n_http, batch_size=args.http_batch_size)
+        stages['http_batch']['rows_per_second'] = round(n_http / stages['http_batch']['seconds'], 1)
+
+        singles = batches[0][:args.http_requests]
+        singles = (singles * (args.http_requests // len(singles) + 1))[:args.http_requests]
+        latencies = np.empty(len(singles))
+
+        def post_singles():
+            for i, body in enumerate(singles):
+                start = time.perf_counter()
+                client.post("/api/predict/single", json=body).raise_for_status()
+                latencies[i] = time.perf_counter() - start
+
+        measure(stages, 'http_single', post_singles, n_requests=len(singles))
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        stages['http_single'].update(p50_ms=round(p50, 3), p99_ms=round(p99, 3))
+    finally:
+        shutil.rmtree(root)
+
+    return {'n_employees': n_employees, 'stages': stages}
+
+def environment():
+    def git(*command):
+        try:
+            return subprocess.run(['git', *command], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status = git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'git_commit': git('rev-parse', 'HEAD'),
+        'git_dirty': bool(status) if status is not None else None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scikit-learn': sklearn.__version__,
+        'hmmlearn': hmmlearn.__version__
+    }
+
+def compare(current, baseline, threshold):
+    """Imprime a razão atual/anterior de tempo e pico de RSS por etapa; retorna o nº de regressões"""
+    previous = {(r['n_employees'], stage): values for r in baseline['results'] for stage, values in r['stages'].items()}
+    commit = (baseline['environment'].get('git_commit') or '?')[:10]
+    print(f"\nComparação com {commit} (regressão: razão > {threshold:.2f})")
+    regressions = 0
+    for result in current['results']:
+        for stage, values in result['stages'].items():
+            before = previous.get((result['n_employees'], stage))
+            if before is None:
+                continue
+            time_ratio = values['seconds'] / max(before['seconds'], 1e-9)
+            rss_ratio = values['peak_rss_mb'] / max(before['peak_rss_mb'], 1e-9)
+            regressed = time_ratio > threshold or rss_ratio > threshold
+            regressions += regressed
+            print(f"  {result['n_employees']:>10,} {stage:<14} tempo {time_ratio:5.2f}x | RSS {rss_ratio:5.2f}x"
+                  f"{'  <- regressão' if regressed else ''}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--hmm-fit-employees', type=int, default=2_000,
+                        help="Colaboradores no EM do HMM (o EM no dataset inteiro levaria horas nos maiores)")
+    parser.add_argument('--train-employees', type=int, default=None, help="Limite do treino do Random Forest (padrão: todos)")
+    parser.add_argument('--n-jobs', type=int, default=None)
+    parser.add_argument('--reuse-cv-models', action='store_true')
+    parser.add_argument('--http-rows', type=int, default=20_000)
+    parser.add_argument('--http-batch-size', type=int, default=1_000)
+    parser.add_argument('--http-requests', type=int, default=500)
+    parser.add_argument('--output', default=None, help="Arquivo JSON (padrão: benchmarks/results/<data>-<commit>.json)")
+    parser.add_argument('--compare', default=None, help="JSON de uma execução anterior")
+    parser.add_argument('--threshold', type=float, default=1.2)
+    args = parser.parse_args()
+
+    report = {
+        'schema': RESULTS_SCHEMA,
+        'created_at': datetime.now().isoformat(),
+        'environment': environment(),
+        'args': vars(args),
+        'results': []
+    }
+    for n_employees in args.sizes:
+        # Processo novo por tamanho: o pico de RSS de um tamanho não contamina o seguinte
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            report['results'].append(executor.submit(run_size, n_employees, args).result())
+
+    output = args.output or os.path.join(
+        'benchmarks', 'results',
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{(report['environment']['git_commit'] or 'nogit')[:10]}.json"
+    )
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados salvos em {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            sys.exit(1 if compare(report, json.load(f), args.threshold) else 0)
@@ -0,0 +1,60 @@
+"""
+Artefatos de avaliação do Random Forest (curvas e matriz de confusão no holdout)
+
+Calculados no treino como arrays compactos e salvos com a versão do modelo
+(models/<versão>/evaluation.npz). Os gráficos são renderizados só quando
+pedidos (/api/files/roc-curve), e o matplotlib só é importado nesse caminho.
+"""
+import os
+
+import numpy as np
+from sklearn.calibration import calibration_curve
+from sklearn.metrics import confusion_matrix, precision_recall_curve, roc_auc_score, roc_curve
+
+EVALUATION_ARRAYS = [
+    'roc_fpr', 'roc_tpr', 'pr_precision', 'pr_recall',
+    'calibration_prob_true', 'calibration_prob_pred', 'confusion_matrix', 'auc'
+]
+
+def evaluation_arrays(y_test, y_proba, n_bins=10):
+    """Curva ROC, curva precisão-revocação, calibração (n_bins) e matriz de confusão (limiar 0.5)"""
+    fpr, tpr, _ = roc_curve(y_test, y_proba)
+    precision, recall, _ = precision_recall_curve(y_test, y_proba)
+    prob_true, prob_pred = calibration_curve(y_test, y_proba, n_bins=n_bins)
+    return {
+        'roc_fpr': fpr.astype(np.float32),
+        'roc_tpr': tpr.astype(np.float32),
+        'pr_precision': precision.astype(np.float32),
+        'pr_recall': recall.astype(np.float32),
+        'calibration_prob_true': prob_true.astype(np.float32),
+        'calibration_prob_pred': prob_pred.astype(np.float32),
+        'confusion_matrix': confusion_matrix(y_test, (y_proba > 0.5).astype(np.int64), labels=[0, 1]),
+        'auc': np.float64(roc_auc_score(y_test, y_proba))
+    }
+
+def save_evaluation(path, evaluation):
+    np.savez_compressed(path, **{name: evaluation[name] for name in EVALUATION_ARRAYS})
+
+def load_evaluation(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in EVALUATION_ARRAYS}
+
+def render_roc_curve(evaluation, path):
+    """Renderiza o gráfico da curva ROC em `path` (PNG, gravado de uma vez)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(8, 6))
+    plt.plot(evaluation['roc_fpr'], evaluation['roc_tpr'], label=f"ROC (AUC={float(evaluation['auc']):.3f})")
+    plt.plot([0, 1], [0, 1], 'k--', label='Random')
+    plt.xlabel('False Positive Rate')
+    plt.ylabel('True Positive Rate')
+    plt.legend()
+    plt.title('ROC Curve - Turnover Prediction')
+
+    tmp_path = f"{path}.tmp.png"
+    fig.savefig(tmp_path)
+    plt.close(fig)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,135 @@
+"""
+Pools de execução da API com fila limitada (backpressure)
+
+Os endpoints são async e não fazem trabalho pesado no event loop: tarefas de
+I/O (arquivos, SQLite, registro de modelos) vão para um pool de threads e o
+scoring em lote vai para um pool de processos (fora do GIL do processo da
+API). Cada pool aceita no máximo max_pending tarefas entre em execução e na
+fila; além disso submit levanta SaturatedError, que a API devolve como 429,
+então /health e os endpoints de status seguem respondendo mesmo sob carga.
+"""
+import asyncio
+import contextvars
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+class SaturatedError(Exception):
+    """Pool (ou fila de lotes) no limite de tarefas pendentes"""
+    def __init__(self, name, max_pending):
+        super().__init__(f"Servidor ocupado ({name}: {max_pending} tarefas pendentes). Tente novamente em instantes")
+        self.name = name
+        self.max_pending = max_pending
+
+class BoundedExecutor:
+    """
+    Executor com limite de tarefas pendentes, criado sob demanda por `factory`
+
+    Em pools de threads a tarefa roda no contexto (contextvars) de quem a
+    submeteu, para a instrumentação da requisição (StageTimer, profiling)
+    seguir funcionando na thread. Um pool de processos quebrado (processo
+    morto, ex.: OOM) é descartado e o próximo submit cria outro pela factory.
+    """
+    def __init__(self, name, factory, max_pending, threads=True):
+        self.name = name
+        self.factory = factory
+        self.max_pending = max_pending
+        self.threads = threads
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self.factory()
+            return self._executor
+
+    def submit(self, fn, *args):
+        """Submete fn(*args); levanta SaturatedError se já houver max_pending tarefas pendentes"""
+        return self._submit(fn, args)
+
+    def _submit(self, fn, args, count_rejected=True):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += count_rejected
+                raise SaturatedError(self.name, self.max_pending)
+            self.pending += 1
+        try:
+            if self.threads:
+                future = self.executor.submit(contextvars.copy_context().run, fn, *args)
+            else:
+                executor = self.executor
+                try:
+                    future = executor.submit(fn, *args)
+                except BrokenProcessPool:
+                    # Pool quebrado por uma tarefa anterior: tenta uma vez em um pool novo
+                    self._discard(executor)
+                    executor = self.executor
+                    future = executor.submit(fn, *args)
+                future.add_done_callback(lambda f: self._discard_if_broken(executor, f))
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    async def run(self, fn, *args, wait=False):
+        """
+        submit aguardado sem bloquear o event loop
+
+        wait=True espera uma vaga em vez de levantar SaturatedError (para as
+        etapas seguintes de uma resposta em streaming já iniciada).
+        """
+        while True:
+            try:
+                future = self._submit(fn, args, count_rejected=not wait)
+            except SaturatedError:
+                if not wait:
+                    raise
+                await asyncio.sleep(0.01)
+                continue
+            return await asyncio.wrap_future(future)
+
+    def stats(self):
+        return {"max_pending": self.max_pending, "pending": self.pending, "rejected": self.rejected}
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _discard(self, executor):
+        """Descarta `executor` (se ainda for o atual); o próximo submit cria outro"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        print(f"Pool {self.name} quebrado; será recriado no próximo uso")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _discard_if_broken(self, executor, future):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._discard(executor)
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+
+def thread_pool(name, max_workers, max_pending):
+    return BoundedExecutor(
+        name, lambda: ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name), max_pending
+    )
+
+def process_pool(name, max_workers, max_pending):
+    """Pool de processos (spawn); fn e argumentos precisam ser serializáveis e importáveis sem o app"""
+    return BoundedExecutor(
+        name,
+        lambda: ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')),
+        max_pending,
+        threads=False
+    )
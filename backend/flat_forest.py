@@ -0,0 +1,163 @@
+import numpy as np
+from sklearn.tree._tree import NODE_DTYPE, Tree
+
+# Arrays que descrevem uma floresta achatada (todos os nós de todas as árvores, concatenados)
+FOREST_ARRAYS = ['left', 'right', 'feature', 'threshold', 'value', 'roots']
+
+def flatten_forest(forest):
+    """
+    Achata uma RandomForestClassifier treinada em arrays contíguos
+
+    Os índices de filhos são globais (já somam o offset da árvore) e as folhas
+    apontam para si mesmas, então a travessia pode rodar um número fixo de passos.
+    `value` guarda a distribuição de classes normalizada de cada nó.
+    """
+    trees = [estimator.tree_ for estimator in forest.estimators_]
+    node_counts = np.array([tree.node_count for tree in trees], dtype=np.int64)
+    offsets = np.zeros(len(trees) + 1, dtype=np.int64)
+    np.cumsum(node_counts, out=offsets[1:])
+
+    left = np.empty(offsets[-1], dtype=np.int32)
+    right = np.empty(offsets[-1], dtype=np.int32)
+    feature = np.empty(offsets[-1], dtype=np.int32)
+    threshold = np.empty(offsets[-1], dtype=np.float64)
+    value = np.empty((offsets[-1], len(forest.classes_)), dtype=np.float64)
+
+    for tree, start, end in zip(trees, offsets[:-1], offsets[1:]):
+        own = np.arange(start, end, dtype=np.int32)
+        is_leaf = tree.children_left < 0
+        left[start:end] = np.where(is_leaf, own, tree.children_left + start)
+        right[start:end] = np.where(is_leaf, own, tree.children_right + start)
+        feature[start:end] = np.where(is_leaf, 0, tree.feature)
+        threshold[start:end] = np.where(is_leaf, np.inf, tree.threshold)
+        counts = tree.value[:, 0, :]
+        value[start:end] = counts / counts.sum(axis=1, keepdims=True)
+
+    arrays = {
+        'left': left,
+        'right': right,
+        'feature': feature,
+        'threshold': threshold,
+        'value': value,
+        'roots': offsets[:-1].astype(np.int32)
+    }
+    meta = {
+        'n_trees': len(trees),
+        'n_nodes': int(offsets[-1]),
+        'max_depth': int(max(tree.max_depth for tree in trees)),
+        'n_features': int(forest.n_features_in_),
+        'classes': forest.classes_.tolist()
+    }
+    return arrays, meta
+
+class FlatForest:
+    """
+    Random Forest achatada (ver flatten_forest) com predict_proba compatível com o sklearn
+
+    Os arrays podem ser memory-mapped (np.load(mmap_mode='r')), então vários
+    workers compartilham as mesmas páginas do modelo. Lotes pequenos (até
+    `small_batch` linhas) são avaliados direto sobre os arrays, sem o custo
+    fixo por árvore do sklearn. Lotes maiores (predição em lote e em massa)
+    usam árvores Cython do sklearn reconstruídas dos arrays uma vez por
+    instância, isto é, uma vez por bundle em cada processo; o Tree do sklearn
+    copia os nós, então esse caminho abre mão do compartilhamento do mmap (uma
+    cópia privada da floresta por processo) em troca da travessia em Cython.
+    """
+    def __init__(self, arrays, meta, feature_importances=None, small_batch=32):
+        # np.asarray tira a subclasse np.memmap (indexar memmap custa mais) mantendo o mapeamento
+        self.left = np.asarray(arrays['left'])
+        self.right = np.asarray(arrays['right'])
+        self.feature = np.asarray(arrays['feature'])
+        self.threshold = np.asarray(arrays['threshold'])
+        self.value = np.asarray(arrays['value'])
+        self.roots = np.asarray(arrays['roots'])
+        self.max_depth = meta['max_depth']
+        self.n_features_in_ = meta['n_features']
+        self.classes_ = np.asarray(meta['classes'])
+        self.feature_importances_ = feature_importances
+        self.small_batch = small_batch
+        self._trees = None
+        self._compiled = None
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        arrays, meta = flatten_forest(forest)
+        return cls(arrays, meta, feature_importances=forest.feature_importances_)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def compiled(self):
+        """
+        Arrays de travessia (índices intp, montados uma vez): raízes, feature de cada nó
+        e filhos intercalados [direito, esquerdo], com o próximo nó em children[2 * nó + vai_para_esquerda]
+        """
+        if self._compiled is None:
+            self._compiled = (
+                self.roots.astype(np.intp),
+                self.feature.astype(np.intp),
+                np.stack([self.right, self.left], axis=1).ravel().astype(np.intp)
+            )
+        return self._compiled
+
+    def apply(self, X):
+        """Índice (global) da folha alcançada em cada árvore: (n_samples, n_trees)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_samples, n_features = X.shape
+        roots, feature, children = self.compiled()
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_samples) * n_features)[:, None]
+        nodes = np.broadcast_to(roots, (n_samples, len(roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = flat_X[row_offsets + feature[nodes]] <= self.threshold[nodes]
+            nodes = children[2 * nodes + go_left]
+        return nodes
+
+    def predict_proba_one(self, x):
+        """Distribuição de classes de uma única amostra (vetor de n_features), sem o custo de lote"""
+        x = np.asarray(x, dtype=np.float32)
+        roots, feature, children = self.compiled()
+        nodes = roots
+        for _ in range(self.max_depth):
+            nodes = children[2 * nodes + (x[feature[nodes]] <= self.threshold[nodes])]
+        return self.value[nodes].mean(axis=0)
+
+    def predict_proba(self, X):
+        """Média das distribuições de classe das folhas (mesmo resultado do sklearn)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.shape[0] == 1:
+            return self.predict_proba_one(X[0])[None, :]
+        if X.shape[0] > self.small_batch:
+            trees = self.sklearn_trees()
+            return sum(tree.predict(X) for tree in trees) / len(trees)
+
+        return self.value[self.apply(X)].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def sklearn_trees(self):
+        """Árvores (sklearn.tree._tree.Tree) equivalentes, montadas uma vez a partir dos arrays (cópia dos nós, fora do mmap)"""
+        if self._trees is None:
+            ends = np.append(self.roots[1:], len(self.left))
+            n_classes = np.array([len(self.classes_)], dtype=np.intp)
+            trees = []
+            for start, end in zip(self.roots, ends):
+                own = np.arange(start, end)
+                is_leaf = self.left[start:end] == own
+                nodes = np.zeros(end - start, dtype=NODE_DTYPE)
+                nodes['left_child'] = np.where(is_leaf, -1, self.left[start:end] - start)
+                nodes['right_child'] = np.where(is_leaf, -1, self.right[start:end] - start)
+                nodes['feature'] = np.where(is_leaf, -2, self.feature[start:end])
+                nodes['threshold'] = np.where(is_leaf, -2, self.threshold[start:end])
+                tree = Tree(self.n_features_in_, n_classes, 1)
+                tree.__setstate__({
+                    'max_depth': self.max_depth,
+                    'node_count': end - start,
+                    'nodes': nodes,
+                    'values': np.ascontiguousarray(self.value[start:end, None, :])
+                })
+                trees.append(tree)
+            self._trees = trees
+        return self._trees
@@ -3,151 +3,191 @@ import numpy as np
 from sklearn.preprocessing import StandardScaler
 import os
 
+from survey_store import SURVEY_FEATURES, SurveyHistory, attach_survey_history, get_survey_history
+
 np.random.seed(42)
 
-def generate_synthetic_dataset(n_employees=500, n_months=12):
+# Colunas com a média do histórico de cada colaborador (mesma ordem de SURVEY_FEATURES)
+SURVEY_AVG_COLUMNS = [
+    'avg_engajamento', 'satisfacao_media', 'reconhecimento_medio',
+    'crescimento_medio', 'avg_manager_rel', 'equilibrio_vida_trabalho_medio'
+]
+
+DEPARTAMENTOS = ['Sales', 'Engineering', 'HR', 'Marketing', 'Finance']
+NIVEIS = ['Junior', 'Pleno', 'Senior']
+FAIXAS_SALARIAIS = ['Entry', 'Mid', 'Senior']
+LOCALIZACOES = ['Remoto', 'Híbrido', 'Presencial']
+
+# Primeiro mês (1-indexado) em que o desligamento pode acontecer
+FIRST_EXIT_MONTH = 10
+
+def _draw_categorical(rng, categories, n):
+    """Sorteia uma coluna categórica uniforme já como pd.Categorical"""
+    codes = rng.integers(0, len(categories), size=n, dtype=np.int8)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+def generate_synthetic_dataset(n_employees=500, n_months=12, seed=42):
     """
     Gera dataset sintético realista para o MVP de People Analytics
-    
+
+    Todos os atributos, scores mensais e meses de saída são sorteados como
+    arrays NumPy de uma vez só (sem loop por colaborador/mês).
+
     Args:
         n_employees: Número de colaboradores
         n_months: Número de meses de histórico
-    
+        seed: Semente do numpy.random.Generator (reprodutibilidade)
+
     Returns:
-        DataFrame com dados dos colaboradores
+        DataFrame com dados dos colaboradores (histórico de surveys colunar em
+        df.attrs['survey_history'], ver survey_store.SurveyHistory)
     """
     print(f"Gerando dataset sintético com {n_employees} colaboradores e {n_months} meses de histórico...")
-    
-    employees_data = []
-    
-    for emp_id in range(n_employees):
-        # Demographics
-        idade = np.random.randint(22, 65)
-        tempo_empresa = np.random.randint(3, 240)  # 3 meses a 20 anos
-        departamento = np.random.choice(['Sales', 'Engineering', 'HR', 'Marketing', 'Finance'])
-        nivel = np.random.choice(['Junior', 'Pleno', 'Senior'])
-        faixa_salarial = np.random.choice(['Entry', 'Mid', 'Senior'])
-        localizacao = np.random.choice(['Remoto', 'Híbrido', 'Presencial'])
-        
-        # Historical events
-        promovido = np.random.choice([0, 1], p=[0.9, 0.1])
-        aumento_salarial = np.random.uniform(0, 15)
-        manager_change = np.random.choice([0, 1], p=[0.85, 0.15])
-        treinamentos = np.random.randint(0, 5)
-        avaliacao_performance = np.random.uniform(2.5, 5)
-        
-        # Turnover outcome (base probability)
-        base_desligamento_prob = 0.15
-        
-        # Factors that increase desligamento risk
-        if tempo_empresa < 6:
-            base_desligamento_prob += 0.1  # Novo pode sair mais
-        if promovido == 0 and tempo_empresa > 24:
-            base_desligamento_prob += 0.05  # Sem promoção há tempo
-        if aumento_salarial < 3:
-            base_desligamento_prob += 0.05  # Sem aumento salarial
-        if manager_change == 1:
-            base_desligamento_prob += 0.08  # Mudança de gestor afeta
-        if avaliacao_performance < 3:
-            base_desligamento_prob += 0.1  # Desempenho baixo
-        if localizacao == 'Presencial' and np.random.random() < 0.3:
-            base_desligamento_prob += 0.03  # Presencial tem taxa um pouco maior
-        
-        # Clamp probability
-        base_desligamento_prob = min(base_desligamento_prob, 0.8)
-        
-        # Generate monthly survey responses + desligamento outcome
-        survey_history = []
-        desligamento = 0
-        
-        for month in range(1, n_months + 1):
-            # Survey scores: Likert scale 1-5
-            engajamento = np.random.normal(3.5 if base_desligamento_prob < 0.3 else 2.5, 0.8)
-            satisfacao = np.random.normal(3.5 if base_desligamento_prob < 0.3 else 2.3, 0.9)
-            reconhecimento = np.random.normal(3.2, 0.9)
-            crescimento = np.random.normal(3.0 if base_desligamento_prob < 0.5 else 2.2, 1.0)
-            relacionamento_gestor = np.random.normal(3.6, 0.8)
-            work_life_balance = np.random.normal(3.3, 1.0)
-            
-            # Clamp to 1-5
-            engajamento = np.clip(engajamento, 1, 5)
-            satisfacao = np.clip(satisfacao, 1, 5)
-            reconhecimento = np.clip(reconhecimento, 1, 5)
-            crescimento = np.clip(crescimento, 1, 5)
-            relacionamento_gestor = np.clip(relacionamento_gestor, 1, 5)
-            work_life_balance = np.clip(work_life_balance, 1, 5)
-            
-            survey_history.append({
-                'month': month,
-                'engajamento': engajamento,
-                'satisfacao': satisfacao,
-                'reconhecimento': reconhecimento,
-                'crescimento': crescimento,
-                'relacionamento_gestor': relacionamento_gestor,
-                'work_life_balance': work_life_balance
-            })
-            
-            # Decide desligamento at end of period (months 10-12)
-            if month >= 10 and np.random.random() < base_desligamento_prob:
-                desligamento = 1
-                break
-        
-        # Average survey scores over 12 months
-        survey_df = pd.DataFrame(survey_history)
-        avg_engajamento = survey_df['engajamento'].mean()
-        satisfacao_media = survey_df['satisfacao'].mean()
-        reconhecimento_medio = survey_df['reconhecimento'].mean()
-        crescimento_medio = survey_df['crescimento'].mean()
-        avg_relacionamento_gestor = survey_df['relacionamento_gestor'].mean()
-        equilibrio_vida_trabalho_medio = survey_df['work_life_balance'].mean()
-        
-        employees_data.append({
-            'employee_id': emp_id,
-            'idade': idade,
-            'tempo_empresa': tempo_empresa,
-            'departamento': departamento,
-            'nivel': nivel,
-            'faixa_salarial': faixa_salarial,
-            'localizacao': localizacao,
-            'promovido': promovido,
-            'aumento_salarial': aumento_salarial,
-            'manager_change': manager_change,
-            'treinamentos': treinamentos,
-            'avaliacao_performance': avaliacao_performance,
-            'avg_engajamento': avg_engajamento,
-            'satisfacao_media': satisfacao_media,
-            'reconhecimento_medio': reconhecimento_medio,
-            'crescimento_medio': crescimento_medio,
-            'avg_relacionamento_gestor': avg_relacionamento_gestor,
-            'equilibrio_vida_trabalho_medio': equilibrio_vida_trabalho_medio,
-            'desligamento': desligamento,
-            'survey_history': survey_history
-        })
-    
-    df = pd.DataFrame(employees_data)
+
+    rng = np.random.default_rng(seed)
+    n = n_employees
+
+    # Demographics
+    idade = rng.integers(22, 65, size=n)
+    tempo_empresa = rng.integers(3, 240, size=n)  # 3 meses a 20 anos
+    departamento = _draw_categorical(rng, DEPARTAMENTOS, n)
+    nivel = _draw_categorical(rng, NIVEIS, n)
+    faixa_salarial = _draw_categorical(rng, FAIXAS_SALARIAIS, n)
+    localizacao = _draw_categorical(rng, LOCALIZACOES, n)
+
+    # Historical events
+    promovido = (rng.random(n) < 0.1).astype(np.int64)
+    aumento_salarial = rng.uniform(0, 15, size=n)
+    manager_change = (rng.random(n) < 0.15).astype(np.int64)
+    treinamentos = rng.integers(0, 5, size=n)
+    avaliacao_performance = rng.uniform(2.5, 5, size=n)
+
+    # Turnover outcome (base probability) + factors that increase desligamento risk
+    presencial = np.asarray(localizacao == 'Presencial')
+    base_desligamento_prob = (
+        0.15
+        + 0.1 * (tempo_empresa < 6)                          # Novo pode sair mais
+        + 0.05 * ((promovido == 0) & (tempo_empresa > 24))   # Sem promoção há tempo
+        + 0.05 * (aumento_salarial < 3)                      # Sem aumento salarial
+        + 0.08 * (manager_change == 1)                       # Mudança de gestor afeta
+        + 0.1 * (avaliacao_performance < 3)                  # Desempenho baixo
+        + 0.03 * (presencial & (rng.random(n) < 0.3))        # Presencial tem taxa um pouco maior
+    )
+
+    # Clamp probability
+    base_desligamento_prob = np.minimum(base_desligamento_prob, 0.8)
+
+    # Survey scores: Likert scale 1-5, tensor (n_employees, n_months, n_features)
+    alto_risco = base_desligamento_prob >= 0.3
+    means = np.empty((n, len(SURVEY_FEATURES)), dtype=np.float32)
+    means[:, 0] = np.where(alto_risco, 2.5, 3.5)
+    means[:, 1] = np.where(alto_risco, 2.3, 3.5)
+    means[:, 2] = 3.2
+    means[:, 3] = np.where(base_desligamento_prob >= 0.5, 2.2, 3.0)
+    means[:, 4] = 3.6
+    means[:, 5] = 3.3
+    stds = np.array([0.8, 0.9, 0.9, 1.0, 0.8, 1.0], dtype=np.float32)
+
+    scores = rng.standard_normal((n, n_months, len(SURVEY_FEATURES)), dtype=np.float32)
+    scores *= stds
+    scores += means[:, None, :]
+    np.clip(scores, 1, 5, out=scores)
+
+    # Decide desligamento at end of period (months 10-12): primeiro sorteio bem-sucedido
+    exit_window = max(n_months - FIRST_EXIT_MONTH + 1, 0)
+    exits = rng.random((n, exit_window)) < base_desligamento_prob[:, None]
+    desligamento = exits.any(axis=1).astype(np.int64)
+    exit_month = FIRST_EXIT_MONTH + exits.argmax(axis=1) if exit_window else np.zeros(n, dtype=np.int64)
+    n_survey_months = np.where(desligamento == 1, exit_month, n_months)
+
+    # Average survey scores over the months answered before leaving
+    history = SurveyHistory.from_tensor(scores, n_survey_months, np.arange(n))
+    answered = np.arange(n_months)[None, :] < n_survey_months[:, None]
+    scores[~answered] = 0
+    averages = scores.sum(axis=1) / n_survey_months[:, None].astype(np.float32)
+
+    df = pd.DataFrame({
+        'employee_id': np.arange(n),
+        'idade': idade,
+        'tempo_empresa': tempo_empresa,
+        'departamento': departamento,
+        'nivel': nivel,
+        'faixa_salarial': faixa_salarial,
+        'localizacao': localizacao,
+        'promovido': promovido,
+        'aumento_salarial': aumento_salarial,
+        'manager_change': manager_change,
+        'treinamentos': treinamentos,
+        'avaliacao_performance': avaliacao_performance,
+        **{col: averages[:, i] for i, col in enumerate(SURVEY_AVG_COLUMNS)},
+        'desligamento': desligamento
+    })
+    attach_survey_history(df, history)
     print(f"Dataset shape: {df.shape}")
     print(f"Turnover rate: {df['desligamento'].mean():.1%}")
-    
+
     return df
 
 def save_dataset(df, filepath='data/employees_data.csv'):
     """
     Salva o dataset em CSV
+
+    O histórico de surveys é salvo ao lado em formato colunar
+    (`<nome>_history.npz`), carregável com `load_dataset`.
     """
     # Criar diretório se não existir
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
     
-    # Salvar sem a coluna survey_history (muito complexa para CSV)
-    df_to_save = df.drop('survey_history', axis=1)
-    df_to_save.to_csv(filepath, index=False)
+    df.to_csv(filepath, index=False)
     print(f"Dataset salvo em: {filepath}")
     
-    # Salvar também versão com histórico em formato pickle
-    import pickle
-    pickle_path = filepath.replace('.csv', '_with_history.pkl')
-    with open(pickle_path, 'wb') as f:
-        pickle.dump(df, f)
-    print(f"Dataset completo (com histórico) salvo em: {pickle_path}")
+    history_path = history_path_for(filepath)
+    get_survey_history(df).save(history_path)
+    print(f"Histórico de surveys (colunar) salvo em: {history_path}")
+
+def history_path_for(filepath):
+    """Caminho do histórico colunar associado a um CSV de colaboradores"""
+    return os.path.splitext(filepath)[0] + '_history.npz'
+
+def read_employees(filepath):
+    """DataFrame de colaboradores de um CSV, Parquet ou Feather (pela extensão; Parquet/Feather requerem pyarrow)"""
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == '.parquet':
+        return pd.read_parquet(filepath)
+    if extension == '.feather':
+        return pd.read_feather(filepath)
+    return pd.read_csv(filepath)
+
+def iter_employees(filepath, chunk_size):
+    """Colaboradores de um CSV, Parquet ou Feather em blocos de chunk_size linhas"""
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == '.parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(filepath).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif extension == '.feather':
+        import pyarrow as pa
+
+        # Memory-map: só o bloco convertido para pandas ocupa memória
+        table = pa.ipc.open_file(pa.memory_map(filepath)).read_all()
+        for lo in range(0, table.num_rows, chunk_size):
+            yield table.slice(lo, chunk_size).to_pandas()
+    else:
+        yield from pd.read_csv(filepath, chunksize=chunk_size)
+
+def load_dataset(filepath, history_path=None, mmap_mode=None):
+    """
+    Carrega um CSV salvo com `save_dataset` junto com seu histórico de surveys
+
+    Args:
+        filepath: CSV de colaboradores (ou Parquet/Feather convertido no upload)
+        history_path: `.npz` ou diretório de `.npy` (padrão: `<nome>_history.npz`)
+        mmap_mode: modo de memory-map para históricos salvos em diretório
+    """
+    df = read_employees(filepath)
+    history = SurveyHistory.load(history_path or history_path_for(filepath), mmap_mode=mmap_mode)
+    return attach_survey_history(df, history)
 
 if __name__ == "__main__":
     # Gerar dataset
@@ -166,6 +206,6 @@ if __name__ == "__main__":
     print(df['nivel'].value_counts())
     print(f"\nMédias dos scores de survey:")
     survey_cols = ['avg_engajamento', 'satisfacao_media', 'reconhecimento_medio', 
-                  'crescimento_medio', 'avg_relacionamento_gestor', 'equilibrio_vida_trabalho_medio']
+                  'crescimento_medio', 'avg_manager_rel', 'equilibrio_vida_trabalho_medio']
     for col in survey_cols:
         print(f"{col}: {df[col].mean():.2f}")
\ No newline at end of file
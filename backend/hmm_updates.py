@@ -0,0 +1,142 @@
+"""
+Atualização incremental do HMM a cada nova onda mensal de surveys
+
+O estado do HMM fica em disco (hmm_state_dir, padrão data/hmm_state/):
+    history/        SurveyHistory de todos os colaboradores (um .npy por array, mmap)
+    filter.npz      por colaborador: delta do Viterbi e posterior filtrada (alpha
+                    normalizado) do último mês, e o estado atual
+    state.json      versão do modelo que produziu o estado e contagens
+
+Uma onda nova acrescenta um mês a cada sequência, roda poucas iterações de EM
+partindo dos parâmetros atuais e avança o estado filtrado de cada colaborador
+em um passo (filter_step), sem redecodificar as sequências inteiras.
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from survey_store import SURVEY_FEATURES, _LEGACY_KEYS, SurveyHistory
+
+FILTER_ARRAYS = ['employee_ids', 'last_log_delta', 'state_probs', 'current_state']
+
+def filter_state_from_inference(history, inference):
+    """Estado filtrado (dict de arrays) a partir do resultado de SurveyStateDetector.infer_history"""
+    return {
+        'employee_ids': history.employee_ids,
+        'last_log_delta': inference['last_log_delta'],
+        'state_probs': inference['state_probs'],
+        'current_state': inference['current_state']
+    }
+
+def save_hmm_state(path, history, filter_state, model_version=None):
+    """Grava histórico + estado filtrado em `path`, trocando o diretório inteiro de uma vez"""
+    tmp_path, old_path = f"{path}.tmp", f"{path}.old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    history.save(os.path.join(tmp_path, 'history'))
+    np.savez(os.path.join(tmp_path, 'filter.npz'), **{name: filter_state[name] for name in FILTER_ARRAYS})
+    with open(os.path.join(tmp_path, 'state.json'), 'w') as f:
+        json.dump({
+            'model_version': model_version,
+            'updated_at': datetime.now().isoformat(),
+            'n_employees': len(history),
+            'n_months': int(history.offsets[-1])
+        }, f, indent=2)
+
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+def load_hmm_state(path, mmap_mode='r'):
+    """Carrega (history, filter_state, metadata) gravados por save_hmm_state"""
+    if not os.path.exists(os.path.join(path, 'state.json')):
+        raise FileNotFoundError(f"Estado do HMM não encontrado em {path}. Treine os modelos primeiro")
+    history = SurveyHistory.load(os.path.join(path, 'history'), mmap_mode=mmap_mode)
+    with np.load(os.path.join(path, 'filter.npz')) as data:
+        filter_state = {name: data[name] for name in FILTER_ARRAYS}
+    with open(os.path.join(path, 'state.json')) as f:
+        metadata = json.load(f)
+    return history, filter_state, metadata
+
+def read_survey_wave(source, input_format='csv'):
+    """
+    Lê uma onda de survey (uma linha por colaborador): employee_id + SURVEY_FEATURES
+
+    Returns:
+        (employee_ids, values (n, n_features) float32)
+    """
+    df = pd.read_csv(source) if input_format == 'csv' else pd.read_json(source, lines=True)
+    df = df.rename(columns={legacy: col for col, legacy in _LEGACY_KEYS.items()})
+    missing = [col for col in ['employee_id'] + SURVEY_FEATURES if col not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas obrigatórias ausentes: {missing}")
+    values = df[SURVEY_FEATURES].to_numpy(dtype=np.float32)
+    if np.isnan(values).any():
+        raise ValueError("Onda de survey com respostas faltando")
+    return df['employee_id'].to_numpy(dtype=np.int64), values
+
+def apply_survey_wave(hmm_model, history, filter_state, employee_ids, values, n_iter=5, sample_size=None,
+                      seed=42, on_stage=None):
+    """
+    Incorpora uma onda de survey: acrescenta o mês, atualiza o HMM (warm start) e avança o filtro
+
+    Args:
+        n_iter: iterações de EM a partir dos parâmetros atuais (0 = só avançar o filtro)
+        sample_size: nº de colaboradores sorteados para o EM (None = todos)
+        on_stage: callback opcional chamado com 'hmm_update' e 'hmm_filter' ao iniciar cada etapa
+
+    Returns:
+        (history, filter_state, stats) atualizados
+    """
+    employee_ids = np.asarray(employee_ids, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float32)
+    history = history.append_months(employee_ids, values)
+
+    if on_stage is not None:
+        on_stage('hmm_update')
+    if n_iter > 0:
+        fit_history = history
+        if sample_size is not None and sample_size < len(history):
+            sampled = np.random.default_rng(seed).choice(history.employee_ids, size=sample_size, replace=False)
+            fit_history = history.select(np.sort(sampled))
+        hmm_model.update(fit_history, n_iter=n_iter)
+
+    if on_stage is not None:
+        on_stage('hmm_filter')
+    # Posição de cada respondente no estado filtrado (colaboradores novos entram no fim, como no histórico)
+    positions = pd.Index(filter_state['employee_ids']).get_indexer(employee_ids)
+    known = positions >= 0
+    n_new = int((~known).sum())
+
+    last_log_delta = np.concatenate([filter_state['last_log_delta'], np.empty((n_new, hmm_model.n_states))])
+    state_probs = np.concatenate([filter_state['state_probs'], np.empty((n_new, hmm_model.n_states))])
+    current_state = np.concatenate([filter_state['current_state'], np.empty(n_new, dtype=np.int64)])
+
+    rows = positions[known]
+    last_log_delta[rows], state_probs[rows], current_state[rows] = hmm_model.filter_step(
+        last_log_delta[rows], state_probs[rows], values[known]
+    )
+    new_rows = len(filter_state['employee_ids']) + np.arange(n_new)
+    last_log_delta[new_rows], state_probs[new_rows], current_state[new_rows] = hmm_model.filter_start(values[~known])
+
+    filter_state = {
+        'employee_ids': history.employee_ids,
+        'last_log_delta': last_log_delta,
+        'state_probs': state_probs,
+        'current_state': current_state
+    }
+    stats = {
+        'n_responses': len(employee_ids),
+        'n_new_employees': n_new,
+        'n_employees': len(history),
+        'em_iterations': int(hmm_model.model.monitor_.iter) if n_iter > 0 else 0,
+        'log_likelihood': float(hmm_model.model.monitor_.history[-1]) if n_iter > 0 else None,
+        'state_distribution': np.bincount(current_state, minlength=hmm_model.n_states).tolist()
+    }
+    return history, filter_state, stats
@@ -0,0 +1,246 @@
+"""
+Instrumentação da API: latência por etapa, contadores e profiling por requisição
+
+As métricas ficam em memória no processo da API (MetricsRegistry) e são
+expostas em /metrics no formato texto do Prometheus:
+    people_analytics_stage_seconds{path, stage}        histograma do tempo de cada etapa
+    people_analytics_http_request_seconds{handler}     histograma do tempo total da requisição
+    people_analytics_http_requests_total{handler, method, status}
+    people_analytics_rows_scored_total{path}           colaboradores pontuados
+    people_analytics_prediction_batches_total{path}    lotes do micro-batching (tamanho médio = rows/batches)
+    people_analytics_training_jobs_total{job, state}
+
+As etapas de predição são medidas com StageTimer (o mesmo protocolo de
+on_stage do treino: start(etapa) encerra a anterior). A primeira etapa,
+'parse', conta desde a chegada da requisição (leitura do corpo e validação do
+pydantic); a última termina quando a resposta começa a ser enviada. As etapas
+dos jobs de treinamento vêm do progresso publicado pelo job.
+
+Com o profiling ligado (PROFILE_REQUESTS=1 ou /api/debug/profiling), requisições
+com o header `X-Profile: 1` a endpoints marcados com @profiled rodam sob
+cProfile; o .prof é salvo em PROFILE_DIR e o caminho volta no header
+`X-Profile-File`.
+"""
+import bisect
+import contextvars
+import cProfile
+import functools
+import os
+import threading
+import time
+from datetime import datetime
+
+METRIC_PREFIX = 'people_analytics'
+
+# Limites superiores (segundos) dos buckets dos histogramas de latência
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0
+)
+
+class MetricsRegistry:
+    """Contadores e histogramas com labels, thread-safe, renderizados no formato texto do Prometheus"""
+    def __init__(self, prefix=METRIC_PREFIX, buckets=LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._descriptions = {}  # nome -> (tipo, ajuda)
+        self._counters = {}  # (nome, labels) -> valor
+        self._histograms = {}  # (nome, labels) -> [contagens por bucket (não cumulativas), soma, total]
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, help_text):
+        self._descriptions[name] = (kind, help_text)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bucket] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """Todas as métricas no formato texto de exposição do Prometheus (0.0.4)"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in self._histograms.items())
+
+        lines, described = [], set()
+        for (name, labels), value in counters:
+            self._header(lines, described, name, 'counter')
+            lines.append(f"{self.prefix}_{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), (counts, total, count) in histograms:
+            self._header(lines, described, name, 'histogram')
+            cumulative = 0
+            for upper, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if upper == float('inf') else _number(upper)
+                lines.append(f"{self.prefix}_{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{self.prefix}_{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{self.prefix}_{name}_count{_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, described, name, default_kind):
+        if name not in described:
+            kind, help_text = self._descriptions.get(name, (default_kind, name))
+            lines.append(f"# HELP {self.prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+            described.add(name)
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+metrics = MetricsRegistry()
+metrics.describe('stage_seconds', 'histogram', 'Tempo de cada etapa por caminho (predição, treino)')
+metrics.describe('http_request_seconds', 'histogram', 'Tempo total da requisição HTTP por handler')
+metrics.describe('http_requests_total', 'counter', 'Requisições HTTP por handler, método e status')
+metrics.describe('rows_scored_total', 'counter', 'Colaboradores pontuados por caminho de predição')
+metrics.describe('prediction_batches_total', 'counter', 'Lotes pontuados pelo micro-batching de predições individuais')
+metrics.describe('training_jobs_total', 'counter', 'Jobs de treinamento encerrados por tipo e estado')
+
+# Estado da requisição em andamento (definido pelo InstrumentationMiddleware)
+_request = contextvars.ContextVar('people_analytics_request', default=None)
+
+class StageTimer:
+    """
+    Mede etapas consecutivas de um caminho: start(etapa) encerra a anterior e observa seu tempo
+
+    Dentro de uma requisição, começa na etapa 'parse' a partir da chegada da
+    requisição e é encerrado pelo middleware quando a resposta começa a sair.
+    """
+    def __init__(self, path, registry=metrics):
+        self.path = path
+        self.registry = registry
+        self.current = None
+        self._started = None
+        self._lock = threading.Lock()
+        request = _request.get()
+        if request is not None:
+            self.current, self._started = 'parse', request['started']
+            request['timers'].append(self)
+
+    def start(self, stage):
+        now = time.perf_counter()
+        with self._lock:
+            self._close(now)
+            self.current, self._started = stage, now
+
+    def finish(self):
+        with self._lock:
+            self._close(time.perf_counter())
+
+    def observe(self, stage, seconds):
+        """Etapa medida fora deste processo (ex.: no pool de processos de scoring), contida na etapa atual"""
+        self.registry.observe('stage_seconds', seconds, path=self.path, stage=stage)
+
+    def _close(self, now):
+        if self.current is not None:
+            self.registry.observe('stage_seconds', now - self._started, path=self.path, stage=self.current)
+            self.current = None
+
+class RequestProfiler:
+    """Liga/desliga o cProfile por requisição e salva os .prof em profile_dir"""
+    def __init__(self, enabled=False, profile_dir='data/profiles'):
+        self.enabled = enabled
+        self.profile_dir = profile_dir
+
+    def run(self, name, fn, *args, **kwargs):
+        """Roda fn sob cProfile e salva as estatísticas; retorna (resultado, caminho do .prof)"""
+        profile = cProfile.Profile()
+        try:
+            result = profile.runcall(fn, *args, **kwargs)
+        finally:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{name}.prof")
+            profile.dump_stats(path)
+        return result, path
+
+profiler = RequestProfiler(
+    enabled=os.getenv('PROFILE_REQUESTS', '0') == '1',
+    profile_dir=os.getenv('PROFILE_DIR', 'data/profiles')
+)
+
+def profiling_requested():
+    """Se a requisição em andamento pediu profiling (X-Profile: 1 com o profiling ligado)"""
+    request = _request.get()
+    return request is not None and request['profile']
+
+def profiled(endpoint):
+    """
+    Marca um endpoint síncrono (ou o trabalho síncrono de um endpoint async) para profiling por requisição
+
+    O cProfile precisa rodar na thread do handler (o FastAPI executa endpoints
+    síncronos no threadpool), por isso o hook fica no endpoint e não no middleware.
+    """
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        if not profiling_requested():
+            return endpoint(*args, **kwargs)
+        request = _request.get()
+        result, request['profile_file'] = profiler.run(endpoint.__name__, endpoint, *args, **kwargs)
+        return result
+    return wrapper
+
+class InstrumentationMiddleware:
+    """Middleware ASGI: tempo total e contagem de requisições por handler, etapas e hook de profiling"""
+    def __init__(self, app, registry=metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get('headers') or [])
+        request = {
+            'started': time.perf_counter(),
+            'timers': [],
+            'profile': profiler.enabled and headers.get(b'x-profile') == b'1',
+            'profile_file': None
+        }
+        token = _request.set(request)
+        status = {'code': 500}
+
+        async def instrumented_send(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+                for timer in request['timers']:
+                    timer.finish()
+                if request['profile_file'] is not None:
+                    message = {
+                        **message,
+                        'headers': list(message.get('headers', [])) + [(b'x-profile-file', request['profile_file'].encode())]
+                    }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, instrumented_send)
+        finally:
+            _request.reset(token)
+            endpoint = scope.get('endpoint')
+            handler = getattr(endpoint, '__name__', 'not_found')
+            self.registry.observe('http_request_seconds', time.perf_counter() - request['started'], handler=handler)
+            self.registry.inc('http_requests_total', handler=handler, method=scope['method'], status=status['code'])
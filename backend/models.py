@@ -1,130 +1,24 @@
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, cross_validate
 from sklearn.preprocessing import LabelEncoder
-from sklearn.metrics import classification_report, roc_auc_score, roc_curve
+from sklearn.metrics import classification_report, roc_auc_score
+from scipy.special import logsumexp
 from hmmlearn.hmm import GaussianHMM
-import matplotlib.pyplot as plt
-import os
+import time
+
+from evaluation import evaluation_arrays
+from generate_dataset import generate_synthetic_dataset
+from survey_store import SURVEY_FEATURES, get_survey_history
 
 # --- Geração de Dados Sintéticos ---
 
 def generate_synthetic_data(n_employees=500, n_months=12, seed=42):
     """Gera um DataFrame sintético de dados de colaboradores e surveys."""
-    np.random.seed(seed)
-    
-    employees_data = []
-    
-    for emp_id in range(n_employees):
-        # Demographics
-        idade = np.random.randint(22, 65)
-        tempo_empresa = np.random.randint(3, 240)  # 3 meses a 20 anos
-        departamento = np.random.choice(['Sales', 'Engineering', 'HR', 'Marketing', 'Finance'])
-        nivel = np.random.choice(['Junior', 'Pleno', 'Senior'])
-        faixa_salarial = np.random.choice(['Entry', 'Mid', 'Senior'])
-        localizacao = np.random.choice(['Remoto', 'Híbrido', 'Presencial'])
-
-        # Historical events
-        promovido = np.random.choice([0, 1], p=[0.9, 0.1])
-        aumento_salarial = np.random.uniform(0, 15)
-        manager_change = np.random.choice([0, 1], p=[0.85, 0.15])
-        treinamentos = np.random.randint(0, 5)
-        avaliacao_performance = np.random.uniform(2.5, 5)
-
-        # Turnover outcome (base probability)
-        base_desligamento_prob = 0.15
-
-        # Factors that increase desligamento risk
-        if tempo_empresa < 6:
-            base_desligamento_prob += 0.1
-        if promovido == 0 and tempo_empresa > 24:
-            base_desligamento_prob += 0.05
-        if aumento_salarial < 3:
-            base_desligamento_prob += 0.05
-        if manager_change == 1:
-            base_desligamento_prob += 0.08
-        if avaliacao_performance < 3:
-            base_desligamento_prob += 0.1
-        if localizacao == 'Presencial' and np.random.random() < 0.3:
-            base_desligamento_prob += 0.03
-
-        # Clamp probability
-        base_desligamento_prob = min(base_desligamento_prob, 0.8)
-
-        # Generate monthly survey responses + desligamento outcome
-        survey_history = []
-        desligamento = 0
-
-        # Simular que scores baixos aumentam a probabilidade de desligamento
-        low_score_factor = 1.0 if base_desligamento_prob < 0.3 else 0.5
-        
-        for month in range(1, n_months + 1):
-            # Survey scores: Likert scale 1-5
-            engajamento = np.random.normal(3.5 * low_score_factor, 0.8)
-            satisfaction = np.random.normal(3.5 * low_score_factor, 0.9)
-            recognition = np.random.normal(3.2, 0.9)
-            growth = np.random.normal(3.0 * low_score_factor, 1.0)
-            manager_rel = np.random.normal(3.6, 0.8)
-            work_life = np.random.normal(3.3, 1.0)
-
-            # Clamp to 1-5
-            engajamento = np.clip(engajamento, 1, 5)
-            satisfaction = np.clip(satisfaction, 1, 5)
-            recognition = np.clip(recognition, 1, 5)
-            growth = np.clip(growth, 1, 5)
-            manager_rel = np.clip(manager_rel, 1, 5)
-            work_life = np.clip(work_life, 1, 5)
-
-            survey_history.append({
-                'month': month,
-                'engajamento': engajamento,
-                'satisfaction': satisfaction,
-                'recognition': recognition,
-                'growth': growth,
-                'manager_rel': manager_rel,
-                'work_life': work_life
-            })
-
-            # Decide desligamento at end of period (months 10-12)
-            if month >= 10 and np.random.random() < base_desligamento_prob:
-                desligamento = 1
-                break
-
-        # Average survey scores over 12 months
-        survey_df = pd.DataFrame(survey_history)
-        avg_engajamento = survey_df['engajamento'].mean()
-        satisfacao_media = survey_df['satisfaction'].mean()
-        reconhecimento_medio = survey_df['recognition'].mean()
-        crescimento_medio = survey_df['growth'].mean()
-        avg_manager_rel = survey_df['manager_rel'].mean()
-        equilibrio_vida_trabalho_medio = survey_df['work_life'].mean()
-
-        employees_data.append({
-            'employee_id': emp_id,
-            'idade': idade,
-            'tempo_empresa': tempo_empresa,
-            'departamento': departamento,
-            'nivel': nivel,
-            'faixa_salarial': faixa_salarial,
-            'localizacao': localizacao,
-            'promovido': promovido,
-            'aumento_salarial': aumento_salarial,
-            'manager_change': manager_change,
-            'treinamentos': treinamentos,
-            'avaliacao_performance': avaliacao_performance,
-            'avg_engajamento': avg_engajamento,
-            'satisfacao_media': satisfacao_media,
-            'reconhecimento_medio': reconhecimento_medio,
-            'crescimento_medio': crescimento_medio,
-            'avg_manager_rel': avg_manager_rel,
-            'equilibrio_vida_trabalho_medio': equilibrio_vida_trabalho_medio,
-            'desligamento': desligamento,
-            'survey_history': survey_history
-        })
-
-    df = pd.DataFrame(employees_data)
-    
+    df = generate_synthetic_dataset(n_employees=n_employees, n_months=n_months, seed=seed)
+
     # Renomear colunas para corresponder ao schema da API
     df.rename(columns={
         'avg_engajamento': 'avg_engidadement',
@@ -146,63 +40,179 @@ class SurveyStateDetector:
             random_state=42
         )
         self.n_states = n_states
-        self.feature_cols = [
-            'engajamento', 'satisfaction', 'recognition', 
-            'growth', 'manager_rel', 'work_life'
-        ]
+        self.feature_cols = list(SURVEY_FEATURES)
 
     def prepare_sequences(self, df_employees):
         """
         Converte dataframe com histórico de surveys em sequências
-        Input: df com colunas survey_history (lista de dicts)
-        Output: array de sequências (n_employees, n_months, n_features)
+        Input: df com histórico colunar (df.attrs['survey_history']) ou coluna survey_history (lista de dicts)
+        Output: X concatenado (total_months, n_features), comprimentos e o SurveyHistory
+        (indexável por colaborador, history[i] -> (n_months, n_features))
         """
-        sequences = []
-        lengths = []  # Comprimento de cada sequência
-
-        for _, row in df_employees.iterrows():
-            survey_hist = row['survey_history']
-            
-            # Corrigir nomes das chaves no histórico de survey
-            sequence = np.array([
-                [
-                    s.get('engajamento', s.get('engidadement')), # Tenta 'engajamento', se não, 'engidadement'
-                    s['satisfaction'],
-                    s['recognition'],
-                    s['growth'],
-                    s.get('manager_rel', s.get('manidader_rel')), # Tenta 'manager_rel', se não, 'manidader_rel'
-                    s['work_life']
-                ]
-                for s in survey_hist
-            ])
-            sequences.append(sequence)
-            lengths.append(len(sequence))
-
-        # Concatenar todas as sequências para treinar HMM
-        X = np.concatenate(sequences)
-
-        return X, lengths, sequences
+        history = get_survey_history(df_employees)
+
+        # X já é o array contíguo de todas as sequências concatenadas (sem cópia)
+        return history.values, history.lengths, history
 
     def fit(self, df_employees):
         """Treina o HMM com histórico de surveys"""
-        X, lengths, _ = self.prepare_sequences(df_employees)
-        self.model.fit(X, lengths)
-        self.lengths = lengths
+        return self.fit_history(get_survey_history(df_employees))
+
+    def fit_history(self, history):
+        """Mesmo que `fit`, a partir de um SurveyHistory já montado"""
+        self.model.fit(history.values, history.lengths)
+        self.lengths = history.lengths
+        self.__dict__.pop('_emission', None)  # Parâmetros mudaram: recalcular em infer_one
+        return self
+
+    def state_order(self):
+        """Índices dos estados ordenados do mais engajado (maior score médio emitido) ao de maior risco"""
+        return np.argsort(-self.model.means_.mean(axis=1))
+
+    def infer(self, df_employees, chunk_size=100_000):
+        """
+        Inferência completa do HMM em uma única passada vetorizada
+
+        Monta as sequências uma vez e, para todos os colaboradores ao mesmo tempo,
+        calcula o caminho de Viterbi, o estado atual (último mês) e a posterior
+        de forward-backward do último mês.
+
+        Returns:
+            dict com 'states' (total_months,) concatenados na ordem de X,
+            'lengths' (n_employees,), 'current_state' (n_employees,),
+            'state_probs' (n_employees, n_states) e 'last_log_delta' (n_employees, n_states),
+            o delta do Viterbi no último mês (retomado por filter_step)
+        """
+        return self.infer_history(get_survey_history(df_employees), chunk_size=chunk_size)
+
+    def infer_history(self, history, chunk_size=100_000):
+        """Mesmo que `infer`, a partir de um SurveyHistory já montado"""
+        X, lengths, offsets = history.values, history.lengths, history.offsets
+        n_employees = len(lengths)
+
+        # Log-verossimilhança de emissão para todos os meses de uma vez
+        frame_ll = self.model._compute_log_likelihood(np.asarray(X, dtype=np.float64))
+        with np.errstate(divide='ignore'):
+            log_startprob = np.log(self.model.startprob_)
+            log_transmat = np.log(self.model.transmat_)
+
+        states = np.empty(len(X), dtype=np.int64)
+        current_state = np.empty(n_employees, dtype=np.int64)
+        state_probs = np.empty((n_employees, self.n_states))
+        last_log_delta = np.empty((n_employees, self.n_states))
+
+        # Em blocos de colaboradores para limitar a memória do tensor (n, T, n_states)
+        for lo in range(0, n_employees, chunk_size):
+            hi = min(lo + chunk_size, n_employees)
+            chunk_lengths = lengths[lo:hi]
+            n_steps = int(chunk_lengths.max()) if hi > lo else 0
+            valid = np.arange(n_steps)[None, :] < chunk_lengths[:, None]
+            rows = offsets[lo:hi, None] + np.arange(n_steps)[None, :]
+            padded_ll = frame_ll[np.where(valid, rows, offsets[lo:hi, None])]
+
+            paths, last_log_delta[lo:hi] = _batched_viterbi(log_startprob, log_transmat, padded_ll, chunk_lengths)
+            states[offsets[lo]:offsets[hi]] = paths[valid]
+            current_state[lo:hi] = paths[np.arange(hi - lo), chunk_lengths - 1]
+
+            # No último mês beta = 1, então a posterior de forward-backward é o alpha normalizado
+            log_alpha = _batched_forward(log_startprob, log_transmat, padded_ll, chunk_lengths)
+            state_probs[lo:hi] = np.exp(log_alpha - logsumexp(log_alpha, axis=1, keepdims=True))
+
+        return {
+            'states': states,
+            'lengths': lengths,
+            'current_state': current_state,
+            'state_probs': state_probs,
+            'last_log_delta': last_log_delta
+        }
+
+    def infer_one(self, sequence):
+        """
+        Estado atual e posterior do último mês para uma única sequência (n_months, n_features)
+
+        Mesmo resultado de infer_history para um colaborador, sem o custo fixo do
+        lote: a emissão usa a Cholesky das covariâncias calculada uma vez, e como
+        só o último mês interessa o Viterbi não precisa de backtracking.
+        """
+        frame_ll = self.emission_log_likelihood(sequence)
+
+        with np.errstate(divide='ignore'):
+            log_startprob = np.log(self.model.startprob_)
+            log_transmat = np.log(self.model.transmat_)
+            delta = log_alpha = log_startprob + frame_ll[0]
+            for t in range(1, len(frame_ll)):
+                delta = (delta[:, None] + log_transmat).max(axis=0) + frame_ll[t]
+                log_alpha = _logsumexp_rows(log_alpha[:, None] + log_transmat) + frame_ll[t]
+            state_probs = np.exp(log_alpha - _logsumexp_rows(log_alpha[:, None]))
+
+        return int(delta.argmax()), state_probs
+
+    def filter_step(self, last_log_delta, state_probs, X_new):
+        """
+        Avança um mês o estado filtrado de cada colaborador, sem redecodificar a sequência
+
+        Recursões de forward e de Viterbi a partir do alpha (state_probs) e do delta
+        guardados do mês anterior; X_new (n, n_features) é o mês novo de cada um.
+        Com os mesmos parâmetros, o resultado é o de infer_history sobre a sequência completa.
+
+        Returns:
+            (last_log_delta, state_probs, current_state) do mês novo
+        """
+        frame_ll = self.emission_log_likelihood(X_new)
+        with np.errstate(divide='ignore'):
+            log_transmat = np.log(self.model.transmat_)
+            log_delta = (last_log_delta[:, :, None] + log_transmat).max(axis=1) + frame_ll
+            log_alpha = np.log(state_probs @ self.model.transmat_) + frame_ll
+        state_probs = np.exp(log_alpha - logsumexp(log_alpha, axis=1, keepdims=True))
+        return log_delta, state_probs, log_delta.argmax(axis=1)
+
+    def filter_start(self, X_first):
+        """Estado filtrado do primeiro mês de colaboradores novos: (last_log_delta, state_probs, current_state)"""
+        frame_ll = self.emission_log_likelihood(X_first)
+        with np.errstate(divide='ignore'):
+            log_delta = np.log(self.model.startprob_) + frame_ll
+        state_probs = np.exp(log_delta - logsumexp(log_delta, axis=1, keepdims=True))
+        return log_delta, state_probs, log_delta.argmax(axis=1)
+
+    def update(self, history, n_iter=5):
+        """
+        Atualiza o HMM com poucas iterações de EM partindo dos parâmetros atuais (warm start)
+
+        history: SurveyHistory com as sequências (já com os meses novos)
+        """
+        init_params, max_iter = self.model.init_params, self.model.n_iter
+        self.model.init_params = ''  # Não reinicializar: começar dos parâmetros já treinados
+        self.model.n_iter = n_iter
+        try:
+            self.model.fit(history.values, history.lengths)
+        finally:
+            self.model.init_params, self.model.n_iter = init_params, max_iter
+        self.__dict__.pop('_emission', None)
         return self
 
+    def emission_log_likelihood(self, X):
+        """Log-verossimilhança de emissão (..., n_states) de meses X (..., n_features)"""
+        inv_chol, log_norm = self.emission_params()
+        diff = np.asarray(X, dtype=np.float64)[..., None, :] - self.model.means_
+        solved = np.einsum('sij,...sj->...si', inv_chol, diff)
+        return log_norm - 0.5 * (solved ** 2).sum(axis=-1)
+
+    def emission_params(self):
+        """Inversa da Cholesky de cada covariância e a constante de normalização da gaussiana (em cache)"""
+        if '_emission' not in self.__dict__:
+            chol = np.linalg.cholesky(self.model.covars_)
+            inv_chol = np.linalg.inv(chol)
+            log_det = 2 * np.log(np.diagonal(chol, axis1=1, axis2=2)).sum(axis=1)
+            log_norm = -0.5 * (self.model.means_.shape[1] * np.log(2 * np.pi) + log_det)
+            self._emission = (inv_chol, log_norm)
+        return self._emission
+
     def predict_states(self, df_employees):
         """Prediz sequência de estados para cada colaborador"""
-        X, lengths, sequences = self.prepare_sequences(df_employees)
-        all_states = self.model.predict(X, lengths)
+        inference = self.infer(df_employees)
 
-        # Split de volta por colaborador
-        states_by_employee = []
-        start = 0
-        for length in lengths:
-            states_by_employee.append(all_states[start:start+length])
-            start += length
-
-        return states_by_employee
+        # Split de volta por colaborador (views de inference['states'])
+        return np.split(inference['states'], np.cumsum(inference['lengths'])[:-1])
 
     def get_current_state(self, df_employees, state_sequences):
         """Extrai o estado atual (último) para cada colaborador"""
@@ -213,37 +223,95 @@ class SurveyStateDetector:
         return df_employees
 
     def get_state_probabilities(self, df_employees):
-        """Retorna probabilidade de cada estado para o período recente"""
-        X, lengths, sequences = self.prepare_sequences(df_employees)
-        
-        probs_by_employee = []
-        start = 0
-
-        for i, length in enumerate(lengths):
-            # Último frame (mês)
-            recent_seq = X[start + length - 1 : start + length]
-            
-            # Calcular log-probabilidades de cada estado ser o estado inicial (start_prob)
-            # e a probabilidade de transição para o estado final (transmat)
-            # Para simplificar no MVP, vamos usar a probabilidade de emissão (emission probability)
-            # que é a probabilidade de observar o dado (recent_seq) dado cada estado.
-            
-            # Calcular log-probabilidade de emissão
-            log_emission_probs = self.model._compute_log_likelihood(recent_seq)
-            
-            # Converter para probabilidade (exp) e normalizar
-            emission_probs = np.exp(log_emission_probs[0])
-            normalized_probs = emission_probs / np.sum(emission_probs)
-            
-            probs_by_employee.append(normalized_probs)
-            start += length
-
-        return probs_by_employee
+        """Retorna probabilidade de cada estado para o período recente (posterior do último mês)"""
+        return self.infer(df_employees)['state_probs']
+
+def _logsumexp_rows(a):
+    """logsumexp no eixo 0 de uma matriz pequena (sem o custo fixo do scipy; chamar com divide='ignore')"""
+    peak = a.max(axis=0)
+    peak = np.where(np.isfinite(peak), peak, 0)
+    return peak + np.log(np.exp(a - peak).sum(axis=0))
+
+def _batched_forward(log_startprob, log_transmat, frame_ll, lengths):
+    """
+    Recursão forward (em log) para um lote de sequências com padding
+
+    frame_ll: (n, T, n_states); retorna o log-alpha do último mês válido de cada sequência
+    """
+    log_alpha = log_startprob + frame_ll[:, 0]
+    for t in range(1, frame_ll.shape[1]):
+        step = logsumexp(log_alpha[:, :, None] + log_transmat, axis=1) + frame_ll[:, t]
+        active = (t < lengths)[:, None]
+        log_alpha = np.where(active, step, log_alpha)
+    return log_alpha
+
+def _batched_viterbi(log_startprob, log_transmat, frame_ll, lengths):
+    """
+    Viterbi para um lote de sequências com padding
+
+    frame_ll: (n, T, n_states); retorna os caminhos (n, T) (valores após o fim de cada sequência são lixo)
+    e o delta (log) do último mês válido de cada sequência
+    """
+    n, n_steps, n_states = frame_ll.shape
+    rows = np.arange(n)
+    delta = log_startprob + frame_ll[:, 0]
+    backptr = np.zeros((n, n_steps, n_states), dtype=np.int64)
+    for t in range(1, n_steps):
+        scores = delta[:, :, None] + log_transmat
+        best = scores.argmax(axis=1)
+        step = scores[rows[:, None], best, np.arange(n_states)[None, :]] + frame_ll[:, t]
+        active = (t < lengths)[:, None]
+        delta = np.where(active, step, delta)
+        backptr[:, t] = best
+
+    # Backtracking a partir do último mês válido de cada sequência
+    paths = np.zeros((n, n_steps), dtype=np.int64)
+    state = delta.argmax(axis=1)
+    for t in range(n_steps - 1, -1, -1):
+        state = np.where(t == lengths - 1, delta.argmax(axis=1), state)
+        paths[:, t] = state
+        if t > 0:
+            state = np.where(t <= lengths - 1, backptr[rows, t, state], state)
+    return paths, delta
 
 # --- Random Forest Model ---
 
+# Nomes de colunas do schema da API -> nomes usados internamente
+API_COLUMN_ALIASES = {
+    'avg_engidadement': 'avg_engajamento',
+    'manidader_change': 'manager_change',
+    'avg_manidader_rel': 'avg_manager_rel'
+}
+INTERNAL_TO_API_COLUMNS = {internal: api for api, internal in API_COLUMN_ALIASES.items()}
+
+CATEGORICAL_COLS = ['departamento', 'nivel', 'faixa_salarial', 'localizacao']
+
+BASE_FEATURES = [
+    'idade', 'tempo_empresa', 'promovido', 'aumento_salarial', 'manager_change',
+    'treinamentos', 'avaliacao_performance',
+    'avg_engajamento', 'satisfacao_media', 'reconhecimento_medio',
+    'crescimento_medio', 'avg_manager_rel', 'equilibrio_vida_trabalho_medio',
+    'current_hmm_state',  # Estado latente do HMM
+    'departamento_encoded', 'nivel_encoded', 'faixa_salarial_encoded', 'localizacao_encoded'
+]
+
+# Categorias de risco: [0, 0.3) Baixo, [0.3, 0.6) Médio, [0.6, 1] Alto
+RISK_CATEGORIES = ['Baixo', 'Médio', 'Alto']
+RISK_BINS = np.array([0.3, 0.6])
+
+def risk_category_codes(probabilities):
+    """Código da categoria de risco (índice em RISK_CATEGORIES) para cada probabilidade"""
+    return np.searchsorted(RISK_BINS, probabilities, side='right').astype(np.int8)
+
 class TurnoverPredictor:
-    def __init__(self, random_state=42):
+    def __init__(self, random_state=42, n_jobs=None, reuse_cv_models=False, cv_folds=5):
+        """
+        Args:
+            n_jobs: núcleos usados no treino (folds da validação cruzada e árvores); -1 = todos
+            reuse_cv_models: em vez de refazer o fit após a validação cruzada, cada fold treina
+                n_estimators / cv_folds árvores e o modelo final é a união das árvores dos folds
+            cv_folds: número de folds da validação cruzada
+        """
         self.model = RandomForestClassifier(
             n_estimators=200,
             max_depth=12,
@@ -252,83 +320,137 @@ class TurnoverPredictor:
             class_weight='balanced',
             random_state=random_state
         )
+        self.n_jobs = n_jobs
+        self.reuse_cv_models = reuse_cv_models
+        self.cv_folds = cv_folds
         self.label_encoders = {}
+        self.category_index = {}  # Lookup categoria -> código (pd.Index dos classes_ do LabelEncoder)
         self.feature_names = None
 
     def prepare_features(self, df, state_probs=None, fit=False):
         """
         Prepara features para Random Forest
         Inclui: demografics + contexto + estados HMM
+
+        Retorna um DataFrame com as colunas em feature_names (o caminho rápido,
+        sem DataFrame intermediário, é build_feature_matrix).
         """
-        df_prep = df.copy()
-
-        # Renomear colunas para o padrão correto, caso o input venha da API
-        df_prep.rename(columns={
-            'avg_engidadement': 'avg_engajamento',
-            'manidader_change': 'manager_change',
-            'avg_manidader_rel': 'avg_manager_rel'
-        }, inplace=True)
-
-        # Categorical features -> encoding
-        categorical_cols = ['departamento', 'nivel', 'faixa_salarial', 'localizacao']
-
-        for col in categorical_cols:
-            if fit:
-                le = LabelEncoder()
-                df_prep[col + '_encoded'] = le.fit_transform(df_prep[col])
-                self.label_encoders[col] = le
-            else:
-                # Tratar categorias não vistas no treinamento
-                le = self.label_encoders[col]
-                df_prep[col + '_encoded'] = df_prep[col].apply(
-                    lambda x: le.transform([x])[0] if x in le.classes_ else -1
-                )
-        
-        # Features finais
-        feature_cols = [
-            'idade', 'tempo_empresa', 'promovido', 'aumento_salarial', 'manager_change',
-            'treinamentos', 'avaliacao_performance',
-            'avg_engajamento', 'satisfacao_media', 'reconhecimento_medio',
-            'crescimento_medio', 'avg_manager_rel', 'equilibrio_vida_trabalho_medio',
-            'current_hmm_state',  # Estado latente do HMM
-            'departamento_encoded', 'nivel_encoded', 'faixa_salarial_encoded', 'localizacao_encoded'
-        ]
+        if fit:
+            self.fit_encoders(df, state_probs)
+
+        X = self.build_feature_matrix(df, state_probs)
+        return pd.DataFrame(X, columns=self.feature_names, index=df.index)
+
+    def fit_encoders(self, df, state_probs=None):
+        """Ajusta os encoders categóricos e fixa a ordem das features"""
+        n_states = len(state_probs[0]) if state_probs is not None and len(state_probs) > 0 else 0
+        self.set_encoders({col: df[col] for col in CATEGORICAL_COLS}, n_states)
+
+    def set_encoders(self, categories, n_states=0):
+        """
+        Ajusta os encoders a partir dos valores de cada coluna categórica e fixa a ordem das features
+
+        categories: dict coluna -> valores (basta cada categoria aparecer uma vez)
+        n_states: nº de colunas state_prob_* (0 = sem probabilidades de estados HMM)
+        """
+        for col in CATEGORICAL_COLS:
+            le = LabelEncoder()
+            le.fit(categories[col])
+            self.label_encoders[col] = le
+            self.category_index[col] = pd.Index(le.classes_)
+        self.__dict__.pop('_category_codes', None)
 
         # Opcional: adicionar probabilidades de estados HMM
-        if state_probs is not None and len(state_probs) > 0:
-            n_states = len(state_probs[0])
-            for state_idx in range(n_states):
-                df_prep[f'state_prob_{state_idx}'] = [probs[state_idx] for probs in state_probs]
-                feature_cols.append(f'state_prob_{state_idx}')
+        self.feature_names = list(BASE_FEATURES) + [f'state_prob_{state_idx}' for state_idx in range(n_states)]
 
-        # Garantir que todas as colunas existam (para predição)
-        for col in feature_cols:
-            if col not in df_prep.columns:
-                df_prep[col] = 0 # Adicionar coluna com valor default 0
+    def build_feature_matrix(self, df, state_probs=None):
+        """
+        Monta a matriz de features (n, len(feature_names)) float32 na ordem de feature_names
 
-        X = df_prep[feature_cols].fillna(0)
-        self.feature_names = feature_cols
+        Escreve direto em uma matriz pré-alocada, sem copiar o DataFrame. Colunas
+        ausentes (ex.: state_prob_* quando não há probabilidades) ficam com 0, assim como NaN.
+        """
+        X = np.zeros((len(df), len(self.feature_names)), dtype=np.float32)
 
+        # Aceitar tanto os nomes internos quanto os do schema da API
+        source_cols = {API_COLUMN_ALIASES.get(col, col): col for col in df.columns}
+        if state_probs is not None and len(state_probs) > 0:
+            state_probs = np.asarray(state_probs)
+        else:
+            state_probs = None
+
+        for j, name in enumerate(self.feature_names):
+            if name.endswith('_encoded'):
+                col = name[:-len('_encoded')]
+                X[:, j] = self.encode_categories(col, df[source_cols[col]])
+            elif name.startswith('state_prob_'):
+                if state_probs is not None:
+                    X[:, j] = state_probs[:, int(name[len('state_prob_'):])]
+            elif name in source_cols:
+                X[:, j] = df[source_cols[name]].to_numpy(dtype=np.float32, na_value=np.nan)
+
+        X[np.isnan(X)] = 0
         return X
 
-    def train(self, df, state_probs=None, test_size=0.2):
-        """Treina o modelo com validação cruzada"""
-        X = self.prepare_features(df, state_probs, fit=True)
-        y = df['desligamento']
+    def encode_categories(self, col, values):
+        """Codifica uma coluna categórica com o lookup do treino (categorias desconhecidas -> -1)"""
+        index = self.__dict__.setdefault('category_index', {}).get(col)
+        if index is None:
+            # Modelos salvos antes do lookup existir: montar a partir do LabelEncoder
+            index = self.category_index[col] = pd.Index(self.label_encoders[col].classes_)
+        return index.get_indexer(values)
+
+    def train(self, df, state_probs=None, test_size=0.2, on_stage=None):
+        """
+        Treina o modelo com validação cruzada
+
+        on_stage: callback opcional chamado com o nome de cada etapa ('cv', 'rf_fit', 'eval') ao iniciá-la
+        O resultado inclui 'stage_seconds' com o tempo de parede de cada etapa.
+        """
+        self.fit_encoders(df, state_probs)
+        X = self.build_feature_matrix(df, state_probs)
+        return self.train_matrix(X, df['desligamento'].to_numpy(), test_size=test_size, on_stage=on_stage)
+
+    def train_matrix(self, X, y, test_size=0.2, on_stage=None):
+        """
+        Mesmo que `train`, a partir da matriz de features já montada (encoders já ajustados)
+
+        X pode ser um np.memmap (treino out-of-core): só os conjuntos de treino e teste vão para a memória.
+        """
+        enter_stage, stage_seconds = _stage_timer(on_stage)
 
         # Split
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=test_size, random_state=42, stratify=y
         )
-
-        # Validação cruzada
-        cv_scores = cross_val_score(self.model, X_train, y_train, cv=5, scoring='roc_auc')
+        # Pesos de class_weight='balanced' deste treino, reaplicados fixos nos retreinos incrementais (update)
+        self.class_weights = balanced_class_weights(y_train)
+
+        # Validação cruzada (folds em paralelo com n_jobs)
+        enter_stage('cv')
+        cv_model = clone(self.model)
+        if self.reuse_cv_models:
+            cv_model.set_params(n_estimators=int(np.ceil(self.model.n_estimators / self.cv_folds)))
+        cv_results = cross_validate(
+            cv_model, X_train, y_train, cv=self.cv_folds, scoring='roc_auc',
+            n_jobs=self.n_jobs, return_estimator=self.reuse_cv_models
+        )
+        cv_scores = cv_results['test_score']
         print(f"CV AUC: {cv_scores.mean():.3f} ± {cv_scores.std():.3f}")
 
         # Treinar
-        self.model.fit(X_train, y_train)
+        enter_stage('rf_fit')
+        if self.reuse_cv_models:
+            # Reaproveitar as árvores dos folds: sem fit redundante no conjunto completo
+            self.model = merge_forests(cv_results['estimator'])
+        else:
+            # Árvores em paralelo só durante o fit; a predição segue serial (lotes pequenos pagam caro por threads)
+            self.model.set_params(n_jobs=self.n_jobs)
+            self.model.fit(X_train, y_train)
+            self.model.set_params(n_jobs=None)
 
         # Avaliar
+        enter_stage('eval')
         y_pred = self.model.predict(X_test)
         y_proba = self.model.predict_proba(X_test)[:, 1]
 
@@ -336,40 +458,151 @@ class TurnoverPredictor:
         print(f"Test AUC: {auc:.3f}")
         print(f"\nClassification Report:\n{classification_report(y_test, y_pred)}")
 
-        # Plot ROC Curve e salvar
-        fpr, tpr, _ = roc_curve(y_test, y_proba)
-        plt.figure(figsize=(8, 6))
-        plt.plot(fpr, tpr, label=f'ROC (AUC={auc:.3f})')
-        plt.plot([0, 1], [0, 1], 'k--', label='Random')
-        plt.xlabel('False Positive Rate')
-        plt.ylabel('True Positive Rate')
-        plt.legend()
-        plt.title('ROC Curve - Turnover Prediction')
-        
-        # Salvar o gráfico em um local acessível
-        plot_path = os.path.join(os.getcwd(), 'roc_curve.png')
-        plt.savefig(plot_path)
-        plt.close()
-        print(f"Gráfico ROC salvo em: {plot_path}")
+        # Curvas e matriz de confusão como arrays (gráficos renderizados sob demanda pela API)
+        evaluation = evaluation_arrays(y_test, y_proba)
+        enter_stage(None)
 
-        return {'X_test': X_test, 'y_test': y_test, 'y_proba': y_proba, 'auc': auc}
+        print("Tempo por etapa: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stage_seconds.items()))
+        return {
+            'X_test': X_test, 'y_test': y_test, 'y_proba': y_proba, 'auc': auc,
+            'cv_auc': float(cv_scores.mean()), 'evaluation': evaluation, 'stage_seconds': stage_seconds
+        }
+
+    def update(self, df, state_probs=None, n_new_trees=20, window_size=None, test_size=0.2, on_stage=None):
+        """
+        Retreino incremental (floresta de janela deslizante) com dados novos
+
+        Com warm_start, treina só n_new_trees árvores novas nos dados novos e
+        descarta as mais antigas, mantendo as window_size mais recentes (padrão:
+        o tamanho atual da floresta). O custo depende dos dados novos, não do
+        histórico inteiro. Encoders e ordem das features continuam os do treino.
+
+        As árvores novas usam os pesos de classe fixos do treino inicial
+        (class_weights), não class_weight='balanced': com warm_start o sklearn
+        recalcularia os pesos só nos dados novos e árvores da mesma janela
+        ficariam ponderadas por proporções de classe diferentes.
+
+        on_stage: callback opcional chamado com 'rf_update' e 'eval' ao iniciar cada etapa
+        """
+        if not isinstance(self.model, RandomForestClassifier):
+            raise TypeError("Retreino incremental precisa do checkpoint do sklearn (ModelRegistry.load_checkpoint)")
+        enter_stage, stage_seconds = _stage_timer(on_stage)
+
+        X = self.build_feature_matrix(df, state_probs)
+        y = df['desligamento'].to_numpy()
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size, random_state=42, stratify=y
+        )
+
+        enter_stage('rf_update')
+        forest = self.model
+        window_size = window_size or forest.n_estimators
+        # Semente diferente a cada retreino: com a floresta sempre do mesmo tamanho, o warm_start
+        # repetiria as sementes das árvores novas
+        self.n_updates = self.__dict__.get('n_updates', 0) + 1
+        if self.__dict__.get('class_weights') is None:
+            # Checkpoint salvo antes dos pesos fixos: fixa os pesos no primeiro retreino
+            self.class_weights = balanced_class_weights(y_train)
+        forest.set_params(
+            class_weight=self.class_weights,
+            warm_start=True, n_estimators=len(forest.estimators_) + n_new_trees,
+            random_state=self.n_updates, n_jobs=self.n_jobs
+        )
+        forest.fit(X_train, y_train)
+        forest.estimators_ = forest.estimators_[-window_size:]
+        forest.set_params(warm_start=False, n_estimators=len(forest.estimators_), n_jobs=None)
+
+        enter_stage('eval')
+        y_proba = forest.predict_proba(X_test)[:, 1]
+        auc = roc_auc_score(y_test, y_proba)
+        evaluation = evaluation_arrays(y_test, y_proba)
+        print(f"Random Forest atualizado: {n_new_trees} árvores novas, {forest.n_estimators} na janela. Test AUC: {auc:.3f}")
+        enter_stage(None)
+
+        return {
+            'X_test': X_test, 'y_test': y_test, 'y_proba': y_proba, 'auc': auc,
+            'n_trees': forest.n_estimators, 'evaluation': evaluation, 'stage_seconds': stage_seconds
+        }
 
     def predict_risk(self, df, state_probs=None):
-        """Prediz risco de desligamento para novos dados"""
-        X = self.prepare_features(df, state_probs, fit=False)
-        probabilities = self.model.predict_proba(X)[:, 1]
+        """Prediz risco de desligamento para novos dados (retorna cópia do DataFrame com as colunas de risco)"""
+        result = self.predict_risk_arrays(df, state_probs)
 
         df_pred = df.copy()
-        df_pred['desligamento_risk'] = probabilities
-        df_pred['risk_category'] = pd.cut(
-            probabilities,
-            bins=[0, 0.3, 0.6, 1.0],
-            labels=['Baixo', 'Médio', 'Alto'],
-            right=False # Incluir o limite inferior, excluir o superior
-        )
+        df_pred['desligamento_risk'] = result['desligamento_risk']
+        df_pred['risk_category'] = pd.Categorical.from_codes(result['risk_category'], categories=RISK_CATEGORIES)
 
         return df_pred
 
+    def predict_risk_arrays(self, df, state_probs=None, on_stage=None):
+        """
+        Prediz risco de desligamento sem copiar o DataFrame de entrada
+
+        on_stage: callback opcional chamado com 'prepare_features' e 'predict_proba' ao iniciar cada etapa
+
+        Returns:
+            dict com arrays 'employee_id', 'desligamento_risk' e 'risk_category'
+            (códigos int8, índices em RISK_CATEGORIES)
+        """
+        if on_stage is not None:
+            on_stage('prepare_features')
+        X = self.build_feature_matrix(df, state_probs)
+        if on_stage is not None:
+            on_stage('predict_proba')
+        probabilities = self.model.predict_proba(X)[:, 1]
+
+        return {
+            'employee_id': df['employee_id'].to_numpy(),
+            'desligamento_risk': probabilities,
+            'risk_category': risk_category_codes(probabilities)
+        }
+
+    def feature_vector(self, record, state_probs=None):
+        """
+        Vetor de features (n_features,) float32 de um único colaborador, sem pandas
+
+        record: dict com os campos do colaborador (nomes da API ou internos) e current_hmm_state.
+        Mesmo resultado de uma linha de build_feature_matrix (ausentes/NaN -> 0, categoria desconhecida -> -1).
+        """
+        x = np.zeros(len(self.feature_names), dtype=np.float32)
+        for j, name in enumerate(self.feature_names):
+            if name.endswith('_encoded'):
+                col = name[:-len('_encoded')]
+                x[j] = self.category_codes(col).get(record.get(col), -1)
+            elif name.startswith('state_prob_'):
+                if state_probs is not None and len(state_probs) > 0:
+                    x[j] = state_probs[int(name[len('state_prob_'):])]
+            else:
+                value = record.get(name, record.get(INTERNAL_TO_API_COLUMNS.get(name)))
+                if value is not None:
+                    x[j] = value
+        x[np.isnan(x)] = 0
+        return x
+
+    def category_codes(self, col):
+        """Dict categoria -> código de uma coluna categórica (versão escalar de encode_categories)"""
+        codes = self.__dict__.setdefault('_category_codes', {})
+        if col not in codes:
+            codes[col] = {category: code for code, category in enumerate(self.label_encoders[col].classes_)}
+        return codes[col]
+
+    def predict_risk_one(self, record, state_probs=None, on_stage=None):
+        """
+        Risco de desligamento de um único colaborador: (probabilidade, código da categoria de risco)
+
+        on_stage: callback opcional, como em predict_risk_arrays
+        """
+        if on_stage is not None:
+            on_stage('prepare_features')
+        x = self.feature_vector(record, state_probs)
+        if on_stage is not None:
+            on_stage('predict_proba')
+        if hasattr(self.model, 'predict_proba_one'):
+            probability = float(self.model.predict_proba_one(x)[1])
+        else:
+            probability = float(self.model.predict_proba(x[None, :])[0, 1])
+        return probability, int(np.searchsorted(RISK_BINS, probability, side='right'))
+
     def get_feature_importance(self, top_n=10):
         """Retorna features mais importantes"""
         importances = self.model.feature_importances_
@@ -379,3 +612,31 @@ class TurnoverPredictor:
         }).sort_values('importance', ascending=False)
 
         return feature_importance_df.head(top_n)
+
+def _stage_timer(on_stage=None):
+    """Função enter_stage(etapa) que mede o tempo de parede de cada etapa em stage_seconds (enter_stage(None) encerra)"""
+    stage_seconds = {}
+    current = {'stage': None, 'started': None}
+
+    def enter_stage(stage):
+        now = time.perf_counter()
+        if current['stage'] is not None:
+            stage_seconds[current['stage']] = now - current['started']
+        current.update(stage=stage, started=now)
+        if on_stage is not None and stage is not None:
+            on_stage(stage)
+
+    return enter_stage, stage_seconds
+
+def balanced_class_weights(y):
+    """Pesos por classe iguais aos de class_weight='balanced' do sklearn: n_amostras / (n_classes * contagem)"""
+    classes, counts = np.unique(y, return_counts=True)
+    return {cls.item(): len(y) / (len(classes) * count) for cls, count in zip(classes, counts)}
+
+def merge_forests(forests):
+    """Une as árvores de várias RandomForestClassifier (mesmas classes) em uma única floresta"""
+    merged = forests[0]
+    merged.estimators_ = [tree for forest in forests for tree in forest.estimators_]
+    merged.n_estimators = len(merged.estimators_)
+    merged.set_params(n_jobs=None)
+    return merged
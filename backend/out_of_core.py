@@ -0,0 +1,127 @@
+"""
+Treinamento out-of-core para datasets maiores que a memória
+
+O dataset é lido em blocos de colaboradores (training.iter_training_chunks) e
+cada bloco é acrescentado a arquivos binários em um diretório de trabalho:
+    history_values.bin   meses de survey de todos os colaboradores (float32, total_months x n_features)
+    features.bin         matriz de features do Random Forest (float32, n_employees x n_features)
+
+Os treinos leem esses arquivos via np.memmap. Em memória ficam só um bloco,
+a amostra de colaboradores do EM do HMM, os conjuntos de treino/teste do
+Random Forest e arrays pequenos por colaborador (ids, rótulos, estados).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from models import CATEGORICAL_COLS, risk_category_codes
+from score_store import AGGREGATE_DIMENSIONS
+from survey_store import SURVEY_FEATURES, SurveyHistory, _offsets_from_lengths, get_survey_history
+
+def write_training_arrays(chunks, workspace, rf_model, n_states):
+    """
+    Grava histórico de surveys e features dos blocos em disco, em uma única passada
+
+    As categorias vistas até cada bloco recebem códigos provisórios (ordem de
+    aparição); no fim os encoders de rf_model são ajustados com todas as
+    categorias e os códigos gravados são trocados pelos definitivos. As colunas
+    current_hmm_state e state_prob_* ficam zeradas até infer_states.
+
+    Returns:
+        dict com 'history' (SurveyHistory sobre memmap), 'X' (memmap gravável),
+        'y' e 'employee_ids'
+    """
+    rf_model.set_encoders({col: [] for col in CATEGORICAL_COLS}, n_states)
+    values_path = os.path.join(workspace, 'history_values.bin')
+    features_path = os.path.join(workspace, 'features.bin')
+    lengths, employee_ids, labels = [], [], []
+
+    with open(values_path, 'wb') as values_file, open(features_path, 'wb') as features_file:
+        for chunk in chunks:
+            for col in CATEGORICAL_COLS:
+                index = rf_model.category_index[col]
+                seen = pd.Index(np.asarray(chunk[col])).unique()
+                rf_model.category_index[col] = index.append(seen[index.get_indexer(seen) < 0])
+            rf_model.build_feature_matrix(chunk).tofile(features_file)
+
+            history = get_survey_history(chunk)
+            np.ascontiguousarray(history.values, dtype=np.float32).tofile(values_file)
+            lengths.append(history.lengths)
+            employee_ids.append(history.employee_ids)
+            labels.append(chunk['desligamento'].to_numpy(dtype=np.int64))
+            print(f"Bloco gravado: {sum(map(len, employee_ids)):,} colaboradores")
+
+    provisional = dict(rf_model.category_index)
+    rf_model.set_encoders(provisional, n_states)
+    lengths, employee_ids = np.concatenate(lengths), np.concatenate(employee_ids)
+    offsets = _offsets_from_lengths(lengths)
+    X = np.memmap(features_path, dtype=np.float32, mode='r+', shape=(len(employee_ids), len(rf_model.feature_names)))
+
+    # Códigos provisórios -> códigos dos encoders definitivos (categorias em ordem alfabética)
+    remap = {
+        rf_model.feature_names.index(f'{col}_encoded'): rf_model.category_index[col].get_indexer(provisional[col])
+        for col in CATEGORICAL_COLS
+    }
+    for lo in range(0, len(X), 1_000_000):
+        block = X[lo:lo + 1_000_000]
+        for j, lookup in remap.items():
+            block[:, j] = lookup[block[:, j].astype(np.int64)]
+    X.flush()
+
+    values = np.memmap(values_path, dtype=np.float32, mode='r', shape=(int(offsets[-1]), len(SURVEY_FEATURES)))
+    return {
+        'history': SurveyHistory(values, offsets, employee_ids),
+        'X': X,
+        'y': np.concatenate(labels),
+        'employee_ids': employee_ids
+    }
+
+def fit_hmm_sample(hmm_model, history, sample_size=None, seed=42):
+    """Treina o HMM com o histórico de até sample_size colaboradores sorteados (só a amostra vai para a memória)"""
+    if sample_size is not None and sample_size < len(history):
+        sampled = np.random.default_rng(seed).choice(len(history), size=sample_size, replace=False)
+        history = history.select(history.employee_ids[np.sort(sampled)])
+    return hmm_model.fit_history(history)
+
+def infer_states(hmm_model, history, X, feature_names, chunk_size=100_000):
+    """
+    Inferência do HMM bloco a bloco, preenchendo current_hmm_state e state_prob_* de X
+
+    Returns:
+        dict como o de SurveyStateDetector.infer_history, sem 'states' (o caminho
+        de Viterbi de todos os meses não é guardado)
+    """
+    n_employees = len(history)
+    state_cols = [feature_names.index(f'state_prob_{state_idx}') for state_idx in range(hmm_model.n_states)]
+    current_col = feature_names.index('current_hmm_state')
+    inference = {
+        'lengths': history.lengths,
+        'current_state': np.empty(n_employees, dtype=np.int64),
+        'state_probs': np.empty((n_employees, hmm_model.n_states)),
+        'last_log_delta': np.empty((n_employees, hmm_model.n_states))
+    }
+    for lo in range(0, n_employees, chunk_size):
+        hi = min(lo + chunk_size, n_employees)
+        result = hmm_model.infer_history(history.slice(lo, hi), chunk_size=chunk_size)
+        for key in ('current_state', 'state_probs', 'last_log_delta'):
+            inference[key][lo:hi] = result[key]
+        X[lo:hi, state_cols] = result['state_probs']
+        X[lo:hi, current_col] = result['current_state']
+    X.flush()
+    return inference
+
+def record_scores_chunked(score_store, rf_model, X, employee_ids, model_version=None, scored_at=None,
+                          chunk_size=100_000):
+    """Grava no ScoreStore o score de cada colaborador, lendo X bloco a bloco"""
+    dimension_cols = {col: rf_model.feature_names.index(f'{col}_encoded') for col in AGGREGATE_DIMENSIONS}
+    n_scored = 0
+    for lo in range(0, len(X), chunk_size):
+        block = np.asarray(X[lo:lo + chunk_size])
+        risks = rf_model.model.predict_proba(block)[:, 1]
+        n_scored += score_store.record_scores(
+            employee_ids[lo:lo + chunk_size], risks, risk_category_codes(risks),
+            {col: rf_model.label_encoders[col].classes_[block[:, j].astype(np.int64)] for col, j in dimension_cols.items()},
+            model_version=model_version, scored_at=scored_at
+        )
+    return n_scored
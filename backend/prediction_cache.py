@@ -0,0 +1,154 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+def payload_key(record):
+    """Hash estável do payload de um colaborador (dict de EmployeeData, com survey_history)"""
+    payload = json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+class PredictionCache:
+    """
+    Cache LRU/TTL de predições por (versão do modelo, hash do payload)
+
+    Guarda (desligamento_risk, código da categoria de risco) por colaborador.
+    Entradas são de uma única versão de modelo, a ativa no registro: quando ela
+    muda (treinamento novo, rollback, activate) `set_version` descarta as
+    entradas da anterior. Requisições que ainda usam o bundle antigo não
+    consultam nem gravam o cache (e não o invalidam de volta). Com `disk_path`,
+    as entradas também vão para um SQLite local, que sobrevive a reinícios e é
+    consultado nos misses da memória.
+    """
+    def __init__(self, max_entries=100_000, ttl_seconds=3600, disk_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (risk, category, expires_at), do menos ao mais recente
+        self._lock = threading.Lock()
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "version TEXT, key TEXT, risk REAL, category INTEGER, expires_at REAL, "
+                "PRIMARY KEY (version, key))"
+            )
+            self._db.commit()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def set_version(self, version):
+        """Troca a versão ativa do cache; modelo novo invalida tudo o que foi calculado com o anterior"""
+        with self._lock:
+            if version == self.version:
+                return
+            self._entries.clear()
+            self.version = version
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions WHERE version != ?", (version,))
+                self._db.commit()
+
+    def get_many(self, version, keys):
+        """Predições em cache para cada chave ((risk, category) ou None), na ordem das chaves"""
+        now = time.time()
+        found = [None] * len(keys)
+        with self._lock:
+            if version != self.version:
+                # Bundle que já não é o ativo: tudo miss, sem tocar nas entradas da versão atual
+                self.misses += len(keys)
+                return found
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[2] <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[i] = entry[:2]
+
+            if self._db is not None:
+                missing = [i for i, value in enumerate(found) if value is None]
+                for i, entry in zip(missing, self._disk_get(version, [keys[i] for i in missing], now)):
+                    if entry is not None:
+                        self._remember(keys[i], entry)
+                        found[i] = entry[:2]
+                        self.disk_hits += 1
+
+            n_found = sum(value is not None for value in found)
+            self.hits += n_found
+            self.misses += len(keys) - n_found
+        return found
+
+    def put_many(self, version, keys, risks, categories):
+        """Guarda as predições de um lote (ignoradas se a versão já não for a ativa do cache)"""
+        expires_at = time.time() + self.ttl_seconds
+        entries = [(float(risk), int(category), expires_at) for risk, category in zip(risks, categories)]
+        with self._lock:
+            if version != self.version:
+                return
+            for key, entry in zip(keys, entries):
+                self._remember(key, entry)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)",
+                    [(version, key, *entry) for key, entry in zip(keys, entries)]
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "disk_path": self.disk_path
+            }
+
+    def _remember(self, key, entry):
+        # Chamar com self._lock
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, version, keys, now):
+        rows = {}
+        for lo in range(0, len(keys), 500):  # Limite de parâmetros por consulta do SQLite
+            chunk = keys[lo:lo + 500]
+            query = (
+                "SELECT key, risk, category, expires_at FROM predictions "
+                f"WHERE version = ? AND expires_at > ? AND key IN ({','.join('?' * len(chunk))})"
+            )
+            for key, risk, category, expires_at in self._db.execute(query, (version, now, *chunk)):
+                rows[key] = (risk, category, expires_at)
+        return [rows.get(key) for key in keys]
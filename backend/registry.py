@@ -0,0 +1,247 @@
+import json
+import os
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+import joblib
+
+from artifacts import MANIFEST_FILE, export_artifacts, load_artifacts
+from evaluation import load_evaluation, save_evaluation
+from flat_forest import FlatForest
+from models import SurveyStateDetector, TurnoverPredictor
+
+# Versão do bundle carregado dos .pkl do formato antigo (models/*.pkl, antes do registro versionado)
+LEGACY_VERSION = 'legacy'
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """
+    Conjunto imutável de modelos servidos juntos
+
+    Encoders categóricos e a ordem das features ficam em rf_model
+    (label_encoders, category_index, feature_names).
+    """
+    version: str
+    hmm_model: SurveyStateDetector
+    rf_model: TurnoverPredictor
+    metrics: dict = field(default_factory=dict)
+    trained_at: Optional[str] = None
+
+    @property
+    def feature_names(self):
+        return self.rf_model.feature_names
+
+    @property
+    def label_encoders(self):
+        return self.rf_model.label_encoders
+
+class ModelRegistry:
+    """
+    Registro versionado dos modelos em disco (models/<versão>/)
+
+    O bundle ativo é trocado atomicamente (uma única atribuição de referência):
+    requisições em andamento seguem com o bundle que pegaram no início, sem
+    lock na leitura. `models/active.json` guarda a versão ativa e se ela está
+    fixada (pinned); com pin, treinamentos novos são salvos mas não ativados.
+
+    Cada versão é servida a partir do artefato compacto (manifest.json + .npy
+    memory-mapped, ver artifacts.py); os .pkl ficam como checkpoint de treino e
+    como fallback para versões salvas antes do formato de artefato.
+
+    Funções registradas com `add_listener` recebem a versão a cada troca do
+    bundle ativo (ex.: invalidação do cache de predições).
+    """
+    HMM_FILE = 'hmm_model.pkl'
+    RF_FILE = 'rf_model.pkl'
+    METADATA_FILE = 'metadata.json'
+    EVALUATION_FILE = 'evaluation.npz'
+    POINTER_FILE = 'active.json'
+
+    def __init__(self, root='models'):
+        self.root = root
+        self.pinned = False
+        self._active: Optional[ModelBundle] = None
+        self._listeners = []
+        self._lock = threading.Lock()  # Serializa trocas (leituras não precisam)
+
+    @property
+    def active(self) -> Optional[ModelBundle]:
+        return self._active
+
+    def add_listener(self, listener):
+        """Registra listener(versão), chamado (sob o lock das trocas, em ordem) a cada troca do bundle ativo"""
+        self._listeners.append(listener)
+
+    # --- Disco ---
+
+    def save_version(self, hmm_model, rf_model, metrics=None, trained_at=None, evaluation=None):
+        """
+        Salva um novo conjunto de modelos em models/<versão>/ e retorna a versão (não ativa)
+
+        evaluation: arrays de avaliação do holdout (evaluation.evaluation_arrays), opcional
+        """
+        version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        path = os.path.join(self.root, version)
+        os.makedirs(path)
+        joblib.dump(hmm_model, os.path.join(path, self.HMM_FILE))
+        joblib.dump(rf_model, os.path.join(path, self.RF_FILE))
+        export_artifacts(path, hmm_model, rf_model, version, metrics=metrics, trained_at=trained_at)
+        if evaluation is not None:
+            save_evaluation(os.path.join(path, self.EVALUATION_FILE), evaluation)
+        # Sequência monotônica: ordena as versões (o sufixo aleatório não diz qual veio antes no mesmo segundo)
+        versions = self.list_versions()
+        sequence = self._sequence(versions[-1]) + 1 if versions else 1
+        metadata = {'version': version, 'sequence': sequence, 'trained_at': trained_at, 'metrics': metrics or {}}
+        _write_json_atomic(os.path.join(path, self.METADATA_FILE), metadata)
+        return version
+
+    def load_version(self, version, mmap_mode='r'):
+        """Carrega uma versão salva como ModelBundle (do artefato, se houver; senão dos .pkl)"""
+        path = os.path.join(self.root, version)
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            manifest, hmm_model, rf_model = load_artifacts(path, mmap_mode=mmap_mode)
+            return ModelBundle(
+                version=version,
+                hmm_model=hmm_model,
+                rf_model=rf_model,
+                metrics=manifest.get('metrics', {}),
+                trained_at=manifest.get('trained_at')
+            )
+        bundle = self.load_checkpoint(version)
+        _flatten_for_serving(bundle.rf_model)
+        return bundle
+
+    def load_checkpoint(self, version):
+        """Carrega os .pkl de uma versão como foram treinados (RandomForestClassifier do sklearn), para retomar treinos"""
+        path = os.path.join(self.root, version)
+        if not os.path.exists(os.path.join(path, self.METADATA_FILE)):
+            raise KeyError(f"Versão de modelo não encontrada: {version}")
+        with open(os.path.join(path, self.METADATA_FILE)) as f:
+            metadata = json.load(f)
+        return ModelBundle(
+            version=version,
+            hmm_model=joblib.load(os.path.join(path, self.HMM_FILE)),
+            rf_model=joblib.load(os.path.join(path, self.RF_FILE)),
+            metrics=metadata.get('metrics', {}),
+            trained_at=metadata.get('trained_at')
+        )
+
+    def load_evaluation(self, version):
+        """Arrays de avaliação salvos com a versão (None para versões sem avaliação)"""
+        path = os.path.join(self.root, version, self.EVALUATION_FILE)
+        return load_evaluation(path) if os.path.exists(path) else None
+
+    def list_versions(self):
+        """
+        Versões salvas, da mais antiga para a mais recente
+
+        Ordenadas pela sequência gravada no metadata.json ao salvar; versões
+        salvas antes da sequência vêm primeiro, pela ordem do nome (data e hora).
+        """
+        if not os.path.isdir(self.root):
+            return []
+        versions = [
+            name for name in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, name, self.METADATA_FILE))
+        ]
+        return sorted(versions, key=lambda name: (self._sequence(name), name))
+
+    def _sequence(self, version):
+        with open(os.path.join(self.root, version, self.METADATA_FILE)) as f:
+            return json.load(f).get('sequence', 0)
+
+    # --- Troca do bundle ativo ---
+
+    def publish(self, bundle):
+        """Publica o bundle de um treinamento novo; não ativa se houver uma versão fixada. Retorna se ativou"""
+        with self._lock:
+            if self.pinned:
+                return False
+            self._swap(bundle, pinned=False)
+            return True
+
+    def activate(self, version, pin=False):
+        """Ativa uma versão salva (rollback/pin). Com pin=True, treinamentos novos não a substituem"""
+        bundle = self.load_version(version) if not self._is_active(version) else self._active
+        with self._lock:
+            self._swap(bundle, pinned=pin)
+        return bundle
+
+    def rollback(self):
+        """Ativa (e fixa) a versão salva imediatamente anterior à ativa"""
+        versions = self.list_versions()
+        current = self._active.version if self._active is not None else None
+        older = versions[:versions.index(current)] if current in versions else versions
+        if not older:
+            raise KeyError("Não há versão anterior para rollback")
+        return self.activate(older[-1], pin=True)
+
+    def unpin(self):
+        with self._lock:
+            self.pinned = False
+            self._write_pointer()
+
+    def load_active(self):
+        """Carrega no startup a versão apontada por models/active.json (ou os .pkl do formato antigo)"""
+        pointer_path = os.path.join(self.root, self.POINTER_FILE)
+        if os.path.exists(pointer_path):
+            with open(pointer_path) as f:
+                pointer = json.load(f)
+            bundle = self.load_version(pointer['version'])
+            with self._lock:
+                self._set_active(bundle)
+                self.pinned = pointer.get('pinned', False)
+            return bundle
+
+        bundle = self.load_legacy()
+        if bundle is not None:
+            with self._lock:
+                self._set_active(bundle)
+        return bundle
+
+    def load_legacy(self):
+        """Bundle dos .pkl do formato antigo (models/*.pkl, sem pasta de versão), ou None se não existirem"""
+        legacy_hmm = os.path.join(self.root, self.HMM_FILE)
+        legacy_rf = os.path.join(self.root, self.RF_FILE)
+        if not (os.path.exists(legacy_hmm) and os.path.exists(legacy_rf)):
+            return None
+        return ModelBundle(LEGACY_VERSION, joblib.load(legacy_hmm), _flatten_for_serving(joblib.load(legacy_rf)))
+
+    def _is_active(self, version):
+        return self._active is not None and self._active.version == version
+
+    def _swap(self, bundle, pinned):
+        # Chamar com self._lock
+        self._set_active(bundle)
+        self.pinned = pinned
+        self._write_pointer()
+
+    def _set_active(self, bundle):
+        # Chamar com self._lock; a atribuição de self._active é a troca atômica
+        self._active = bundle
+        for listener in self._listeners:
+            listener(bundle.version)
+
+    def _write_pointer(self):
+        if self._active is None or self._active.version == LEGACY_VERSION:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        _write_json_atomic(
+            os.path.join(self.root, self.POINTER_FILE),
+            {'version': self._active.version, 'pinned': self.pinned}
+        )
+
+def _flatten_for_serving(rf_model):
+    """Troca a RandomForestClassifier de um .pkl pela FlatForest equivalente (mesmo avaliador do artefato)"""
+    if not isinstance(rf_model.model, FlatForest):
+        rf_model.model = FlatForest.from_sklearn(rf_model.model)
+    return rf_model
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
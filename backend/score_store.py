@@ -0,0 +1,206 @@
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, create_engine, event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import RISK_CATEGORIES
+
+# Dimensões com agregados materializados (além do total geral)
+AGGREGATE_DIMENSIONS = ['departamento', 'nivel', 'localizacao']
+TOTAL_DIMENSION = 'total'
+
+metadata = MetaData()
+
+# Último score de cada colaborador
+employee_scores = Table(
+    'employee_scores', metadata,
+    Column('employee_id', Integer, primary_key=True),
+    Column('model_version', String),
+    Column('desligamento_risk', Float, nullable=False),
+    Column('risk_category', Integer, nullable=False),  # Índice em RISK_CATEGORIES
+    Column('departamento', String),
+    Column('nivel', String),
+    Column('localizacao', String),
+    Column('scored_at', String)
+)
+
+# Contagem e soma de risco por (dimensão, valor, categoria de risco), mantidas incrementalmente
+score_aggregates = Table(
+    'score_aggregates', metadata,
+    Column('dimension', String, primary_key=True),
+    Column('value', String, primary_key=True),
+    Column('risk_category', Integer, primary_key=True),
+    Column('n_employees', Integer, nullable=False),
+    Column('risk_sum', Float, nullable=False)
+)
+
+class ScoreStore:
+    """
+    Scores de risco persistidos (SQLite via SQLAlchemy) com agregados materializados
+
+    Cada gravação atualiza o último score de cada colaborador e, na mesma
+    transação, ajusta os agregados pela diferença (sai a contribuição do score
+    anterior, entra a do novo). As leituras do dashboard só consultam os
+    agregados, sem varrer employee_scores.
+
+    Várias threads da API e o processo de treinamento gravam no mesmo banco:
+    no SQLite a transação de gravação começa com BEGIN IMMEDIATE, então o lock
+    de escrita é pego antes de ler os scores anteriores e os deltas dos
+    agregados nunca são calculados sobre uma leitura desatualizada.
+    """
+    def __init__(self, url='sqlite:///data/scores.db', write_chunk_size=10_000):
+        self.url = url
+        self.write_chunk_size = write_chunk_size
+        self._engine = None
+        self._engine_lock = threading.Lock()
+
+    @property
+    def engine(self):
+        # Criado no primeiro uso: importar a API não cria arquivos
+        with self._engine_lock:
+            if self._engine is None:
+                engine = create_engine(self.url, connect_args={'timeout': 30})
+                if engine.dialect.name == 'sqlite':
+                    database = engine.url.database
+                    if database and database != ':memory:' and os.path.dirname(database):
+                        os.makedirs(os.path.dirname(database), exist_ok=True)
+                    _immediate_write_transactions(engine)
+                with engine.execution_options(write=True).begin() as conn:
+                    metadata.create_all(conn)
+                self._engine = engine
+        return self._engine
+
+    def record_scores(self, employee_ids, risks, categories, dimensions, model_version=None, scored_at=None):
+        """
+        Grava o último score de cada colaborador e atualiza os agregados
+
+        Args:
+            employee_ids, risks, categories: arrays alinhados (categories = códigos de RISK_CATEGORIES)
+            dimensions: dict coluna -> array de valores para cada AGGREGATE_DIMENSIONS
+        """
+        scores = pd.DataFrame({
+            'employee_id': np.asarray(employee_ids, dtype=np.int64),
+            'model_version': model_version,
+            'desligamento_risk': np.asarray(risks, dtype=np.float64),
+            'risk_category': np.asarray(categories, dtype=np.int64),
+            **{col: _dimension_values(dimensions[col]) for col in AGGREGATE_DIMENSIONS},
+            'scored_at': scored_at or datetime.now().isoformat()
+        }).drop_duplicates('employee_id', keep='last')
+        if scores.empty:
+            return 0
+
+        with self.engine.execution_options(write=True).begin() as conn:
+            previous = self._previous_scores(conn, scores['employee_id'].tolist())
+            deltas = pd.concat([_contributions(scores, 1), _contributions(previous, -1)], ignore_index=True)
+            deltas = deltas.groupby(['dimension', 'value', 'risk_category'], as_index=False)[['n_employees', 'risk_sum']].sum()
+
+            upsert = sqlite_insert(score_aggregates)
+            upsert = upsert.on_conflict_do_update(
+                index_elements=['dimension', 'value', 'risk_category'],
+                set_={
+                    'n_employees': score_aggregates.c.n_employees + upsert.excluded.n_employees,
+                    'risk_sum': score_aggregates.c.risk_sum + upsert.excluded.risk_sum
+                }
+            )
+            conn.execute(upsert, deltas.to_dict('records'))
+
+            upsert = sqlite_insert(employee_scores)
+            upsert = upsert.on_conflict_do_update(
+                index_elements=['employee_id'],
+                set_={col.name: upsert.excluded[col.name] for col in employee_scores.columns if col.name != 'employee_id'}
+            )
+            for lo in range(0, len(scores), self.write_chunk_size):
+                conn.execute(upsert, scores.iloc[lo:lo + self.write_chunk_size].to_dict('records'))
+
+        return len(scores)
+
+    def summary(self):
+        """Totais gerais: nº de colaboradores, risco médio e contagem por categoria de risco"""
+        counts, risk_sums = self._category_totals(TOTAL_DIMENSION).get('', ([0] * len(RISK_CATEGORIES), 0.0))
+        total = sum(counts)
+        return {
+            'total_employees': total,
+            'avg_desligamento_risk': risk_sums / total if total else 0.0,
+            'risk_counts': dict(zip(RISK_CATEGORIES, counts))
+        }
+
+    def breakdown(self, dimension):
+        """Agregados por valor de uma dimensão (departamento, nivel ou localizacao)"""
+        if dimension not in AGGREGATE_DIMENSIONS:
+            raise ValueError(f"Dimensão sem agregados: {dimension}")
+        return [
+            {
+                dimension: value,
+                'total_employees': sum(counts),
+                'avg_desligamento_risk': risk_sum / sum(counts),
+                'risk_counts': dict(zip(RISK_CATEGORIES, counts))
+            }
+            for value, (counts, risk_sum) in sorted(self._category_totals(dimension).items())
+            if sum(counts) > 0
+        ]
+
+    def _category_totals(self, dimension):
+        query = select(
+            score_aggregates.c.value, score_aggregates.c.risk_category,
+            score_aggregates.c.n_employees, score_aggregates.c.risk_sum
+        ).where(score_aggregates.c.dimension == dimension)
+        totals = {}
+        with self.engine.connect() as conn:
+            for value, category, n_employees, risk_sum in conn.execute(query):
+                counts, total_risk = totals.get(value, ([0] * len(RISK_CATEGORIES), 0.0))
+                counts[category] = n_employees
+                totals[value] = (counts, total_risk + risk_sum)
+        return totals
+
+    def _previous_scores(self, conn, employee_ids):
+        columns = [employee_scores.c.desligamento_risk, employee_scores.c.risk_category] + \
+            [employee_scores.c[col] for col in AGGREGATE_DIMENSIONS]
+        rows = []
+        for lo in range(0, len(employee_ids), 500):  # Limite de parâmetros por consulta do SQLite
+            query = select(*columns).where(employee_scores.c.employee_id.in_(employee_ids[lo:lo + 500]))
+            rows.extend(conn.execute(query).all())
+        return pd.DataFrame(rows, columns=[c.name for c in columns])
+
+def _immediate_write_transactions(engine):
+    """
+    Transações do pysqlite controladas pelo SQLAlchemy: BEGIN IMMEDIATE para
+    conexões com execution_options(write=True), BEGIN comum para leituras
+
+    Sem isso o pysqlite só emite BEGIN na primeira escrita, e o SELECT dos
+    scores anteriores roda fora da transação.
+    """
+    @event.listens_for(engine, 'connect')
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def _begin(conn):
+        conn.exec_driver_sql('BEGIN IMMEDIATE' if conn.get_execution_options().get('write') else 'BEGIN')
+
+def _dimension_values(values):
+    """Valores de uma dimensão como texto; nulos (None/NaN) continuam nulos em vez de virarem 'None'/'nan'"""
+    values = pd.Series(np.asarray(values, dtype=object))
+    return values.astype(str).where(values.notna(), None).to_numpy()
+
+def _contributions(scores, sign):
+    """
+    Linhas (dimensão, valor, categoria, ±1, ±risco) de cada score para os agregados
+
+    Scores sem valor em uma dimensão entram só no total geral, não como um grupo da dimensão.
+    """
+    keys = [(TOTAL_DIMENSION, pd.Series('', index=scores.index))] + \
+        [(col, scores[col].dropna()) for col in AGGREGATE_DIMENSIONS]
+    return pd.concat([
+        pd.DataFrame({
+            'dimension': dimension,
+            'value': values,
+            'risk_category': scores.loc[values.index, 'risk_category'].astype(np.int64),
+            'n_employees': sign,
+            'risk_sum': sign * scores.loc[values.index, 'desligamento_risk'].astype(np.float64)
+        })
+        for dimension, values in keys
+    ], ignore_index=True)
@@ -0,0 +1,133 @@
+"""
+Pontuação com os modelos de um bundle (HMM + Random Forest) no schema da API
+
+Usado pelos endpoints de predição (app.py) e pelos processos do pool de
+scoring, que importam só este módulo: score_frame_in_worker carrega o bundle
+do registro (artefato em mmap, páginas compartilhadas entre os processos) e o
+mantém em memória enquanto a versão não muda.
+"""
+import numpy as np
+
+from models import _stage_timer
+from registry import LEGACY_VERSION, ModelRegistry
+from survey_store import SurveyHistory
+
+# Colunas de score médio do schema da API (mesma ordem de SURVEY_FEATURES)
+SURVEY_SCORE_COLUMNS = [
+    'avg_engidadement', 'satisfacao_media', 'reconhecimento_medio',
+    'crescimento_medio', 'avg_manidader_rel', 'equilibrio_vida_trabalho_medio'
+]
+
+def score_frame(bundle, df, histories=None, on_stage=None):
+    """
+    Pontua um DataFrame de colaboradores (schema da API) com os modelos do bundle
+
+    histories: histórico de survey por linha (lista de dicts mensais ou None)
+    on_stage: callback opcional com as etapas hmm_inference, prepare_features e predict_proba
+    Retorna o dict de arrays de predict_risk_arrays acrescido de 'confidence'.
+    """
+    if on_stage is not None:
+        on_stage('hmm_inference')
+    # Estado HMM: inferência real para quem enviou histórico, estimativa pelos scores médios para o resto
+    df['current_hmm_state'], state_probs = infer_hmm_states(bundle.hmm_model, df, histories)
+
+    # Predições (arrays, sem copiar o DataFrame)
+    result = bundle.rf_model.predict_risk_arrays(df, state_probs=state_probs, on_stage=on_stage)
+    risk = result['desligamento_risk']
+    result['confidence'] = np.maximum(risk, 1 - risk)
+    return result
+
+def infer_hmm_states(hmm_model, df, histories=None):
+    """
+    Estado HMM atual e probabilidades de estado para um lote de predição
+
+    Colaboradores com histórico de survey passam pela inferência em lote do HMM
+    treinado; os demais usam a estimativa vetorizada pelos scores médios.
+    """
+    state_order = hmm_model.state_order()
+    states = simulate_hmm_states(df, state_order)
+    probs = simulate_state_probabilities(df, n_states=hmm_model.n_states, state_order=state_order)
+
+    if histories is None:
+        return states, probs
+
+    with_history = np.flatnonzero([isinstance(h, list) and len(h) > 0 for h in histories])
+    if len(with_history) > 0:
+        records = [histories[i] for i in with_history]
+        history = SurveyHistory.from_records(records, df['employee_id'].to_numpy()[with_history])
+        inference = hmm_model.infer_history(history)
+        states[with_history] = inference['current_state']
+        probs[with_history] = inference['state_probs']
+
+    return states, probs
+
+# Probabilidades de estado simuladas por nível de score (colunas: Engajado, Neutro, Risco)
+LEVEL_STATE_PROBS = np.array([
+    [0.7, 0.25, 0.05],  # Mais provável estar engajado
+    [0.2, 0.6, 0.2],    # Mais provável estar neutro
+    [0.05, 0.25, 0.7]   # Mais provável estar em risco
+])
+
+def _score_levels(scores):
+    """Nível de engajamento pela média dos scores: 0 = Engajado, 1 = Neutro, 2 = Risco de Saída"""
+    avg_score = np.asarray(scores, dtype=np.float64).mean(axis=-1)
+    return np.where(avg_score >= 4.0, 0, np.where(avg_score >= 3.0, 1, 2))
+
+def simulate_hmm_states(df, state_order=(0, 1, 2)):
+    """
+    Simula estados HMM baseado em scores médios (para novas predições sem histórico)
+
+    state_order mapeia Engajado/Neutro/Risco para os índices de estado do HMM treinado.
+    """
+    return np.asarray(state_order)[_score_levels(df[SURVEY_SCORE_COLUMNS])]
+
+def simulate_state_probabilities(df, n_states=3, state_order=(0, 1, 2)):
+    """Simula probabilidades de estado para novas predições sem histórico"""
+    # Distribuir probabilidade baseada no score médio
+    probs = np.empty((len(df), n_states))
+    probs[:, np.asarray(state_order)] = LEVEL_STATE_PROBS[_score_levels(df[SURVEY_SCORE_COLUMNS])]
+    return probs
+
+def infer_hmm_state_one(hmm_model, record, history=None):
+    """Versão de infer_hmm_states para um único colaborador (dict no schema da API): (estado, probabilidades)"""
+    if history:
+        return hmm_model.infer_one(SurveyHistory.from_records([history], [record['employee_id']])[0])
+
+    state_order = hmm_model.state_order()
+    level = int(_score_levels([record[col] for col in SURVEY_SCORE_COLUMNS]))
+    probs = np.empty(hmm_model.n_states)
+    probs[state_order] = LEVEL_STATE_PROBS[level]
+    return int(state_order[level]), probs
+
+# Bundle carregado em cada processo do pool de scoring: (pasta dos modelos, versão) -> ModelBundle
+_worker_bundles = {}
+
+def worker_bundle(models_dir, version):
+    """
+    Bundle da versão no processo atual, carregado do registro na primeira vez (só a última versão fica em memória)
+
+    O bundle do formato antigo (LEGACY_VERSION) não tem pasta de versão: vem dos models/*.pkl.
+    """
+    key = (models_dir, version)
+    bundle = _worker_bundles.get(key)
+    if bundle is None:
+        registry = ModelRegistry(models_dir)
+        bundle = registry.load_legacy() if version == LEGACY_VERSION else registry.load_version(version)
+        if bundle is None:
+            raise KeyError(f"Versão de modelo não encontrada: {version}")
+        _worker_bundles.clear()
+        _worker_bundles[key] = bundle
+    return bundle
+
+def score_frame_in_worker(models_dir, version, df, histories=None):
+    """
+    score_frame em um processo do pool de scoring
+
+    Retorna o dict de arrays de score_frame com 'stage_seconds' (tempo de cada
+    etapa no processo), já que o callback on_stage não atravessa processos.
+    """
+    enter_stage, stage_seconds = _stage_timer()
+    result = score_frame(worker_bundle(models_dir, version), df, histories, on_stage=enter_stage)
+    enter_stage(None)
+    result['stage_seconds'] = stage_seconds
+    return result
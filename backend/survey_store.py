@@ -0,0 +1,179 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Colunas do histórico mensal de surveys (mesma ordem usada pelo HMM)
+SURVEY_FEATURES = [
+    'engajamento', 'satisfaction', 'recognition',
+    'growth', 'manager_rel', 'work_life'
+]
+
+# Chaves alternativas aceitas em históricos no formato antigo (lista de dicts)
+_LEGACY_KEYS = {
+    'engajamento': 'engidadement',
+    'manager_rel': 'manidader_rel'
+}
+
+class SurveyHistory:
+    """
+    Histórico de surveys em formato colunar
+
+    Todos os meses de todos os colaboradores ficam em um único array float32
+    contíguo `values` (total_months, n_features); o histórico do colaborador i
+    é `values[offsets[i]:offsets[i + 1]]`. A ordem dos colaboradores é dada por
+    `employee_ids`. Os arrays são tratados como imutáveis.
+    """
+    def __init__(self, values, offsets, employee_ids):
+        self.values = values
+        self.offsets = offsets
+        self.employee_ids = employee_ids
+
+    @classmethod
+    def from_tensor(cls, scores, lengths, employee_ids):
+        """Cria o histórico a partir de um tensor (n_employees, n_months, n_features) e do nº de meses válidos"""
+        lengths = np.asarray(lengths, dtype=np.int64)
+        answered = np.arange(scores.shape[1])[None, :] < lengths[:, None]
+        values = np.ascontiguousarray(scores[answered], dtype=np.float32)
+        return cls(values, _offsets_from_lengths(lengths), np.asarray(employee_ids, dtype=np.int64))
+
+    @classmethod
+    def from_records(cls, histories, employee_ids):
+        """Converte históricos no formato antigo (lista de dicts por colaborador)"""
+        lengths = np.fromiter((len(h) for h in histories), dtype=np.int64, count=len(histories))
+        keys = [(col, _LEGACY_KEYS.get(col)) for col in SURVEY_FEATURES]
+        values = np.array(
+            [[s[col] if col in s else s[legacy] for col, legacy in keys] for h in histories for s in h],
+            dtype=np.float32
+        ).reshape(-1, len(SURVEY_FEATURES))
+        return cls(values, _offsets_from_lengths(lengths), np.asarray(employee_ids, dtype=np.int64))
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.employee_ids)
+
+    def __getitem__(self, i):
+        """Sequência (n_months, n_features) do i-ésimo colaborador, sem cópia"""
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    # Imutável: cópias (ex.: df.attrs em operações do pandas) compartilham os arrays
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def slice(self, start, stop):
+        """Histórico dos colaboradores nas posições [start, stop), sem cópia"""
+        offsets = self.offsets[start:stop + 1]
+        return SurveyHistory(self.values[offsets[0]:offsets[-1]], offsets - offsets[0], self.employee_ids[start:stop])
+
+    def select(self, employee_ids):
+        """Retorna o histórico na ordem dos employee_ids pedidos (sem cópia se a ordem já for a mesma)"""
+        employee_ids = np.asarray(employee_ids, dtype=np.int64)
+        if np.array_equal(employee_ids, self.employee_ids):
+            return self
+
+        positions = pd.Index(self.employee_ids).get_indexer(employee_ids)
+        if (positions < 0).any():
+            missing = employee_ids[positions < 0][:5].tolist()
+            raise KeyError(f"Colaboradores sem histórico de survey: {missing}")
+
+        starts = self.offsets[positions]
+        lengths = self.offsets[positions + 1] - starts
+        offsets = _offsets_from_lengths(lengths)
+        rows = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return SurveyHistory(self.values[rows], offsets, employee_ids)
+
+    def append_months(self, employee_ids, values):
+        """
+        Novo histórico com um mês a mais para cada colaborador de uma onda de survey
+
+        Args:
+            employee_ids: colaboradores que responderam (sem repetição); os que
+                ainda não têm histórico entram no fim, com uma sequência de um mês
+            values: (len(employee_ids), n_features), o mês novo de cada um
+        """
+        employee_ids = np.asarray(employee_ids, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float32).reshape(len(employee_ids), -1)
+        if len(np.unique(employee_ids)) != len(employee_ids):
+            raise ValueError("Onda de survey com colaboradores repetidos")
+
+        positions = pd.Index(self.employee_ids).get_indexer(employee_ids)
+        is_new = positions < 0
+        positions[is_new] = len(self) + np.arange(is_new.sum())
+        all_ids = np.concatenate([self.employee_ids, employee_ids[is_new]])
+
+        lengths = np.concatenate([self.lengths, np.zeros(is_new.sum(), dtype=np.int64)])
+        lengths[positions] += 1
+        offsets = _offsets_from_lengths(lengths)
+
+        new_values = np.empty((offsets[-1], values.shape[1]), dtype=np.float32)
+        old_lengths = self.lengths
+        new_values[np.repeat(offsets[:len(self)] - self.offsets[:-1], old_lengths) + np.arange(self.offsets[-1])] = self.values
+        new_values[offsets[positions + 1] - 1] = values
+        return SurveyHistory(new_values, offsets, all_ids)
+
+    def save(self, path):
+        """
+        Salva o histórico em disco
+
+        Args:
+            path: arquivo `.npz` ou diretório (um `.npy` por array, para uso com mmap)
+        """
+        arrays = {'values': self.values, 'offsets': self.offsets, 'employee_ids': self.employee_ids}
+        if path.endswith('.npz'):
+            np.savez(path, **arrays)
+        else:
+            os.makedirs(path, exist_ok=True)
+            for name, array in arrays.items():
+                np.save(os.path.join(path, f'{name}.npy'), array)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Carrega um histórico salvo com `save`
+
+        Args:
+            path: arquivo `.npz` ou diretório com os `.npy`
+            mmap_mode: modo de memory-map do np.load (ex.: 'r'); só vale para diretórios
+        """
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                return cls(data['values'], data['offsets'], data['employee_ids'])
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in ('values', 'offsets', 'employee_ids')
+        }
+        return cls(**arrays)
+
+def _offsets_from_lengths(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+def attach_survey_history(df, history):
+    """Associa o histórico colunar ao DataFrame de colaboradores (via df.attrs)"""
+    df.attrs['survey_history'] = history
+    return df
+
+def get_survey_history(df):
+    """
+    Retorna o SurveyHistory alinhado às linhas do DataFrame
+
+    Usa o histórico colunar em df.attrs quando existir; caso contrário converte
+    a coluna antiga `survey_history` (lista de dicts por colaborador).
+    """
+    history = df.attrs.get('survey_history')
+    if history is not None:
+        return history.select(df['employee_id'].to_numpy())
+    if 'survey_history' in df.columns:
+        return SurveyHistory.from_records(df['survey_history'].tolist(), df['employee_id'].to_numpy())
+    raise KeyError("DataFrame sem histórico de survey")
@@ -0,0 +1,143 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# API com pool de processos de scoring (1 processo), rodando em uma pasta temporária
+os.environ.setdefault('SCORING_PROCESSES', '1')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+EMPLOYEE = {
+    'employee_id': 1, 'idade': 30, 'tempo_empresa': 24, 'departamento': 'TI', 'nivel': 'Pleno',
+    'faixa_salarial': 'B', 'localizacao': 'SP', 'promovido': 0, 'aumento_salarial': 0.05,
+    'manidader_change': 0, 'treinamentos': 2, 'avaliacao_performance': 3.5, 'avg_engidadement': 3.2,
+    'satisfacao_media': 3.1, 'reconhecimento_medio': 3.0, 'crescimento_medio': 2.9,
+    'avg_manidader_rel': 3.3, 'equilibrio_vida_trabalho_medio': 3.4
+}
+
+def employees(n, tempo_empresa=24):
+    """n colaboradores distintos (tempo_empresa diferente gera payloads fora do cache de predições)"""
+    return [
+        {**EMPLOYEE, 'employee_id': i, 'idade': 22 + i % 40, 'avg_engidadement': 1 + i % 5, 'tempo_empresa': tempo_empresa}
+        for i in range(n)
+    ]
+
+# Os processos (spawn) reimportam este arquivo: o teste só roda no processo principal
+if __name__ == '__main__':
+    from fastapi.testclient import TestClient
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    import app
+
+    # 1. Treino e predição em lote pelo pool de processos de scoring
+    with TestClient(app.app) as client:
+        response = client.post('/api/train/models', json={'n_employees': 200, 'wait': True, 'reuse_cv_models': True})
+        assert response.status_code == 200, response.text
+        batch = client.post('/api/predict/desligamento', json=employees(20)).json()
+        single = client.post('/api/predict/single', json=employees(20)[3]).json()
+        assert batch[3]['desligamento_risk'] == single['desligamento_risk']
+        # Cache de predições segue a versão publicada pelo treino (a individual veio do cache)
+        stats = client.get('/api/cache/stats').json()
+        assert stats['version'] == app.model_registry.active.version and stats['hits'] == 1, stats
+        print("Predição em lote pelo pool de processos confere com a individual")
+
+        # Pool no limite: 429 com Retry-After, sem enfileirar
+        app.scoring_executor.pending = app.scoring_executor.max_pending
+        response = client.post('/api/predict/desligamento', json=employees(20, tempo_empresa=30))
+        app.scoring_executor.pending = 0
+        assert response.status_code == 429 and response.headers['Retry-After'] == '1'
+        assert client.get('/health').status_code == 200
+
+        # Processo de scoring morto: o pool é recriado e a requisição seguinte é atendida
+        for process in list(app.scoring_executor.executor._processes.values()):
+            process.kill()
+            process.join()
+        statuses = [client.post('/api/predict/desligamento', json=employees(20, tempo_empresa=t)).status_code for t in (31, 32)]
+        assert statuses[-1] == 200, statuses
+    print("Pool de scoring saturado devolve 429 e é recriado após a morte de um processo")
+
+    # 2. Processo de treinamento morto no meio do job: o job falha e o treino seguinte roda num pool novo
+    with TestClient(app.app) as client:
+        job_id = client.post('/api/train/models', json={'n_employees': 200, 'reuse_cv_models': True}).json()['job_id']
+        for process in list(app.training_executor._processes.values()):
+            process.kill()
+        app.training_done[job_id].wait(60)
+        job = client.get('/api/train/status', params={'job_id': job_id}).json()['job']
+        assert job['state'] == 'error', job
+        response = client.post('/api/train/models', json={'n_employees': 200, 'wait': True, 'reuse_cv_models': True})
+        assert response.status_code == 200, response.text
+    print("Treinamento recriado após a morte do processo de treinamento")
+
+    # 3. Atualização do HMM: nova versão com as métricas só do que a atualização mediu
+    from survey_store import SURVEY_FEATURES
+    wave = pd.DataFrame({'employee_id': range(50), **{feature: 3.0 for feature in SURVEY_FEATURES}})
+    with TestClient(app.app) as client:
+        base_version = app.model_registry.active.version
+        response = client.post(
+            '/api/train/hmm-update', params={'wait': True, 'n_iter': 1},
+            files={'file': ('onda.csv', wave.to_csv(index=False).encode())}
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()['base_version'] == base_version
+        assert app.model_registry.active.metrics.keys() == {'hmm_update'}
+    print("Atualização do HMM grava só as métricas que mediu")
+
+    # 4. Predição em massa em streaming: blocos de chunk_size, NDJSON ou CSV, com o mesmo resultado do lote
+    month = {'engajamento': 2.0, 'satisfaction': 2.5, 'recognition': 3.0, 'growth': 2.0, 'manager_rel': 3.5, 'work_life': 4.0}
+    records = employees(20, tempo_empresa=40)
+    for record in records[::4]:
+        record['survey_history'] = [month, {**month, 'engajamento': 1.0}]
+    with TestClient(app.app) as client:
+        expected = client.post('/api/predict/desligamento', json=records).json()
+        expected_risks = [row['desligamento_risk'] for row in expected]
+
+        ndjson = ''.join(json.dumps(record) + '\n' for record in records).encode()
+        response = client.post('/api/predict/bulk', params={'chunk_size': 7}, files={'file': ('lote.ndjson', ndjson)})
+        assert response.status_code == 200, response.text
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row['employee_id'] for row in rows] == list(range(20))
+        assert [row['desligamento_risk'] for row in rows] == expected_risks
+
+        frame = pd.DataFrame(records)
+        frame['survey_history'] = [json.dumps(h) if isinstance(h, list) else '' for h in frame['survey_history']]
+        response = client.post(
+            '/api/predict/bulk', params={'chunk_size': 7, 'output_format': 'csv'},
+            files={'file': ('lote.csv', frame.to_csv(index=False).encode())}
+        )
+        assert response.status_code == 200, response.text
+        result = pd.read_csv(io.StringIO(response.text))  # Cabeçalho só no primeiro bloco
+        assert result['employee_id'].tolist() == list(range(20))
+        assert np.allclose(result['desligamento_risk'], expected_risks)
+
+        frame.loc[3, 'survey_history'] = '[{"engajamento": 2'
+        response = client.post('/api/predict/bulk', files={'file': ('lote.csv', frame.to_csv(index=False).encode())})
+        assert response.status_code == 400 and 'survey_history inválido na linha 4' in response.json()['detail']
+        response = client.post('/api/predict/bulk', files={'file': ('lote.ndjson', b'{"employee_id": 1}\n')})
+        assert response.status_code == 400 and 'Colunas obrigatórias ausentes' in response.json()['detail']
+    print("Predição em massa em streaming confere com o lote")
+
+    # 5. Bundle do formato antigo (models/*.pkl, sem pasta de versão) também é pontuado pelo pool
+    version = app.model_registry.active.version
+    for name in (app.model_registry.HMM_FILE, app.model_registry.RF_FILE):
+        shutil.copy(os.path.join('models', version, name), os.path.join('models', name))
+    shutil.rmtree(os.path.join('models', version))
+    os.remove(os.path.join('models', app.model_registry.POINTER_FILE))
+    app.model_registry._active = None
+    with TestClient(app.app) as client:
+        assert app.model_registry.active.version == 'legacy'
+        response = client.post('/api/predict/desligamento', json=employees(5))
+        assert response.status_code == 200, response.text
+        assert response.json()[0]['desligamento_risk'] == batch[0]['desligamento_risk']
+        response = client.post('/api/predict/bulk', files={'file': ('lote.ndjson', json.dumps(EMPLOYEE).encode())})
+        assert response.status_code == 200 and json.loads(response.text.splitlines()[0])['employee_id'] == 1
+    print("Bundle do formato antigo pontuado pelo pool de processos")
+
+    os.chdir('/')
+    shutil.rmtree(workdir)
+    print('Teste da API concluído com sucesso.')
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+from batching import MicroBatcher
+from executors import SaturatedError, thread_pool
+from instrumentation import MetricsRegistry, StageTimer, _request
+
+calls = []
+
+def double(items):
+    calls.append(list(items))
+    return [ValueError(f"item inválido: {item}") if item < 0 else item * 2 for item in items]
+
+async def submit_all(batcher, items):
+    return await asyncio.gather(*(batcher.submit(item) for item in items), return_exceptions=True)
+
+# 1. Chamadas concorrentes saem em um lote só, cada uma com o seu resultado (ou a sua exceção)
+batcher = MicroBatcher(double, max_batch_size=64, max_wait_seconds=0.01)
+results = asyncio.run(submit_all(batcher, [1, 2, -3, 4]))
+assert calls == [[1, 2, -3, 4]]
+assert results[:2] == [2, 4] and results[3] == 8 and isinstance(results[2], ValueError)
+print("Chamadas concorrentes agrupadas em um lote")
+
+# 2. Lotes limitados a max_batch_size; os itens que acumulam enquanto um lote roda saem juntos no seguinte
+calls.clear()
+batcher = MicroBatcher(double, max_batch_size=3, max_wait_seconds=0.01, executor=thread_pool('lotes', 1, 4))
+results = asyncio.run(submit_all(batcher, list(range(8))))
+assert results == [item * 2 for item in range(8)]
+assert [len(batch) for batch in calls] == [3, 3, 2], calls
+print("Lotes respeitam max_batch_size")
+
+# 3. Exceção em process_batch vai para todas as chamadas do lote
+def fail(items):
+    raise RuntimeError("lote falhou")
+
+results = asyncio.run(submit_all(MicroBatcher(fail, max_wait_seconds=0.001), [1, 2]))
+assert all(isinstance(result, RuntimeError) for result in results)
+print("Falha do lote repassada a todas as chamadas")
+
+# 4. Backpressure: além de max_pending itens esperando lote, submit levanta SaturatedError
+results = asyncio.run(submit_all(MicroBatcher(double, max_wait_seconds=0.01, max_pending=2), [1, 2, 3]))
+assert results[:2] == [2, 4] and isinstance(results[2], SaturatedError)
+print("Fila de lotes limitada por max_pending")
+
+# 5. O lote não herda o contexto da primeira requisição: o StageTimer do lote não é atribuído a ela
+registry = MetricsRegistry()
+requests = []
+
+def timed_batch(items):
+    stages = StageTimer('batch', registry=registry)
+    stages.start('score')
+    time.sleep(0.001)
+    stages.finish()
+    return items
+
+async def request(item):
+    state = {'started': time.perf_counter(), 'timers': []}
+    requests.append(state)
+    _request.set(state)
+    await asyncio.sleep(0.005)  # Lote esperando (max_wait_seconds) enquanto a requisição já começou
+    return await batcher.submit(item)
+
+async def concurrent_requests():
+    return await asyncio.gather(request(1), request(2))
+
+batcher = MicroBatcher(timed_batch, max_wait_seconds=0.01, executor=thread_pool('lotes', 1, 4))
+assert asyncio.run(concurrent_requests()) == [1, 2]
+stages = {dict(labels)['stage'] for name, labels in registry._histograms}
+assert stages == {'score'}, stages
+assert all(state['timers'] == [] for state in requests)
+print("Lote roda fora do contexto das requisições")
+
+print('Teste do micro-batching concluído com sucesso.')
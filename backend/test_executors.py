@@ -0,0 +1,57 @@
+import asyncio
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+from executors import SaturatedError, process_pool, thread_pool
+
+def die():
+    os._exit(1)
+
+def square(x):
+    return x * x
+
+# Os processos (spawn) reimportam este arquivo: o teste só roda no processo principal
+if __name__ == '__main__':
+    # 1. Pool de threads: além de max_pending tarefas, submit levanta SaturatedError
+    pool = thread_pool('teste', max_workers=1, max_pending=2)
+    release = threading.Event()
+    futures = [pool.submit(release.wait) for _ in range(2)]
+    try:
+        pool.submit(square, 2)
+        raise AssertionError("SaturatedError esperado")
+    except SaturatedError as e:
+        assert e.max_pending == 2
+    assert pool.stats() == {"max_pending": 2, "pending": 2, "rejected": 1}
+
+    # run(wait=True) espera uma vaga em vez de rejeitar
+    async def wait_for_slot():
+        task = asyncio.ensure_future(pool.run(square, 3, wait=True))
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        release.set()
+        return await task
+    assert asyncio.run(wait_for_slot()) == 9
+    for future in futures:
+        future.result()
+    assert pool.stats()["pending"] == 0 and pool.stats()["rejected"] == 1
+    pool.shutdown()
+    print("Limite de tarefas pendentes respeitado")
+
+    # 2. Pool de processos: um processo morto quebra o pool, que é recriado no submit seguinte
+    pool = process_pool('teste-processos', max_workers=1, max_pending=4)
+    assert pool.submit(square, 4).result() == 16
+    broken = pool.executor
+    try:
+        pool.submit(die).result()
+        raise AssertionError("BrokenProcessPool esperado")
+    except BrokenProcessPool:
+        pass
+    assert pool.submit(square, 5).result() == 25
+    assert pool.executor is not broken
+    assert asyncio.run(pool.run(square, 6)) == 36
+    assert pool.stats()["pending"] == 0
+    pool.shutdown()
+    print("Pool de processos recriado após a morte de um processo")
+
+    print('Teste dos executores concluído com sucesso.')
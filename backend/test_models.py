@@ -1,6 +1,13 @@
 import pandas as pd
+import numpy as np
 from models import generate_synthetic_data, SurveyStateDetector, TurnoverPredictor
+from flat_forest import FlatForest
+from evaluation import render_roc_curve
+from out_of_core import infer_states, write_training_arrays
+from survey_store import attach_survey_history
 import os
+import shutil
+import tempfile
 
 # 1. Geração de Dados
 df = generate_synthetic_data()
@@ -15,17 +22,72 @@ df = detector.get_current_state(df, state_sequences)
 state_probs = detector.get_state_probabilities(df)
 print(f"HMM treinado. Colunas adicionadas: {list(df.columns[-1:])}")
 
+# 2b. Inferência em lote deve bater com o hmmlearn
+X, lengths, _ = detector.prepare_sequences(df)
+inference = detector.infer(df)
+last_month = np.cumsum(lengths) - 1
+assert np.array_equal(inference['states'], detector.model.predict(X, lengths))
+assert np.allclose(inference['state_probs'], detector.model.predict_proba(X, lengths)[last_month])
+_, _, history = detector.prepare_sequences(df)
+for i in range(20):
+    current_state, probs = detector.infer_one(history[i])
+    assert current_state == inference['current_state'][i]
+    assert np.allclose(probs, inference['state_probs'][i])
+wave = history.values[history.offsets[1:] - 1]  # Onda nova repetindo o último mês de cada um
+_, step_probs, step_state = detector.filter_step(inference['last_log_delta'], inference['state_probs'], wave)
+extended = detector.infer_history(history.append_months(history.employee_ids, wave))
+assert np.array_equal(step_state, extended['current_state'])
+assert np.allclose(step_probs, extended['state_probs'])
+print("Inferência HMM em lote confere com hmmlearn")
+
 # 3. Treinamento Random Forest
 predictor = TurnoverPredictor()
 results = predictor.train(df, state_probs=state_probs)
 print(f"Random Forest treinado. Test AUC: {results['auc']:.3f}")
 
-# 4. Verificar se o arquivo ROC foi criado
-roc_path = os.path.join(os.getcwd(), 'roc_curve.png')
+# 3b. Floresta achatada e caminho de uma linha devem bater com o sklearn
+flat = FlatForest.from_sklearn(predictor.model)
+X_rf = predictor.build_feature_matrix(df, state_probs)
+sk_proba = predictor.model.predict_proba(X_rf)
+assert np.allclose(flat.predict_proba(X_rf), sk_proba)  # Lote grande (árvores Cython)
+assert np.allclose(flat.predict_proba(X_rf[:10]), sk_proba[:10])  # Lote pequeno (travessia nos arrays)
+records = df.to_dict('records')
+for i in range(50):
+    x = predictor.feature_vector(records[i], state_probs[i])
+    assert np.array_equal(x, X_rf[i])
+    assert np.allclose(flat.predict_proba_one(x), sk_proba[i])
+print("Floresta achatada confere com o sklearn")
+
+# 3c. Retreino incremental: árvores novas no lugar das mais antigas
+oldest_kept = predictor.model.estimators_[30]
+update_results = predictor.update(df, state_probs=state_probs, n_new_trees=30)
+assert predictor.model.n_estimators == len(predictor.model.estimators_) == 200
+assert predictor.model.estimators_[0] is oldest_kept
+print(f"Random Forest atualizado. Test AUC: {update_results['auc']:.3f}")
+
+# 3d. Treino out-of-core: arrays em memmap iguais aos montados em memória
+workspace = tempfile.mkdtemp()
+chunks = (attach_survey_history(df.iloc[lo:lo + 120], history.slice(lo, lo + 120)) for lo in range(0, len(df), 120))
+chunked_rf = TurnoverPredictor()
+arrays = write_training_arrays(chunks, workspace, chunked_rf, detector.n_states)
+chunked_inference = infer_states(detector, arrays['history'], arrays['X'], chunked_rf.feature_names, chunk_size=120)
+assert np.array_equal(arrays['history'].values, history.values)
+assert np.allclose(chunked_inference['state_probs'], inference['state_probs'])
+assert np.allclose(arrays['X'], predictor.build_feature_matrix(df, inference['state_probs']))
+shutil.rmtree(workspace)
+print("Arrays do treino out-of-core conferem com o treino em memória")
+
+# 4. Avaliação salva como arrays; gráfico ROC renderizado sob demanda
+evaluation = results['evaluation']
+assert np.isclose(evaluation['auc'], results['auc'])
+assert evaluation['confusion_matrix'].sum() == len(results['y_test'])
+plots_dir = tempfile.mkdtemp()
+roc_path = os.path.join(plots_dir, 'roc_curve.png')
+render_roc_curve(evaluation, roc_path)
 if os.path.exists(roc_path):
     print(f"Gráfico ROC criado com sucesso em: {roc_path}")
-    os.remove(roc_path) # Limpar o arquivo
 else:
     print("ERRO: Gráfico ROC não foi criado.")
+shutil.rmtree(plots_dir) # Limpar o arquivo
 
 print('Teste de modelos concluído com sucesso.')
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import time
+
+from prediction_cache import PredictionCache, payload_key
+
+workdir = tempfile.mkdtemp()
+record = {'employee_id': 1, 'departamento': 'TI', 'survey_history': [[3.0, 4.0]]}
+
+# 1. Chave estável: mesma chave para o mesmo payload, em qualquer ordem de campos
+assert payload_key(record) == payload_key(dict(reversed(list(record.items()))))
+assert payload_key(record) != payload_key({**record, 'departamento': 'RH'})
+print("Chave do payload estável")
+
+# 2. LRU: acima de max_entries sai a entrada usada há mais tempo
+cache = PredictionCache(max_entries=2, ttl_seconds=60)
+cache.set_version('v1')
+cache.put_many('v1', ['a', 'b'], [0.1, 0.2], [0, 0])
+assert cache.get_many('v1', ['a']) == [(0.1, 0)]
+cache.put_many('v1', ['c'], [0.9], [2])
+assert cache.get_many('v1', ['a', 'b', 'c']) == [(0.1, 0), None, (0.9, 2)]
+assert cache.stats()['evictions'] == 1 and cache.stats()['entries'] == 2
+print("LRU descarta a entrada menos recente")
+
+# 3. TTL: entradas expiradas contam como miss e saem do cache
+cache = PredictionCache(max_entries=10, ttl_seconds=0.05)
+cache.set_version('v1')
+cache.put_many('v1', ['a'], [0.5], [1])
+assert cache.get_many('v1', ['a']) == [(0.5, 1)]
+time.sleep(0.1)
+assert cache.get_many('v1', ['a']) == [None]
+assert cache.stats()['expirations'] == 1 and cache.stats()['entries'] == 0
+print("TTL expira as entradas")
+
+# 4. Versão: a troca invalida para frente; requisições com o bundle antigo não apagam nem gravam
+cache = PredictionCache(max_entries=10, ttl_seconds=60)
+cache.put_many('v1', ['a'], [0.5], [1])  # Antes de qualquer versão ativa: ignorado
+cache.set_version('v1')
+assert cache.get_many('v1', ['a']) == [None]
+cache.put_many('v1', ['a'], [0.5], [1])
+cache.set_version('v2')
+assert cache.get_many('v2', ['a']) == [None]
+cache.put_many('v2', ['a'], [0.7], [2])
+assert cache.get_many('v1', ['a']) == [None]  # Bundle antigo ainda em uso: miss
+cache.put_many('v1', ['a'], [0.5], [1])       # e não sobrescreve a versão atual
+assert cache.version == 'v2' and cache.get_many('v2', ['a']) == [(0.7, 2)]
+print("Troca de versão invalida só para frente")
+
+# 5. Disco: entradas sobrevivem a um cache novo; a troca de versão apaga as das outras versões
+disk_path = os.path.join(workdir, 'cache.db')
+cache = PredictionCache(max_entries=10, ttl_seconds=60, disk_path=disk_path)
+cache.set_version('v1')
+cache.put_many('v1', ['a', 'b'], [0.1, 0.2], [0, 0])
+cache = PredictionCache(max_entries=10, ttl_seconds=60, disk_path=disk_path)
+cache.set_version('v1')
+assert cache.get_many('v1', ['a', 'b', 'c']) == [(0.1, 0), (0.2, 0), None]
+assert cache.stats()['disk_hits'] == 2
+assert cache.get_many('v1', ['a']) == [(0.1, 0)] and cache.stats()['disk_hits'] == 2  # Já na memória
+assert cache.get_many('v0', ['a']) == [None]
+cache.set_version('v2')
+assert cache._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] == 0
+cache.clear()
+print("Cache em disco sobrevive a reinícios e segue a versão ativa")
+
+shutil.rmtree(workdir)
+print('Teste do cache de predições concluído com sucesso.')
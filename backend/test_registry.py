@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+
+import joblib
+
+from models import generate_synthetic_data, SurveyStateDetector, TurnoverPredictor
+from registry import LEGACY_VERSION, ModelRegistry
+from scoring import worker_bundle
+
+workdir = tempfile.mkdtemp()
+
+# Modelos pequenos, salvos várias vezes como versões diferentes
+df = generate_synthetic_data(n_employees=200)
+detector = SurveyStateDetector(n_states=3)
+detector.fit(df)
+df = detector.get_current_state(df, detector.predict_states(df))
+predictor = TurnoverPredictor()
+predictor.train(df, state_probs=detector.get_state_probabilities(df))
+
+# 1. Versões ordenadas pela sequência gravada (mesmo salvas no mesmo segundo)
+registry = ModelRegistry(os.path.join(workdir, 'models'))
+swaps = []
+registry.add_listener(swaps.append)
+versions = [registry.save_version(detector, predictor, metrics={'n': i}) for i in range(3)]
+assert registry.list_versions() == versions
+assert registry.active is None
+print("Versões ordenadas pela sequência")
+
+# 2. publish ativa; com versão fixada, treinamentos novos são salvos mas não ativados
+assert registry.publish(registry.load_version(versions[1]))
+assert registry.active.version == versions[1] and not registry.pinned
+registry.activate(versions[0], pin=True)
+assert not registry.publish(registry.load_version(versions[2]))
+assert registry.active.version == versions[0] and registry.pinned
+
+# O ponteiro em disco restaura a versão ativa e o pin no startup
+restarted = ModelRegistry(registry.root)
+assert restarted.load_active().version == versions[0] and restarted.pinned
+registry.unpin()
+assert registry.publish(registry.load_version(versions[2]))
+print("Pin impede a ativação de treinamentos novos")
+
+# 3. rollback ativa (e fixa) a versão anterior à ativa; não há anterior à mais antiga
+assert registry.rollback().version == versions[1] and registry.pinned
+assert registry.rollback().version == versions[0]
+try:
+    registry.rollback()
+    raise AssertionError("KeyError esperado")
+except KeyError:
+    pass
+assert swaps == [versions[1], versions[0], versions[2], versions[1], versions[0]]
+print("Rollback percorre as versões anteriores")
+
+# 4. Formato antigo (models/*.pkl sem pasta de versão): carregado como 'legacy', também nos processos de scoring
+legacy_root = os.path.join(workdir, 'legacy')
+os.makedirs(legacy_root)
+joblib.dump(detector, os.path.join(legacy_root, ModelRegistry.HMM_FILE))
+joblib.dump(predictor, os.path.join(legacy_root, ModelRegistry.RF_FILE))
+legacy = ModelRegistry(legacy_root)
+assert legacy.load_active().version == LEGACY_VERSION
+assert not os.path.exists(os.path.join(legacy_root, ModelRegistry.POINTER_FILE))
+assert worker_bundle(legacy_root, LEGACY_VERSION).version == LEGACY_VERSION
+assert ModelRegistry(os.path.join(workdir, 'vazio')).load_active() is None
+print("Formato antigo carregado como versão legacy")
+
+shutil.rmtree(workdir)
+print('Teste do registro de modelos concluído com sucesso.')
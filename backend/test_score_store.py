@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from models import RISK_CATEGORIES
+from score_store import AGGREGATE_DIMENSIONS, ScoreStore
+
+def random_scores(rng, employee_ids, with_nulls=False):
+    n = len(employee_ids)
+    dimensions = {
+        'departamento': rng.choice(['TI', 'RH', 'Vendas'], n).astype(object),
+        'nivel': rng.choice(['Jr', 'Pl', 'Sr'], n).astype(object),
+        'localizacao': rng.choice(['SP', 'RJ'], n).astype(object)
+    }
+    if with_nulls:
+        dimensions['departamento'][::7] = None
+        dimensions['localizacao'][::5] = np.nan
+    risks = rng.random(n)
+    categories = np.searchsorted([0.3, 0.6], risks, side='right')
+    return employee_ids, risks, categories, dimensions
+
+def recomputed_breakdown(store, dimension):
+    """Agregados recalculados do zero a partir de employee_scores"""
+    scores = pd.read_sql_table('employee_scores', store.engine).dropna(subset=[dimension])
+    return [
+        {
+            dimension: value,
+            'total_employees': len(group),
+            'avg_desligamento_risk': group['desligamento_risk'].mean(),
+            'risk_counts': {
+                name: int((group['risk_category'] == code).sum()) for code, name in enumerate(RISK_CATEGORIES)
+            }
+        }
+        for value, group in sorted(scores.groupby(dimension))
+    ]
+
+def assert_same_breakdown(actual, expected):
+    assert len(actual) == len(expected), (actual, expected)
+    for a, e in zip(actual, expected):
+        assert a.keys() == e.keys() and a['risk_counts'] == e['risk_counts'], (a, e)
+        assert a['total_employees'] == e['total_employees']
+        assert np.isclose(a['avg_desligamento_risk'], e['avg_desligamento_risk'])
+
+workdir = tempfile.mkdtemp()
+rng = np.random.default_rng(0)
+
+# 1. Agregados incrementais batem com o recálculo a partir dos scores (regravações, nulos, mudanças de grupo)
+store = ScoreStore(f"sqlite:///{os.path.join(workdir, 'scores.db')}")
+store.record_scores(*random_scores(rng, np.arange(500)), model_version='v1')
+store.record_scores(*random_scores(rng, np.arange(250, 800), with_nulls=True), model_version='v2')
+store.record_scores(*random_scores(rng, np.arange(0, 800, 3)), model_version='v3')
+summary = store.summary()
+assert summary['total_employees'] == 800
+assert sum(summary['risk_counts'].values()) == 800
+for dimension in AGGREGATE_DIMENSIONS:
+    assert_same_breakdown(store.breakdown(dimension), recomputed_breakdown(store, dimension))
+assert not any(row['departamento'] in ('None', 'nan', '') for row in store.breakdown('departamento'))
+print("Agregados incrementais conferem com o recálculo")
+
+# 2. Gravações concorrentes dos mesmos colaboradores não contam em dobro
+store = ScoreStore(f"sqlite:///{os.path.join(workdir, 'concurrent.db')}")
+errors = []
+
+def rescore(seed):
+    try:
+        thread_rng = np.random.default_rng(seed)
+        for _ in range(3):
+            store.record_scores(*random_scores(thread_rng, np.arange(2000)))
+    except Exception as e:
+        errors.append(e)
+
+# Primeiro uso concorrente (criação do engine e das tabelas) + regravações concorrentes
+threads = [threading.Thread(target=rescore, args=(seed,)) for seed in range(4)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert not errors, errors
+assert store.summary()['total_employees'] == 2000
+for dimension in AGGREGATE_DIMENSIONS:
+    assert_same_breakdown(store.breakdown(dimension), recomputed_breakdown(store, dimension))
+print("Gravações concorrentes mantêm os agregados consistentes")
+
+shutil.rmtree(workdir)
+print('Teste do score store concluído com sucesso.')
@@ -0,0 +1,88 @@
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from uploads import ingest_upload, profile_path_for
+
+SCHEMA = {'employee_id': int, 'idade': int, 'departamento': str, 'satisfacao_media': float}
+ALIASES = {'satisfacao_media': 'avg_satisfacao'}
+
+def csv_bytes(rows, columns=('employee_id', 'idade', 'departamento', 'satisfacao_media')):
+    return ('\n'.join([','.join(columns)] + [','.join(str(v) for v in row) for row in rows]) + '\n\n').encode()
+
+def leftovers(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.part'))
+
+workdir = tempfile.mkdtemp()
+filepath = os.path.join(workdir, 'colaboradores.csv')
+
+# 1. Arquivo válido: cópia idêntica, perfil por blocos e nenhum .part no fim
+data = csv_bytes([(i, 20 + i, ['TI', 'RH', ''][i % 3], 2.5 + i / 10) for i in range(7)])
+profile = ingest_upload(io.BytesIO(data), filepath, SCHEMA, ALIASES, chunk_rows=2)
+with open(filepath, 'rb') as f:
+    assert f.read() == data
+assert profile['n_bytes'] == len(data) and profile['n_rows'] == 7
+assert profile['columns']['idade']['min'] == 20 and profile['columns']['idade']['max'] == 26
+assert profile['columns']['departamento']['null_count'] == 2
+assert profile['columns']['departamento']['cardinality'] == 2
+assert not profile['validation']['valid'] and profile['validation']['error_counts'] == {'departamento': 2}
+with open(profile_path_for(filepath)) as f:
+    assert json.load(f)['n_rows'] == 7
+assert leftovers(workdir) == []
+print("Upload válido gravado com perfil")
+
+# 2. Valores inválidos: contagens por campo e exemplos com o número da linha
+data = csv_bytes([(1, 30, 'TI', 3.0), (2, 30.5, 'TI', 'x'), (3, 'abc', 'RH', 4.0), (4, '', 'RH', 2.0)])
+validation = ingest_upload(io.BytesIO(data), filepath, SCHEMA, ALIASES, chunk_rows=2)['validation']
+assert validation['n_invalid_rows'] == 3
+assert validation['error_counts'] == {'idade': 3, 'satisfacao_media': 1}
+assert {(e['row'], e['field']) for e in validation['errors']} == {(2, 'idade'), (3, 'idade'), (4, 'idade'), (2, 'satisfacao_media')}
+print("Erros de validação contados por campo e linha")
+
+# 3. strict: arquivo com linhas inválidas é descartado sem deixar .part nem sobrescrever o anterior
+with open(filepath, 'rb') as f:
+    previous = f.read()
+try:
+    ingest_upload(io.BytesIO(data), filepath, SCHEMA, ALIASES, strict=True)
+    raise AssertionError("ValueError esperado")
+except ValueError as e:
+    assert '3 linhas inválidas' in str(e)
+with open(filepath, 'rb') as f:
+    assert f.read() == previous
+assert leftovers(workdir) == []
+print("strict rejeita o arquivo inválido")
+
+# 4. Colunas: nome alternativo aceito; coluna obrigatória ausente rejeita o arquivo
+data = csv_bytes([(1, 30, 'TI', 3.0)], columns=('employee_id', 'idade', 'departamento', 'avg_satisfacao'))
+assert ingest_upload(io.BytesIO(data), filepath, SCHEMA, ALIASES)['validation']['valid']
+try:
+    ingest_upload(io.BytesIO(csv_bytes([(1, 30, 'TI')], columns=('employee_id', 'idade', 'departamento'))),
+                  os.path.join(workdir, 'incompleto.csv'), SCHEMA, ALIASES)
+    raise AssertionError("ValueError esperado")
+except ValueError as e:
+    assert 'satisfacao_media' in str(e)
+assert not os.path.exists(os.path.join(workdir, 'incompleto.csv')) and leftovers(workdir) == []
+print("Colunas alternativas aceitas e ausentes rejeitadas")
+
+# 5. Conversão para Parquet na mesma passada (requer pyarrow)
+data = csv_bytes([(i, 20 + i, 'TI', 3.0) for i in range(5)])
+if importlib.util.find_spec('pyarrow') is not None:
+    profile = ingest_upload(io.BytesIO(data), filepath, SCHEMA, ALIASES, convert='parquet', chunk_rows=2)
+    assert pd.read_parquet(profile['converted_path']).equals(pd.read_csv(filepath))
+    print("Conversão para Parquet confere com o CSV")
+else:
+    try:
+        ingest_upload(io.BytesIO(data), filepath, SCHEMA, ALIASES, convert='parquet')
+        raise AssertionError("ValueError esperado")
+    except ValueError as e:
+        assert 'pyarrow' in str(e)
+    print("Conversão sem pyarrow rejeitada")
+assert leftovers(workdir) == []
+
+shutil.rmtree(workdir)
+print('Teste de upload concluído com sucesso.')
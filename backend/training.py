@@ -0,0 +1,447 @@
+import copy
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from models import INTERNAL_TO_API_COLUMNS, SurveyStateDetector, TurnoverPredictor
+from generate_dataset import (
+    SURVEY_AVG_COLUMNS, generate_synthetic_dataset, history_path_for, iter_employees, load_dataset, read_employees
+)
+from registry import ModelRegistry
+from score_store import AGGREGATE_DIMENSIONS, ScoreStore
+from hmm_updates import apply_survey_wave, filter_state_from_inference, load_hmm_state, save_hmm_state
+from out_of_core import fit_hmm_sample, infer_states, record_scores_chunked, write_training_arrays
+from survey_store import SurveyHistory, attach_survey_history, get_survey_history
+
+# Etapas de um job de treinamento, na ordem em que acontecem
+TRAINING_STAGES = ['data_load', 'hmm_fit', 'hmm_inference', 'cv', 'rf_fit', 'eval', 'save', 'score']
+
+# Etapas de uma atualização incremental do HMM (nova onda de survey)
+HMM_UPDATE_STAGES = ['data_load', 'hmm_update', 'hmm_filter', 'save']
+
+# Etapas de um retreino incremental do Random Forest (floresta de janela deslizante)
+RF_UPDATE_STAGES = ['data_load', 'hmm_inference', 'rf_update', 'eval', 'save', 'score']
+
+class TrainingProgress:
+    """
+    Progresso e tempo de cada etapa de um job de treinamento
+
+    Cada mudança de etapa publica um snapshot em `shared[job_id]` (dict de um
+    multiprocessing.Manager), lido pelo processo da API em /api/train/status.
+    """
+    def __init__(self, job_id, shared=None, stages=TRAINING_STAGES):
+        self.job_id = job_id
+        self.shared = shared
+        self.stages = {stage: {'status': 'pending', 'seconds': None} for stage in stages}
+        self.current = None
+        self._stage_started = None
+
+    def start(self, stage):
+        """Encerra a etapa atual (se houver) e inicia a próxima"""
+        self._close_current()
+        self.current = stage
+        self._stage_started = time.perf_counter()
+        self.stages[stage]['status'] = 'running'
+        self.publish()
+
+    def finish(self):
+        """Encerra a última etapa"""
+        self._close_current()
+        self.publish()
+
+    def _close_current(self):
+        if self.current is not None:
+            self.stages[self.current]['status'] = 'done'
+            self.stages[self.current]['seconds'] = round(time.perf_counter() - self._stage_started, 4)
+            self.current = None
+
+    def snapshot(self):
+        return {
+            'stage': self.current,
+            'completed_stages': sum(s['status'] == 'done' for s in self.stages.values()),
+            'total_stages': len(self.stages),
+            'stages': copy.deepcopy(self.stages)
+        }
+
+    def publish(self):
+        if self.shared is not None:
+            self.shared[self.job_id] = self.snapshot()
+
+def load_training_data(params, seed=42):
+    """
+    Carrega (ou gera) o dataset de treinamento conforme os parâmetros de TrainModelsRequest
+
+    seed: semente dos dados sintéticos e do histórico fake de CSVs (as atualizações
+    incrementais usam update_seed, para não repetir os dados do treino base)
+    """
+    if params.get('use_synthetic', True):
+        print(f"Gerando dados sintéticos: {params['n_employees']} colaboradores, {params['n_months']} meses")
+        return generate_synthetic_dataset(n_employees=params['n_employees'], n_months=params['n_months'], seed=seed)
+
+    filepath = params.get('filepath')
+    if not filepath or not os.path.exists(filepath):
+        raise FileNotFoundError("Arquivo não encontrado")
+
+    # Tentar carregar pickle primeiro (com histórico), depois CSV/Parquet/Feather com histórico colunar, depois sem histórico
+    if filepath.endswith('.pkl'):
+        with open(filepath, 'rb') as f:
+            return pickle.load(f)
+    if os.path.exists(history_path_for(filepath)):
+        return load_dataset(filepath)
+
+    df = read_employees(filepath)
+    # Para CSV, gerar histórico fake baseado nas médias
+    return add_fake_survey_history(df, seed=seed)
+
+def update_seed(params, job_id):
+    """Semente de uma atualização incremental: params['seed'] ou derivada do job (o treino base usa 42)"""
+    if params.get('seed') is not None:
+        return params['seed']
+    return int(job_id or uuid.uuid4().hex[:12], 16) % (2 ** 31)
+
+def iter_training_chunks(params):
+    """
+    Dataset de treinamento em blocos de params['chunk_size'] colaboradores, sem carregá-lo inteiro
+
+    Cada bloco é um DataFrame com o histórico colunar em df.attrs. CSVs são lidos
+    com pd.read_csv(chunksize=...), Parquet por row groups e Feather via mmap; o
+    histórico colunar ao lado do arquivo, se existir, é aberto com mmap quando
+    salvo em diretório (`<nome>_history/`).
+    """
+    chunk_size = params['chunk_size']
+    if params.get('use_synthetic', True):
+        n_employees = params['n_employees']
+        for i, lo in enumerate(range(0, n_employees, chunk_size)):
+            chunk = generate_synthetic_dataset(
+                n_employees=min(chunk_size, n_employees - lo), n_months=params['n_months'], seed=42 + i
+            )
+            history = get_survey_history(chunk)
+            chunk['employee_id'] += lo
+            yield attach_survey_history(chunk, SurveyHistory(history.values, history.offsets, history.employee_ids + lo))
+        return
+
+    filepath = params.get('filepath')
+    if not filepath or not os.path.exists(filepath):
+        raise FileNotFoundError("Arquivo não encontrado")
+    if filepath.endswith('.pkl'):
+        raise ValueError("Treinamento em blocos requer CSV, Parquet ou Feather (pickle é carregado inteiro na memória)")
+
+    history_path = history_path_for(filepath)
+    history_dir = os.path.splitext(history_path)[0]
+    source = None
+    if os.path.isdir(history_dir):
+        source = SurveyHistory.load(history_dir, mmap_mode='r')
+    elif os.path.exists(history_path):
+        source = SurveyHistory.load(history_path)
+
+    position = 0
+    for i, chunk in enumerate(iter_employees(filepath, chunk_size)):
+        if source is None:
+            # Para CSV, gerar histórico fake baseado nas médias (semente por bloco)
+            chunk = add_fake_survey_history(chunk, seed=42 + i)
+        else:
+            employee_ids = chunk['employee_id'].to_numpy()
+            if np.array_equal(source.employee_ids[position:position + len(chunk)], employee_ids):
+                # Caso comum (CSV e histórico salvos juntos): mesma ordem, fatia sem cópia
+                attach_survey_history(chunk, source.slice(position, position + len(chunk)))
+            else:
+                attach_survey_history(chunk, source.select(employee_ids))
+        position += len(chunk)
+        yield chunk
+
+def run_training(params, job_id=None, shared_progress=None):
+    """
+    Pipeline completo de treinamento (HMM + Random Forest)
+
+    Roda no pool de processos de treinamento; salva os modelos como nova versão
+    do registro e retorna a versão, as métricas e o tempo de cada etapa.
+    """
+    progress = TrainingProgress(job_id, shared_progress)
+    print(f"Iniciando treinamento dos modelos (job {job_id})...")
+
+    # Carregar ou gerar dados
+    progress.start('data_load')
+    df = load_training_data(params)
+    print(f"Dataset carregado: {len(df)} colaboradores")
+    print(f"Taxa de turnover: {df['desligamento'].mean():.1%}")
+
+    # Treinar HMM
+    progress.start('hmm_fit')
+    print("Treinando modelo HMM...")
+    hmm_model = SurveyStateDetector(n_states=3)
+    hmm_model.fit(df)
+
+    progress.start('hmm_inference')
+    inference = hmm_model.infer(df)
+    df['current_hmm_state'] = inference['current_state']
+    state_probs = inference['state_probs']
+    print(f"HMM treinado com {hmm_model.n_states} estados")
+
+    # Treinar Random Forest (etapas cv, rf_fit e eval)
+    print("Treinando modelo Random Forest...")
+    rf_model = TurnoverPredictor(
+        n_jobs=params.get('n_jobs'),
+        reuse_cv_models=params.get('reuse_cv_models', False)
+    )
+    results = rf_model.train(df, state_probs=state_probs, on_stage=progress.start)
+    print(f"Random Forest treinado. AUC: {results['auc']:.3f}")
+
+    metrics = {
+        "test_auc": float(results['auc']),
+        "cv_auc": results['cv_auc'],
+        "n_employees": len(df),
+        "turnover_rate": float(df['desligamento'].mean()),
+        "hmm_states": hmm_model.n_states
+    }
+    last_trained = datetime.now().isoformat()
+
+    # Salvar modelos como nova versão do registro (a ativação acontece no processo da API)
+    progress.start('save')
+    registry = ModelRegistry(params.get('models_dir', 'models'))
+    version = registry.save_version(hmm_model, rf_model, metrics=metrics, trained_at=last_trained,
+                                    evaluation=results['evaluation'])
+    print(f"Modelos salvos em {registry.root}/{version}")
+
+    # Histórico e estado filtrado do HMM: base das atualizações incrementais (run_hmm_update)
+    history = hmm_model.prepare_sequences(df)[2]
+    save_hmm_state(params.get('hmm_state_dir', 'data/hmm_state'), history,
+                   filter_state_from_inference(history, inference), model_version=version)
+
+    # Persistir o último score de cada colaborador (alimenta os agregados do dashboard)
+    progress.start('score')
+    record_training_scores(params, rf_model, df, state_probs, version, last_trained)
+    progress.finish()
+
+    return {
+        'version': version,
+        'last_trained': last_trained,
+        'metrics': metrics,
+        'progress': progress.snapshot()
+    }
+
+def run_chunked_training(params, job_id=None, shared_progress=None):
+    """
+    Pipeline de treinamento out-of-core (datasets maiores que a memória)
+
+    Mesmas etapas e resultado de run_training, mas o dataset é lido em blocos de
+    params['chunk_size'] colaboradores e gravado em arquivos com memmap em um
+    diretório de trabalho temporário (ver out_of_core). O EM do HMM roda em uma
+    amostra de params['hmm_sample_size'] colaboradores; a inferência e os scores
+    percorrem todos, bloco a bloco.
+    """
+    progress = TrainingProgress(job_id, shared_progress)
+    print(f"Iniciando treinamento out-of-core dos modelos (job {job_id}, blocos de {params['chunk_size']})...")
+
+    workspace_root = params.get('workspace_dir', 'data/training_workspace')
+    os.makedirs(workspace_root, exist_ok=True)
+    workspace = tempfile.mkdtemp(prefix=f"{job_id or 'job'}-", dir=workspace_root)
+    try:
+        # Ler o dataset em blocos, gravando histórico e features em disco
+        progress.start('data_load')
+        hmm_model = SurveyStateDetector(n_states=3)
+        rf_model = TurnoverPredictor(
+            n_jobs=params.get('n_jobs'),
+            reuse_cv_models=params.get('reuse_cv_models', False)
+        )
+        arrays = write_training_arrays(iter_training_chunks(params), workspace, rf_model, hmm_model.n_states)
+        history, X, y = arrays['history'], arrays['X'], arrays['y']
+        print(f"Dataset carregado: {len(y)} colaboradores, {len(history.values)} meses de survey")
+        print(f"Taxa de turnover: {y.mean():.1%}")
+
+        progress.start('hmm_fit')
+        print("Treinando modelo HMM...")
+        fit_hmm_sample(hmm_model, history, sample_size=params.get('hmm_sample_size'))
+
+        progress.start('hmm_inference')
+        inference = infer_states(hmm_model, history, X, rf_model.feature_names, chunk_size=params['chunk_size'])
+        print(f"HMM treinado com {hmm_model.n_states} estados")
+
+        # Treinar Random Forest (etapas cv, rf_fit e eval)
+        print("Treinando modelo Random Forest...")
+        results = rf_model.train_matrix(X, y, on_stage=progress.start)
+        print(f"Random Forest treinado. AUC: {results['auc']:.3f}")
+
+        metrics = {
+            "test_auc": float(results['auc']),
+            "cv_auc": results['cv_auc'],
+            "n_employees": len(y),
+            "turnover_rate": float(y.mean()),
+            "hmm_states": hmm_model.n_states,
+            "chunk_size": params['chunk_size'],
+            "hmm_sample_size": params.get('hmm_sample_size')
+        }
+        last_trained = datetime.now().isoformat()
+
+        progress.start('save')
+        registry = ModelRegistry(params.get('models_dir', 'models'))
+        version = registry.save_version(hmm_model, rf_model, metrics=metrics, trained_at=last_trained,
+                                    evaluation=results['evaluation'])
+        print(f"Modelos salvos em {registry.root}/{version}")
+        save_hmm_state(params.get('hmm_state_dir', 'data/hmm_state'), history,
+                       filter_state_from_inference(history, inference), model_version=version)
+
+        progress.start('score')
+        n_scored = record_scores_chunked(
+            ScoreStore(params.get('score_db_url', 'sqlite:///data/scores.db')), rf_model, X, arrays['employee_ids'],
+            model_version=version, scored_at=last_trained, chunk_size=params['chunk_size']
+        )
+        print(f"Scores de {n_scored} colaboradores gravados")
+        progress.finish()
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    return {
+        'version': version,
+        'last_trained': last_trained,
+        'metrics': metrics,
+        'progress': progress.snapshot()
+    }
+
+def record_training_scores(params, rf_model, df, state_probs, version, scored_at):
+    """Grava no ScoreStore o score de cada colaborador do dataset de treino"""
+    scores = rf_model.predict_risk_arrays(df, state_probs=state_probs)
+    n_scored = ScoreStore(params.get('score_db_url', 'sqlite:///data/scores.db')).record_scores(
+        scores['employee_id'], scores['desligamento_risk'], scores['risk_category'],
+        {col: df[col].to_numpy() for col in AGGREGATE_DIMENSIONS},
+        model_version=version, scored_at=scored_at
+    )
+    print(f"Scores de {n_scored} colaboradores gravados")
+
+def run_rf_update(params, job_id=None, shared_progress=None):
+    """
+    Retreino incremental do Random Forest com dados novos (floresta de janela deslizante)
+
+    Parte do checkpoint da versão base (params['base_version']): classifica os
+    dados novos com o HMM da base, acrescenta params['n_new_trees'] árvores
+    treinadas só nesses dados e descarta as mais antigas, mantendo no máximo
+    params['window_size'] árvores. Salva uma nova versão com o mesmo HMM.
+
+    params: os de load_training_data + n_new_trees, window_size, n_jobs, base_version,
+        models_dir, score_db_url e seed opcional (ver update_seed)
+    """
+    progress = TrainingProgress(job_id, shared_progress, stages=RF_UPDATE_STAGES)
+    print(f"Iniciando retreino incremental do Random Forest (job {job_id})...")
+
+    progress.start('data_load')
+    registry = ModelRegistry(params.get('models_dir', 'models'))
+    base = registry.load_checkpoint(params['base_version'])
+    df = load_training_data(params, seed=update_seed(params, job_id))
+    print(f"Dados novos: {len(df)} colaboradores")
+
+    progress.start('hmm_inference')
+    inference = base.hmm_model.infer(df)
+    df['current_hmm_state'] = inference['current_state']
+    state_probs = inference['state_probs']
+
+    # Warm start: árvores novas nos dados novos (rf_update) e AUC no holdout dos dados novos (eval)
+    rf_model = base.rf_model
+    rf_model.n_jobs = params.get('n_jobs')
+    results = rf_model.update(
+        df, state_probs=state_probs, n_new_trees=params.get('n_new_trees', 20),
+        window_size=params.get('window_size'), on_stage=progress.start
+    )
+
+    progress.start('save')
+    # Só o que este retreino mediu: CV e dados do treino da base não valem para a floresta nova
+    metrics = {
+        "test_auc": float(results['auc']),
+        "rf_update": {
+            "base_version": base.version,
+            "n_employees": len(df),
+            "turnover_rate": float(df['desligamento'].mean()),
+            "n_new_trees": params.get('n_new_trees', 20),
+            "n_trees": results['n_trees'],
+            "stage_seconds": {stage: round(seconds, 4) for stage, seconds in results['stage_seconds'].items()}
+        }
+    }
+    last_trained = datetime.now().isoformat()
+    version = registry.save_version(base.hmm_model, rf_model, metrics=metrics, trained_at=last_trained,
+                                    evaluation=results['evaluation'])
+    print(f"Modelos salvos em {registry.root}/{version}")
+
+    progress.start('score')
+    record_training_scores(params, rf_model, df, state_probs, version, last_trained)
+    progress.finish()
+
+    return {
+        'version': version,
+        'last_trained': last_trained,
+        'metrics': metrics,
+        'progress': progress.snapshot()
+    }
+
+def run_hmm_update(params, job_id=None, shared_progress=None):
+    """
+    Atualização incremental do HMM com uma nova onda mensal de surveys
+
+    Parte do modelo da versão base (params['base_version']) e do estado do HMM
+    gravado pelo último treino/atualização; salva uma nova versão com o HMM
+    atualizado e o mesmo Random Forest.
+
+    params: survey_employee_ids, survey_values, n_iter, sample_size, base_version,
+        models_dir, hmm_state_dir e seed opcional do sorteio de sample_size (ver update_seed)
+    """
+    progress = TrainingProgress(job_id, shared_progress, stages=HMM_UPDATE_STAGES)
+    print(f"Iniciando atualização incremental do HMM (job {job_id})...")
+
+    progress.start('data_load')
+    registry = ModelRegistry(params.get('models_dir', 'models'))
+    base = registry.load_checkpoint(params['base_version'])
+    state_dir = params.get('hmm_state_dir', 'data/hmm_state')
+    history, filter_state, state_metadata = load_hmm_state(state_dir)
+    if state_metadata.get('model_version') != base.version:
+        print(f"Aviso: estado do HMM gravado pela versão {state_metadata.get('model_version')}, "
+              f"atualizando a partir da versão {base.version}")
+
+    # Warm start do EM (etapa hmm_update) e um passo de filtro por colaborador (hmm_filter)
+    history, filter_state, stats = apply_survey_wave(
+        base.hmm_model, history, filter_state, params['survey_employee_ids'], params['survey_values'],
+        n_iter=params.get('n_iter', 5), sample_size=params.get('sample_size'), seed=update_seed(params, job_id),
+        on_stage=progress.start
+    )
+    print(f"HMM atualizado: {stats['n_responses']} respostas, {stats['n_new_employees']} colaboradores novos, "
+          f"{stats['em_iterations']} iterações de EM")
+
+    progress.start('save')
+    # Só o que esta atualização mediu (como em run_rf_update); as métricas da base ficam na versão base
+    metrics = {'hmm_update': {**stats, 'base_version': base.version}}
+    last_trained = datetime.now().isoformat()
+    # Mesmo Random Forest: a avaliação do holdout é a da versão base
+    version = registry.save_version(base.hmm_model, base.rf_model, metrics=metrics, trained_at=last_trained,
+                                    evaluation=registry.load_evaluation(base.version))
+    save_hmm_state(state_dir, history, filter_state, model_version=version)
+    print(f"Modelos salvos em {registry.root}/{version}")
+    progress.finish()
+
+    return {
+        'version': version,
+        'last_trained': last_trained,
+        'metrics': metrics,
+        'progress': progress.snapshot()
+    }
+
+def add_fake_survey_history(df, n_months=12, seed=42):
+    """
+    Adiciona histórico fake de survey baseado nas médias (para CSVs sem histórico)
+
+    Sorteia de uma vez o tensor (n_employees, n_months, n_features) em torno da
+    média de cada colaborador (ruído normal, desvio 0.5) e o associa ao
+    DataFrame no formato colunar (df.attrs['survey_history']).
+    """
+    # Médias na ordem de SURVEY_FEATURES (nomes internos ou do schema da API)
+    means = np.column_stack([
+        df[col if col in df.columns else INTERNAL_TO_API_COLUMNS[col]].to_numpy(dtype=np.float32)
+        for col in SURVEY_AVG_COLUMNS
+    ])
+    rng = np.random.default_rng(seed)
+    scores = rng.normal(0, 0.5, size=(len(df), n_months, means.shape[1])).astype(np.float32)
+    scores += means[:, None, :]
+
+    history = SurveyHistory.from_tensor(scores, np.full(len(df), n_months), df['employee_id'].to_numpy())
+    return attach_survey_history(df, history)
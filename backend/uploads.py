@@ -0,0 +1,276 @@
+"""
+Upload de datasets em uma passada: gravação em blocos, validação, perfil e conversão
+
+O arquivo enviado é lido em blocos de bytes (sem carregá-lo inteiro) e cada
+bloco vai ao mesmo tempo para o disco e para o parser de CSV do pandas. Cada
+bloco de linhas é validado contra o schema de EmployeeData, entra no perfil
+do dataset (linhas, nulos, cardinalidade das categorias, min/max numéricos) e,
+opcionalmente, é acrescentado a um Parquet ou Feather para carregar o dataset
+rápido nos treinos seguintes (requer pyarrow). O perfil é salvo ao lado do
+arquivo (`<nome>_profile.json`).
+"""
+import importlib.util
+import io
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+UPLOAD_BLOCK_BYTES = 1 << 20
+UPLOAD_CHUNK_ROWS = 50_000
+CONVERSION_FORMATS = ('parquet', 'feather')
+
+# Valores distintos guardados por coluna de texto (acima disso a cardinalidade fica como "pelo menos")
+MAX_TRACKED_CATEGORIES = 10_000
+
+# Erros de validação guardados como exemplo (os demais só entram nas contagens)
+MAX_ERROR_SAMPLES = 20
+
+def profile_path_for(filepath):
+    """Caminho do perfil (JSON) associado a um arquivo de colaboradores"""
+    return os.path.splitext(filepath)[0] + '_profile.json'
+
+class _TeeReader(io.RawIOBase):
+    """Leitor que copia para `sink` tudo o que lê de `source`"""
+    def __init__(self, source, sink):
+        self.source = source
+        self.sink = sink
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.source.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self.sink.write(data)
+        self.bytes_read += n
+        return n
+
+class SchemaValidator:
+    """
+    Valida blocos de um dataset contra os campos do schema da API (int, float ou str)
+
+    Colunas podem vir com o nome da API ou com o nome interno (aliases). Campos
+    são obrigatórios: nulos, textos não numéricos e inteiros com casas decimais
+    contam como erro; colunas extras são aceitas.
+    """
+    def __init__(self, schema, aliases=None):
+        self.schema = schema
+        self.aliases = aliases or {}
+        self.columns = None  # campo -> coluna no arquivo
+        self.n_invalid_rows = 0
+        self.error_counts = {}
+        self.samples = []
+
+    def check_columns(self, columns):
+        """Resolve as colunas do arquivo; retorna os campos obrigatórios ausentes"""
+        columns = set(columns)
+        self.columns = {}
+        missing = []
+        for field in self.schema:
+            column = field if field in columns else self.aliases.get(field)
+            if column in columns:
+                self.columns[field] = column
+            else:
+                missing.append(field)
+        return missing
+
+    def validate(self, chunk, missing, first_row):
+        """
+        Valida um bloco (missing: chunk.isna(); first_row: número da primeira linha de dados do bloco, a partir de 1)
+        """
+        invalid_rows = np.zeros(len(chunk), dtype=bool)
+        for field, column in self.columns.items():
+            values = chunk[column]
+            kind = self.schema[field]
+            invalid = missing[column].to_numpy()
+            message = "valor ausente"
+            if kind is int and pd.api.types.is_integer_dtype(values.dtype):
+                pass
+            elif kind is not str and not (kind is float and pd.api.types.is_numeric_dtype(values.dtype)):
+                numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+                invalid = np.isnan(numbers)
+                message = "número esperado"
+                if kind is int:
+                    invalid |= (np.nan_to_num(numbers) % 1) != 0
+                    message = "inteiro esperado"
+            if not invalid.any():
+                continue
+            rows = np.flatnonzero(invalid)
+            self.error_counts[field] = self.error_counts.get(field, 0) + len(rows)
+            for i in rows[:MAX_ERROR_SAMPLES - len(self.samples)]:
+                value = values.iloc[i]
+                self.samples.append({
+                    "row": int(first_row + i),
+                    "field": field,
+                    "value": None if pd.isna(value) else str(value),
+                    "error": message
+                })
+            invalid_rows |= invalid
+        self.n_invalid_rows += int(invalid_rows.sum())
+
+    def report(self):
+        return {
+            "valid": self.n_invalid_rows == 0,
+            "n_invalid_rows": self.n_invalid_rows,
+            "error_counts": self.error_counts,
+            "errors": self.samples
+        }
+
+class DatasetProfile:
+    """Perfil de um dataset acumulado bloco a bloco: linhas, nulos, cardinalidade das categorias, min/max numéricos"""
+    def __init__(self):
+        self.n_rows = 0
+        self.dtypes = {}
+        self.null_counts = {}
+        self.minimum = {}
+        self.maximum = {}
+        self.categories = {}  # coluna -> valores distintos (até MAX_TRACKED_CATEGORIES)
+        self.capped = set()
+
+    def update(self, chunk, missing):
+        """Acumula um bloco (missing: chunk.isna(), calculado uma vez por bloco)"""
+        self.n_rows += len(chunk)
+        nulls = missing.sum()
+        for column in chunk.columns:
+            values = chunk[column]
+            self.dtypes.setdefault(column, str(values.dtype))
+            self.null_counts[column] = self.null_counts.get(column, 0) + int(nulls[column])
+            if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+                if values.notna().any():
+                    low, high = values.min(), values.max()
+                    self.minimum[column] = min(self.minimum.get(column, low), low)
+                    self.maximum[column] = max(self.maximum.get(column, high), high)
+            elif column not in self.capped:
+                seen = self.categories.setdefault(column, set())
+                seen.update(values[~missing[column]].unique())
+                if len(seen) > MAX_TRACKED_CATEGORIES:
+                    self.capped.add(column)
+                    del self.categories[column]
+
+    def to_dict(self):
+        columns = {}
+        for column, dtype in self.dtypes.items():
+            info = {"dtype": dtype, "null_count": self.null_counts[column]}
+            if column in self.minimum:
+                info["min"] = _python_number(self.minimum[column])
+                info["max"] = _python_number(self.maximum[column])
+            if column in self.categories:
+                info["cardinality"] = len(self.categories[column])
+            elif column in self.capped:
+                info["cardinality"] = MAX_TRACKED_CATEGORIES
+                info["cardinality_capped"] = True
+            columns[column] = info
+        return {"n_rows": self.n_rows, "columns": columns}
+
+def _python_number(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+class _ArrowWriter:
+    """Grava blocos de DataFrame em um Parquet ou Feather (Arrow IPC) com o schema do primeiro bloco"""
+    def __init__(self, path, file_format):
+        if importlib.util.find_spec('pyarrow') is None:
+            raise ValueError(f"Conversão para {file_format} requer o pacote pyarrow")
+        self.path = path
+        self.file_format = file_format
+        self.schema = None
+        self._writer = None
+
+    def write(self, chunk):
+        import pyarrow as pa
+
+        if self.schema is None:
+            self.schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            if self.file_format == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, self.schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path, self.schema)
+        try:
+            table = pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ValueError(f"Tipos das colunas mudaram ao longo do arquivo; conversão para {self.file_format} falhou: {e}")
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+def ingest_upload(source, filepath, schema, aliases=None, convert=None, strict=False, chunk_rows=UPLOAD_CHUNK_ROWS):
+    """
+    Grava um CSV enviado em `filepath` em uma passada, validando, perfilando e (opcionalmente) convertendo
+
+    source: arquivo binário do upload (lido em blocos de UPLOAD_BLOCK_BYTES)
+    schema: campo -> tipo (int, float ou str); aliases: campo -> nome alternativo da coluna
+    convert: None, 'parquet' ou 'feather' (arquivo `<nome>.<formato>` ao lado do CSV)
+    strict: se houver linhas inválidas, descarta os arquivos e levanta ValueError
+
+    Os arquivos são gravados com sufixo .part e renomeados no fim, então um
+    upload que falha no meio não deixa arquivo pela metade. Retorna o perfil
+    (também salvo em `<nome>_profile.json`).
+    """
+    if convert is not None and convert not in CONVERSION_FORMATS:
+        raise ValueError(f"Formato de conversão inválido: {convert}")
+    converted_path = f"{os.path.splitext(filepath)[0]}.{convert}" if convert else None
+    profile_path = profile_path_for(filepath)
+    partials = [f"{filepath}.part"] + ([f"{converted_path}.part"] if converted_path else [])
+
+    validator = SchemaValidator(schema, aliases)
+    profile = DatasetProfile()
+    writer = None
+    try:
+        with open(partials[0], 'wb') as sink:
+            tee = _TeeReader(source, sink)
+            if convert:
+                writer = _ArrowWriter(partials[1], convert)
+            reader = pd.read_csv(io.BufferedReader(tee, UPLOAD_BLOCK_BYTES), chunksize=chunk_rows)
+            first_row = 1
+            for chunk in reader:
+                if validator.columns is None:
+                    missing = validator.check_columns(chunk.columns)
+                    if missing:
+                        raise ValueError(f"Colunas obrigatórias ausentes: {missing}")
+                missing = chunk.isna()
+                validator.validate(chunk, missing, first_row)
+                profile.update(chunk, missing)
+                if writer is not None:
+                    writer.write(chunk)
+                first_row += len(chunk)
+            # O parser pode parar antes do fim dos bytes (ex.: linhas em branco no final)
+            while tee.readinto(bytearray(UPLOAD_BLOCK_BYTES)):
+                pass
+        if validator.columns is None:
+            raise ValueError("Arquivo vazio")
+        if writer is not None:
+            writer.close()
+            writer = None
+
+        validation = validator.report()
+        if strict and not validation["valid"]:
+            raise ValueError(f"{validation['n_invalid_rows']} linhas inválidas: {validation['errors'][:5]}")
+
+        result = {
+            "filepath": filepath,
+            "n_bytes": tee.bytes_read,
+            **profile.to_dict(),
+            "validation": validation,
+            "converted_path": converted_path,
+            "created_at": datetime.now().isoformat()
+        }
+        with open(f"{profile_path}.part", 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        partials.append(f"{profile_path}.part")
+        for path, final in zip(partials, [filepath, converted_path or profile_path, profile_path]):
+            os.replace(path, final)
+        result["profile_path"] = profile_path
+        return result
+    finally:
+        if writer is not None:
+            writer.close()
+        for path in partials:
+            if os.path.exists(path):
+                os.remove(path)